@@ -2,98 +2,281 @@
 WarGames Nuclear War Simulation Game
 """
 
+import argparse
+import os
 import pygame
 import sys
+import time
+from typing import Callable, List, Optional, Tuple
 
-from config import WINDOW_WIDTH, WINDOW_HEIGHT, GameState, DEFENSE_LIMIT, TARGET_LIMIT, GAME_TITLE
-from city_data import USA_CITIES, USSR_CITIES
+from config import (WINDOW_WIDTH, WINDOW_HEIGHT, GameState, GAME_TITLE, DEFENSE_LIMIT, TARGET_LIMIT,
+                    CITY_RADIUS, FPS)
 from game_state import GameStateManager
-from ui import UI, get_clicked_city
-from missiles import MissileSystem
+from ui import UI, get_background
+from camera import PAN_STEP, Camera, CameraCanvas
+from defense_coverage import coverage_rect
+from tiles import TilePyramid
+from pick import BUTTON, CITY, PANEL, PickBuffer
+from input_events import InputQueue
+from memory import DUMP_INTERVAL, MemoryMonitor
+from metrics import DEFAULT_METRICS_PORT, FRAME_SECONDS, UPDATE_SECONDS, MetricsServer
+from missiles import MissileSystem, advance_launch
+from particles import ParticleSystem
 from loading_screen import LoadingScreen
+from protocol import SIDES, DEFAULT_ROOM
+from history import GameHistory
+from adaptive_ai import AdaptiveOpponent
+from scenario import (DEFAULT_SCENARIO, POPULATION_DISTRIBUTIONS, SPATIAL_DISTRIBUTIONS,
+                      Scenario, generate_scenario)
+from state_store import StateSnapshot, load_snapshot, save_snapshot
+from render_backend import BACKENDS, Canvas, create_display_canvas
+from sim_thread import DEFAULT_SIM_RATE, ThreadedRunner
 
 pygame.init()
 
+AUTOSAVE_INTERVAL = 1000
+PAN_KEYS = {
+    pygame.K_LEFT: (PAN_STEP, 0),
+    pygame.K_RIGHT: (-PAN_STEP, 0),
+    pygame.K_UP: (0, PAN_STEP),
+    pygame.K_DOWN: (0, -PAN_STEP),
+}
+ZOOM_KEYS = {
+    pygame.K_EQUALS: 1,
+    pygame.K_PLUS: 1,
+    pygame.K_KP_PLUS: 1,
+    pygame.K_MINUS: -1,
+    pygame.K_KP_MINUS: -1,
+}
+
 
 class WarGame:
     
-    def __init__(self):
-        self.screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
-        pygame.display.set_caption(GAME_TITLE)
+    def __init__(self, history: Optional[GameHistory] = None,
+                 ai_opponent: Optional[AdaptiveOpponent] = None,
+                 screen: Optional[Canvas] = None,
+                 checkpoint_path: Optional[str] = None,
+                 scenario: Scenario = DEFAULT_SCENARIO,
+                 renderer: str = "surface", software_renderer: bool = False,
+                 display_size: Optional[Tuple[int, int]] = None, smooth_scaling: bool = False,
+                 get_ticks: Callable[[], int] = pygame.time.get_ticks):
+        if history is not None and scenario is not DEFAULT_SCENARIO:
+            raise ValueError("game history only records the built-in theater")
+        if screen is None:
+            screen = create_display_canvas(renderer, (WINDOW_WIDTH, WINDOW_HEIGHT), GAME_TITLE,
+                                           software=software_renderer, display_size=display_size,
+                                           smooth=smooth_scaling)
+        self.screen = screen
         self.clock = pygame.time.Clock()
+        self.get_ticks = get_ticks
         
-        self.game_state = GameStateManager()
-        self.ui = UI()
-        self.missile_system = MissileSystem()
+        self.scenario = scenario
+        self.game_state = GameStateManager(ai_opponent, scenario=scenario)
+        self.ui = UI(scenario)
+        self.missile_system = MissileSystem(store=self.game_state.store, scenario=scenario,
+                                            particles=ParticleSystem())
         self.loading_screen = LoadingScreen()
-        
-        try:
-            self.background = pygame.image.load('neon_map.png').convert()
-            self.background = pygame.transform.scale(self.background, (WINDOW_WIDTH, WINDOW_HEIGHT))
-        except pygame.error:
-            self.background = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
-            for y in range(WINDOW_HEIGHT):
-                colour_value = int(20 + (y / WINDOW_HEIGHT) * 40)
-                pygame.draw.line(self.background, (0, 0, colour_value), (0, y), (WINDOW_WIDTH, y))
+        self.pick_buffer = PickBuffer((WINDOW_WIDTH, WINDOW_HEIGHT))
+        self.input = InputQueue(canvas=screen)
+        self.redraw: List[pygame.Rect] = []
+        self.full_redraw = False
+        self.loading_drawn = False
+        self.report_latency = False
+        self.memory: Optional[MemoryMonitor] = None
+        
+        self.background = get_background((WINDOW_WIDTH, WINDOW_HEIGHT))
+        self.tiles = TilePyramid()
+        self.camera = Camera((WINDOW_WIDTH, WINDOW_HEIGHT))
+        self.map_screen = CameraCanvas(screen, self.camera)
+        self.ui.city_renderer.camera = self.camera
+        
+        self.history = history
+        self.game_start_time = 0
+        
+        self.checkpoint: Optional[StateSnapshot] = None
+        self.checkpoint_path = checkpoint_path
+        self.autosaved_state = None
+        self.autosaved_at = 0
+        if checkpoint_path is not None and os.path.exists(checkpoint_path):
+            self.game_state.restore(load_snapshot(checkpoint_path), self.get_ticks())
+            self.autosaved_state = self.game_state.current_state
         
         self.running = True
-        self.last_time = pygame.time.get_ticks()
+        self.last_time = self.get_ticks()
     
     def handle_events(self):
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                self.running = False
-            
-            elif event.type == pygame.KEYDOWN:
-                if self.game_state.current_state == GameState.LOADING:
-                    result = self.loading_screen.handle_keypress(event.key, event.unicode)
-                    if result == "start_game":
-                        self.game_state.current_state = GameState.MENU
-                elif event.key == pygame.K_g:
-                    self.game_state.toggle_grid()
-                elif event.key == pygame.K_h:
-                    self.game_state.toggle_help()
-            
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                if event.button == 1:  
-                    self._handle_mouse_click(event.pos)
+        for event in self.input.poll():
+            self.handle_event(event)
+    
+    def handle_event(self, event: pygame.event.Event):
+        if event.type == pygame.QUIT:
+            self.running = False
+        
+        elif event.type == pygame.KEYDOWN:
+            if self.game_state.current_state == GameState.LOADING:
+                result = self.loading_screen.handle_keypress(event.key, event.unicode)
+                if result == "start_game":
+                    self.game_state.current_state = GameState.MENU
+            elif event.key == pygame.K_g:
+                self.game_state.toggle_grid()
+            elif event.key == pygame.K_c:
+                self.game_state.toggle_coverage()
+            elif event.key == pygame.K_h:
+                self.game_state.toggle_help()
+            elif event.key == pygame.K_F5:
+                self.checkpoint = self.game_state.checkpoint(self.get_ticks())
+            elif event.key == pygame.K_F9 and self.checkpoint is not None:
+                self.game_state.restore(self.checkpoint, self.get_ticks())
+            elif event.key in PAN_KEYS and self._map_active():
+                self.camera.pan(*PAN_KEYS[event.key])
+            elif event.key in ZOOM_KEYS and self._map_active():
+                self.camera.zoom_at((WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2), ZOOM_KEYS[event.key])
+            elif event.key == pygame.K_HOME:
+                self.camera.reset()
+            self.full_redraw = True
+        
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            if event.button == 1:  
+                state = self.game_state.current_state
+                entity = self._entity_at(event.pos) if state != GameState.LOADING else None
+                self._handle_mouse_click(event.pos)
+                self._invalidate_click(state, entity)
+                self._update_hover(event.pos)
+        
+        elif event.type == pygame.MOUSEMOTION:
+            if (event.buttons[1] or event.buttons[2]) and self._map_active():
+                self._move_camera(self.camera.pan, *event.rel)
+            self._update_hover(event.pos)
+        
+        elif event.type == pygame.MOUSEWHEEL and self._map_active():
+            mouse_pos = self.input.mouse_pos()
+            self._move_camera(self.camera.zoom_at, mouse_pos, event.y)
+            self._update_hover(mouse_pos)
+        
+        self.input.latency.handled(event)
+    
+    def is_view_event(self, event: pygame.event.Event) -> bool:
+        # Input that only moves the camera or the hover highlight, and never
+        # the game state.
+        if event.type in (pygame.MOUSEMOTION, pygame.MOUSEWHEEL):
+            return True
+        return (event.type == pygame.KEYDOWN and
+                self.game_state.current_state != GameState.LOADING and
+                (event.key in PAN_KEYS or event.key in ZOOM_KEYS or event.key == pygame.K_HOME))
+    
+    def _map_active(self) -> bool:
+        return self.game_state.current_state not in (GameState.LOADING, GameState.MENU)
+    
+    def _move_camera(self, move, *args):
+        key = self.camera.key
+        move(*args)
+        if self.camera.key != key:
+            self.full_redraw = True
+    
+    def _invalidate_click(self, state: GameState, entity):
+        if entity is None:
+            return
+        if entity[0] != CITY or self.game_state.current_state != state or self.ui.status_rect is None:
+            self.full_redraw = True
+            return
+        # Toggling a city only changes its marker, the selection counter and
+        # whether the continue/launch button is shown.
+        city = self._selection_cities(state)[entity[1]]
+        status = self.ui.status_rect
+        if state == GameState.DEFENSIVE and self.game_state.show_coverage:
+            self.redraw.append(coverage_rect((city["x"], city["y"]), self.camera))
+        self.redraw += [self.ui.city_renderer.city_rect(city),
+                        pygame.Rect(0, status.top, WINDOW_WIDTH, status.height),
+                        self.ui.continue_button.rect.union(self.ui.launch_button.rect)]
+    
+    def _update_hover(self, mouse_pos: tuple):
+        if self.game_state.current_state != GameState.LOADING:
+            self.redraw += self.ui.set_hover(self._entity_at(mouse_pos))
+    
+    def _selection_cities(self, state: GameState) -> list:
+        if state == GameState.DEFENSIVE:
+            return self.scenario.usa_cities
+        if state == GameState.OFFENSIVE:
+            return self.scenario.ussr_cities
+        return []
+    
+    def _entity_at(self, mouse_pos: tuple):
+        # The pick buffer is rasterized again only when the clickable layout
+        # changes; later layers win, so the order below sets click priority.
+        state = self.game_state.current_state
+        cities = self._selection_cities(state)
+        # The continue and launch buttons are only drawn once the selection is
+        # complete, so whether they show is part of the layout.
+        if state == GameState.DEFENSIVE:
+            advance = self.game_state.can_continue_to_offensive()
+        elif state == GameState.OFFENSIVE:
+            advance = self.game_state.can_launch_missiles()
+        else:
+            advance = False
+        key = (state, self.game_state.show_help, id(cities), self.camera.key, advance)
+        if self.pick_buffer.key != key:
+            pick = self.pick_buffer
+            pick.clear(key)
+            if self.game_state.show_help:
+                pick.add_rect(self.ui.help_rect(), PANEL, "help")
+            if state == GameState.MENU:
+                pick.add_rect(self.ui.begin_button.rect, BUTTON, self.ui.begin_button)
+                pick.add_rect(self.ui.exit_button.rect, BUTTON, self.ui.exit_button)
+            elif state == GameState.DEFENSIVE and advance:
+                pick.add_rect(self.ui.continue_button.rect, BUTTON, self.ui.continue_button)
+            elif state == GameState.OFFENSIVE and advance:
+                pick.add_rect(self.ui.launch_button.rect, BUTTON, self.ui.launch_button)
+            elif state == GameState.RESULTS:
+                pick.add_rect(self.ui.close_button.rect, BUTTON, self.ui.close_button)
+            indices, xs, ys = self.ui.city_renderer.screen_points(cities)
+            pick.add_disc_points(xs, ys, indices, len(cities), CITY_RADIUS, CITY)
+            if state not in (GameState.LOADING, GameState.MENU):
+                pick.add_rect(self.ui.reset_button.rect, BUTTON, self.ui.reset_button)
+        return self.pick_buffer.entity_at(mouse_pos)
     
     def _handle_mouse_click(self, mouse_pos: tuple):
-        if self.game_state.current_state == GameState.LOADING:
+        if self.game_state.current_state != GameState.LOADING:
+            self.handle_click(self._entity_at(mouse_pos))
+    
+    def handle_click(self, entity, seen_in: Optional[GameState] = None):
+        # Applies a click already resolved to an entity, so a caller on
+        # another thread can hit-test against what it has on screen. A click
+        # resolved in a state the game has since left is dropped.
+        state = self.game_state.current_state
+        if state == GameState.LOADING or entity is None or seen_in not in (None, state):
             return
-            
-        if (self.game_state.current_state != GameState.MENU and 
-            self.ui.reset_button.is_clicked(mouse_pos)):
-            self.game_state.reset_to_menu()
+        kind, target = entity
+        if kind == BUTTON and not target.enabled:
             return
         
-        if self.game_state.current_state == GameState.MENU:
-            if self.ui.begin_button.is_clicked(mouse_pos):
+        if target is self.ui.reset_button:
+            self.game_state.reset_to_menu()
+            self.missile_system.reset()
+        
+        elif state == GameState.MENU:
+            if target is self.ui.begin_button:
                 self.game_state.start_new_game()
-            elif self.ui.exit_button.is_clicked(mouse_pos):
+                self.missile_system.reset()
+                self.game_start_time = self.get_ticks()
+            elif target is self.ui.exit_button:
                 self.running = False
         
-        elif self.game_state.current_state == GameState.DEFENSIVE:
-            city_idx = get_clicked_city(mouse_pos, USA_CITIES)
-            if city_idx != -1:
-                self.game_state.toggle_defense(city_idx)
-            
-            elif (self.game_state.can_continue_to_offensive() and 
-                  self.ui.continue_button.is_clicked(mouse_pos)):
+        elif state == GameState.DEFENSIVE:
+            if kind == CITY:
+                self.game_state.toggle_defense(target)
+            elif target is self.ui.continue_button and self.game_state.can_continue_to_offensive():
                 self.game_state.current_state = GameState.OFFENSIVE
         
-        elif self.game_state.current_state == GameState.OFFENSIVE:
-            city_idx = get_clicked_city(mouse_pos, USSR_CITIES)
-            if city_idx != -1:
-                self.game_state.toggle_target(city_idx)
-            
-            elif (self.game_state.can_launch_missiles() and 
-                  self.ui.launch_button.is_clicked(mouse_pos)):
+        elif state == GameState.OFFENSIVE:
+            if kind == CITY:
+                self.game_state.toggle_target(target)
+            elif target is self.ui.launch_button and self.game_state.can_launch_missiles():
                 self._start_missile_launch()
         
-        elif self.game_state.current_state == GameState.RESULTS:
-            if self.ui.close_button.is_clicked(mouse_pos):
+        elif state == GameState.RESULTS:
+            if target is self.ui.close_button:
                 self.game_state.reset_to_menu()
+                self.missile_system.reset()
     
     def _start_missile_launch(self):
         self.game_state.make_ai_selections()
@@ -107,46 +290,81 @@ class WarGame:
         )
     
     def update(self):
-        current_time = pygame.time.get_ticks()
+        current_time = self.get_ticks()
         self.last_time = current_time
+        self._autosave(current_time)
         
         if self.game_state.current_state == GameState.LOADING:
             self.loading_screen.update()
             
         elif self.game_state.current_state == GameState.LAUNCHING:
-            animation_complete = self.missile_system.update_missiles()
-            
-            intercepted = self.missile_system.check_intercepts(
-                self.game_state.player_defenses,
-                self.game_state.ai_defenses
-            )
-            
-            self.missile_system.create_explosions(
-                intercepted,
-                self.game_state.usa_destroyed,
-                self.game_state.ussr_destroyed,
-                self.game_state.us_cities_destroyed,
-                self.game_state.ussr_cities_destroyed
-            )
-            
-            self.missile_system.update_mushroom_clouds()
+            animation_complete = advance_launch(self.game_state, self.missile_system)
             
             if animation_complete:
                 self.game_state.current_state = GameState.RESULTS
+                self._record_game(current_time)
         
         elif self.game_state.current_state == GameState.RESULTS:
             self.missile_system.update_mushroom_clouds()
+            self.missile_system.update_particles()
+    
+    def _autosave(self, current_time: int, force: bool = False):
+        if self.checkpoint_path is None:
+            return
+        state = self.game_state.current_state
+        if (force or state != self.autosaved_state or
+                (state == GameState.LAUNCHING and
+                 current_time - self.autosaved_at >= AUTOSAVE_INTERVAL)):
+            save_snapshot(self.game_state.checkpoint(current_time), self.checkpoint_path)
+            self.autosaved_state = state
+            self.autosaved_at = current_time
     
-    def render(self):
+    def _record_game(self, current_time: int):
+        if self.history is None:
+            return
+        intercepts = sum(1 for missile in self.missile_system.missile_lines
+                         if missile.get("intercepted", False))
+        self.history.record(self.game_state, current_time - self.game_start_time, intercepts)
+    
+    def render(self, regions: Optional[List[pygame.Rect]] = None):
+        self.redraw = []
+        self.full_redraw = False
+        loading = self.game_state.current_state == GameState.LOADING
+        if loading and self.loading_drawn and self.screen.retains_frame:
+            # The terminal reports the cells it changed, so a cursor blink
+            # presents one cell instead of the whole screen.
+            changed = self.loading_screen.draw(self.screen, full=False)
+            if changed:
+                self.screen.present(changed)
+        elif regions and self.screen.retains_frame:
+            for region in regions:
+                self.screen.set_clip(region)
+                self.draw_frame()
+            self.screen.set_clip(None)
+            self.screen.present(regions)
+        else:
+            self.draw_frame()
+            self.screen.present()
+        self.loading_drawn = loading
+        self.input.latency.presented()
+    
+    def draw_frame(self):
         if self.game_state.current_state == GameState.LOADING:
             self.loading_screen.draw(self.screen)
-            pygame.display.flip()
             return
-            
-        self.screen.blit(self.background, (0, 0))
+        
+        if self.camera.is_identity or not self._map_active():
+            self.screen.blit(self.background, (0, 0))
+        else:
+            self.tiles.draw(self.screen, self.camera)
         
         if self.game_state.show_grid:
-            self.ui.draw_grid(self.screen)
+            self.ui.draw_grid(self.map_screen)
+        
+        if self.game_state.show_coverage and self._map_active():
+            self.missile_system.draw_defense_ranges(
+                self.screen, self.game_state.player_defenses,
+                self._selection_cities(GameState.DEFENSIVE), self.camera)
         
         if self.game_state.current_state == GameState.MENU:
             self._render_menu()
@@ -162,8 +380,6 @@ class WarGame:
         
         elif self.game_state.current_state == GameState.RESULTS:
             self._render_results()
-        
-        pygame.display.flip()
     
     def _render_menu(self):
         self.ui.draw_title(self.screen)
@@ -182,7 +398,7 @@ class WarGame:
             "DEFENSIVE PHASE",
             "",
             "Click on US cities to place defenses",
-            f"Defenses Selected: {len(self.game_state.player_defenses)}/{DEFENSE_LIMIT}"
+            f"Defenses Selected: {len(self.game_state.player_defenses)}/{self.game_state.defense_limit}"
         ]
         
         self.ui.draw_windowed_text(self.screen, instruction_lines)
@@ -212,7 +428,7 @@ class WarGame:
             "OFFENSIVE PHASE",
             "",
             "Click on USSR cities to target",
-            f"Targets Selected: {len(self.game_state.player_targets)}/{TARGET_LIMIT}"
+            f"Targets Selected: {len(self.game_state.player_targets)}/{self.game_state.target_limit}"
         ]
         
         self.ui.draw_windowed_text(self.screen, instruction_lines)
@@ -237,13 +453,7 @@ class WarGame:
     def _render_missile_launch(self):
         self.ui.draw_title(self.screen)
         
-        status_lines = [
-            "MISSILE LAUNCH IN PROGRESS",
-            "",
-            "Nuclear weapons deployed..."
-        ]
-        
-        self.ui.draw_windowed_text(self.screen, status_lines)
+        self.ui.draw_windowed_text(self.screen, self._launch_status_lines())
         
         self.ui.draw_help_prompt(self.screen)
         
@@ -267,8 +477,18 @@ class WarGame:
             set()
         )
         
-        self.missile_system.draw_missiles(self.screen)
-        self.missile_system.draw_mushroom_clouds(self.screen)
+        self.missile_system.draw_missiles(self.map_screen)
+        self.missile_system.draw_mushroom_clouds(self.map_screen)
+        self.missile_system.draw_particles(self.map_screen)
+    
+    def _launch_status_lines(self) -> list:
+        us_casualties, ussr_casualties = self.game_state.calculate_casualties()[:2]
+        return [
+            "MISSILE LAUNCH IN PROGRESS",
+            "",
+            "Nuclear weapons deployed...",
+            f"Casualties: US {us_casualties:,}  USSR {ussr_casualties:,}"
+        ]
     
     def _render_results(self):
         self.ui.draw_title(self.screen)
@@ -288,7 +508,8 @@ class WarGame:
             set()
         )
         
-        self.missile_system.draw_mushroom_clouds(self.screen)
+        self.missile_system.draw_mushroom_clouds(self.map_screen)
+        self.missile_system.draw_particles(self.map_screen)
         
         casualties = self.game_state.calculate_casualties()
         self.ui.draw_results(
@@ -308,17 +529,135 @@ class WarGame:
     
     def run(self):
         while self.running:
+            frame_start = time.perf_counter()
             self.handle_events()
+            update_start = time.perf_counter()
             self.update()
+            UPDATE_SECONDS.observe(time.perf_counter() - update_start)
             self.render()
-            self.clock.tick(60)
-        
+            FRAME_SECONDS.observe(time.perf_counter() - frame_start)
+            self._handle_input_until(frame_start + 1 / FPS)
+            self.clock.tick()
+            if self.memory is not None:
+                self.memory.frame()
+        self.shutdown()
+    
+    def _handle_input_until(self, deadline: float):
+        # Idle on the event queue rather than in clock.tick, so input arriving
+        # between frames is handled and on screen at once instead of waiting
+        # for the next full frame.
+        while self.running:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return
+            for event in self.input.wait(remaining):
+                self.handle_event(event)
+            if self.full_redraw or self.redraw:
+                self.render(None if self.full_redraw else self.redraw)
+    
+    def shutdown(self):
+        self._autosave(self.get_ticks(), force=True)
+        if self.report_latency:
+            print(self.input.latency.report())
+            print(f"motion events coalesced: {self.input.coalesced}")
+        if self.memory is not None:
+            self.memory.stop()
+        if self.history is not None:
+            self.history.close()
         pygame.quit()
         sys.exit()
 
 
+def _parse_size(value: str) -> Tuple[int, int]:
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
 def main():
-    game = WarGame()
+    parser = argparse.ArgumentParser(description=GAME_TITLE)
+    parser.add_argument("--connect", metavar="ADDRESS",
+                        help="play against another client via a server at HOST:PORT or unix:PATH")
+    parser.add_argument("--side", choices=SIDES, default="usa",
+                        help="side to play when connected to a server")
+    parser.add_argument("--room", default=DEFAULT_ROOM,
+                        help="server room used to pair with a specific opponent")
+    parser.add_argument("--history", metavar="PATH",
+                        help="record finished games to a SQLite database")
+    parser.add_argument("--adaptive-ai", action="store_true",
+                        help="use an AI that adapts to the cities you defend and target")
+    parser.add_argument("--checkpoint", metavar="PATH",
+                        help="autosave game state to PATH and resume from it on start")
+    parser.add_argument("--scenario-seed", type=int, metavar="SEED",
+                        help="play a generated theater instead of the built-in cities")
+    parser.add_argument("--cities", type=int, default=10, help="cities per side in a generated theater")
+    parser.add_argument("--spatial", choices=SPATIAL_DISTRIBUTIONS, default="clustered")
+    parser.add_argument("--population", choices=POPULATION_DISTRIBUTIONS, default="zipf")
+    parser.add_argument("--defense-limit", type=int, default=DEFENSE_LIMIT)
+    parser.add_argument("--target-limit", type=int, default=TARGET_LIMIT)
+    parser.add_argument("--renderer", choices=BACKENDS, default="surface",
+                        help="draw with software surfaces or SDL2 renderer textures")
+    parser.add_argument("--software-renderer", action="store_true",
+                        help="force SDL's software renderer for --renderer texture")
+    parser.add_argument("--display-size", type=_parse_size, metavar="WIDTHxHEIGHT",
+                        help="window size; the game still lays out at %dx%d and is scaled to fit"
+                             % (WINDOW_WIDTH, WINDOW_HEIGHT))
+    parser.add_argument("--smooth-scaling", action="store_true",
+                        help="filter the scaled frame instead of nearest-neighbour scaling")
+    parser.add_argument("--threaded", action="store_true",
+                        help="simulate on a worker thread at a fixed rate, independent of rendering")
+    parser.add_argument("--sim-rate", type=int, default=DEFAULT_SIM_RATE,
+                        help="simulation steps per second with --threaded")
+    parser.add_argument("--latency-report", action="store_true",
+                        help="print input-to-display latency percentiles on exit")
+    parser.add_argument("--memory-report", metavar="PATH",
+                        help="trace allocations per subsystem and dump them to PATH as JSON")
+    parser.add_argument("--memory-interval", type=float, default=DUMP_INTERVAL,
+                        help="seconds between --memory-report dumps")
+    parser.add_argument("--metrics-port", type=int, nargs="?", const=DEFAULT_METRICS_PORT,
+                        metavar="PORT", help="serve Prometheus metrics on PORT")
+    parser.add_argument("--metrics-host", default="127.0.0.1",
+                        help="address the metrics endpoint listens on")
+    args = parser.parse_args()
+    if args.history and args.scenario_seed is not None:
+        # History rows index the built-in cities, so a generated theater
+        # would be recorded against the wrong names.
+        parser.error("--history records the built-in theater only; drop --scenario-seed")
+    
+    if args.metrics_port is not None:
+        MetricsServer(args.metrics_port, args.metrics_host).start()
+    
+    memory = None
+    if args.memory_report:
+        memory = MemoryMonitor(args.memory_report, args.memory_interval)
+        memory.start()
+    
+    scenario = DEFAULT_SCENARIO
+    if args.scenario_seed is not None:
+        scenario = generate_scenario(args.scenario_seed, args.cities, spatial=args.spatial,
+                                     population=args.population, defense_limit=args.defense_limit,
+                                     target_limit=args.target_limit)
+    
+    history = GameHistory(args.history) if args.history else None
+    if args.connect:
+        from client import RemoteWarGame
+        game = RemoteWarGame(args.connect, args.side, args.room,
+                             renderer=args.renderer, software_renderer=args.software_renderer,
+                             display_size=args.display_size, smooth_scaling=args.smooth_scaling)
+    else:
+        ai_opponent = None
+        if args.adaptive_ai:
+            ai_opponent = AdaptiveOpponent(scenario.usa_cities, scenario.ussr_cities,
+                                           scenario.defense_limit, scenario.target_limit)
+        game = WarGame(history, ai_opponent, checkpoint_path=args.checkpoint, scenario=scenario,
+                       renderer=args.renderer, software_renderer=args.software_renderer,
+                       display_size=args.display_size, smooth_scaling=args.smooth_scaling)
+    game.report_latency = args.latency_report
+    game.memory = memory
+    if memory is not None:
+        memory.attach(game)
+    if args.threaded and not args.connect:
+        ThreadedRunner(game, args.sim_rate).run()
+        return
     game.run()
 
 
@@ -0,0 +1,138 @@
+"""
+Adaptive AI opponent that learns the player's defense and target habits
+"""
+
+import heapq
+import random
+from typing import Callable, Iterable, List, Optional, Set, Tuple
+
+from city_data import USA_CITIES, USSR_CITIES
+from config import DEFENSE_LIMIT, TARGET_LIMIT
+
+PRIOR_STRENGTH = 2.0
+DECAY = 0.98
+EXPLORATION = 0.1
+RESCALE_LIMIT = 1e12
+
+
+class CityFrequencyModel:
+
+    def __init__(self, city_count: int, picks_per_game: int,
+                 prior_strength: float = PRIOR_STRENGTH, decay: float = DECAY):
+        self.counts = [0.0] * city_count
+        self.total = 0.0
+        # The prior is a pseudo-count in the same units as the counts, so it
+        # fades like an old game instead of rescaling every city each update.
+        self.prior = prior_strength
+        self.base_rate = picks_per_game / city_count if city_count else 0.0
+        self.decay = decay
+        self._weight = 1.0
+
+    def observe(self, picks: Iterable[int]) -> None:
+        # Forgetting old games is done by growing the weight of new ones, so an
+        # update touches only the picked cities instead of decaying every count.
+        weight = self._weight
+        for idx in picks:
+            self.counts[idx] += weight
+        self.total += weight
+        self._weight = weight / self.decay
+        if self._weight > RESCALE_LIMIT:
+            self._rescale()
+
+    def _rescale(self) -> None:
+        # A uniform scale, so every ranking built on the counts still holds.
+        scale = 1.0 / self._weight
+        self.counts[:] = [count * scale for count in self.counts]
+        self.total *= scale
+        self.prior *= scale
+        self._weight = 1.0
+
+    def probability(self, idx: int) -> float:
+        return (self.counts[idx] + self.prior * self.base_rate) / (self.total + self.prior)
+
+
+class RankedTable:
+
+    def __init__(self, city_count: int, size: int, score: Callable[[int], float]):
+        # The best size cities by a score that only ever rises, and only for
+        # cities passed to raised(), so the table is kept in O(size) per pick.
+        # Ties go to the lowest index.
+        self.score = score
+        self.members: Set[int] = set(heapq.nlargest(size, range(city_count), key=self._key))
+
+    def _key(self, idx: int) -> Tuple[float, int]:
+        return self.score(idx), -idx
+
+    def raised(self, idx: int) -> None:
+        if idx in self.members or not self.members:
+            return
+        weakest = min(self.members, key=self._key)
+        if self._key(idx) > self._key(weakest):
+            self.members.remove(weakest)
+            self.members.add(idx)
+
+
+class AdaptiveOpponent:
+
+    def __init__(self, usa_cities: List[dict] = USA_CITIES, ussr_cities: List[dict] = USSR_CITIES,
+                 defense_limit: int = DEFENSE_LIMIT, target_limit: int = TARGET_LIMIT,
+                 exploration: float = EXPLORATION, decay: float = DECAY,
+                 rng: Optional[random.Random] = None):
+        self.defense_limit = defense_limit
+        self.target_limit = target_limit
+        self.exploration = exploration
+        self.rng = rng or random.Random()
+        self.games_observed = 0
+
+        self.usa_population = [city["population"] for city in usa_cities]
+        self.ussr_population = [city["population"] for city in ussr_cities]
+        self.player_defenses = CityFrequencyModel(len(usa_cities), defense_limit, decay=decay)
+        self.player_targets = CityFrequencyModel(len(ussr_cities), target_limit, decay=decay)
+
+        # Marginal-value tables, updated in observe() for the picked cities
+        # only. Defending a city is worth its population times how often the
+        # player strikes it; a target is worth its population unless it is
+        # one of the cities the player is expected to defend.
+        self.defense_table = RankedTable(len(ussr_cities), defense_limit, self._defense_value)
+        self.expected_defenses = RankedTable(len(usa_cities), defense_limit,
+                                             self.player_defenses.counts.__getitem__)
+        self.usa_by_population = sorted(range(len(usa_cities)),
+                                        key=lambda idx: (-self.usa_population[idx], idx))
+
+    def observe(self, player_defenses: Set[int], player_targets: Set[int]) -> None:
+        self.player_defenses.observe(player_defenses)
+        self.player_targets.observe(player_targets)
+        for idx in player_targets:
+            self.defense_table.raised(idx)
+        for idx in player_defenses:
+            self.expected_defenses.raised(idx)
+        self.games_observed += 1
+
+    def _defense_value(self, idx: int) -> float:
+        targets = self.player_targets
+        return self.ussr_population[idx] * (targets.counts[idx] + targets.prior * targets.base_rate)
+
+    def _targets(self) -> Set[int]:
+        # Walks cities by population past at most defense_limit expected
+        # defenses, so a query costs O(target_limit + defense_limit).
+        counts = self.player_defenses.counts
+        defended = {idx for idx in self.expected_defenses.members if counts[idx] > 0}
+        targets: List[int] = []
+        for idx in self.usa_by_population:
+            if len(targets) == self.target_limit:
+                return set(targets)
+            if idx not in defended:
+                targets.append(idx)
+        # Fewer open cities than warheads: the rest go to the largest defended.
+        for idx in self.usa_by_population:
+            if len(targets) == self.target_limit:
+                break
+            if idx in defended:
+                targets.append(idx)
+        return set(targets)
+
+    def choose(self) -> Tuple[Set[int], Set[int]]:
+        if self.games_observed == 0 or self.rng.random() < self.exploration:
+            return (set(self.rng.sample(range(len(self.ussr_population)), self.defense_limit)),
+                    set(self.rng.sample(range(len(self.usa_population)), self.target_limit)))
+        return set(self.defense_table.members), self._targets()
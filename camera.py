@@ -0,0 +1,176 @@
+"""
+Map camera with pan and stepped zoom, a canvas that draws through it, and a spatial grid
+"""
+
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import pygame
+
+from render_backend import Canvas, scaled_surface
+
+MAX_ZOOM_STEP = 8
+STEPS_PER_DOUBLING = 2
+PAN_STEP = 80
+GRID_CELL = 64
+
+
+class Camera:
+
+    def __init__(self, world_size: Tuple[int, int], view_size: Optional[Tuple[int, int]] = None,
+                 max_step: int = MAX_ZOOM_STEP):
+        self.world_size = world_size
+        self.view_size = view_size or world_size
+        self.max_step = max_step
+        self.step = 0
+        self.x = 0.0
+        self.y = 0.0
+
+    @property
+    def zoom(self) -> float:
+        return 2 ** (self.step / STEPS_PER_DOUBLING)
+
+    @property
+    def offset(self) -> Tuple[int, int]:
+        # Whole screen pixels, so tiles, markers and the pick buffer all land
+        # on the same grid.
+        zoom = self.zoom
+        return round(self.x * zoom), round(self.y * zoom)
+
+    @property
+    def key(self) -> Tuple[int, int, int]:
+        return (self.step,) + self.offset
+
+    @property
+    def is_identity(self) -> bool:
+        return self.key == (0, 0, 0)
+
+    def to_screen(self, point) -> Tuple[int, int]:
+        zoom = self.zoom
+        offset_x, offset_y = self.offset
+        return round(point[0] * zoom) - offset_x, round(point[1] * zoom) - offset_y
+
+    def to_world(self, pos) -> Tuple[float, float]:
+        zoom = self.zoom
+        offset_x, offset_y = self.offset
+        return (pos[0] + offset_x) / zoom, (pos[1] + offset_y) / zoom
+
+    def visible_rect(self) -> Tuple[float, float, float, float]:
+        left, top = self.to_world((0, 0))
+        right, bottom = self.to_world(self.view_size)
+        return left, top, right, bottom
+
+    def _clamp(self) -> None:
+        zoom = self.zoom
+        self.x = min(max(self.x, 0.0), max(self.world_size[0] - self.view_size[0] / zoom, 0.0))
+        self.y = min(max(self.y, 0.0), max(self.world_size[1] - self.view_size[1] / zoom, 0.0))
+
+    def pan(self, dx: float, dy: float) -> None:
+        zoom = self.zoom
+        self.x -= dx / zoom
+        self.y -= dy / zoom
+        self._clamp()
+
+    def zoom_at(self, pos, steps: int) -> None:
+        # The world point under the cursor stays under the cursor.
+        world_x, world_y = self.to_world(pos)
+        self.step = min(max(self.step + steps, 0), self.max_step)
+        zoom = self.zoom
+        self.x = world_x - pos[0] / zoom
+        self.y = world_y - pos[1] / zoom
+        self._clamp()
+
+    def reset(self) -> None:
+        self.step = 0
+        self.x = self.y = 0.0
+
+
+class CameraCanvas(Canvas):
+
+    def __init__(self, target: Canvas, camera: Camera):
+        self.target = target
+        self.camera = camera
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.camera.world_size
+
+    def _length(self, length: int) -> int:
+        return max(round(length * self.camera.zoom), 1) if length else 0
+
+    def _rect(self, rect) -> pygame.Rect:
+        rect = pygame.Rect(rect)
+        left, top = self.camera.to_screen(rect.topleft)
+        right, bottom = self.camera.to_screen(rect.bottomright)
+        return pygame.Rect(left, top, right - left, bottom - top)
+
+    def fill(self, colour: tuple) -> None:
+        self.target.fill(colour)
+
+    def blit(self, source: pygame.Surface, dest, alpha: Optional[int] = None) -> None:
+        if isinstance(dest, pygame.Rect):
+            dest = dest.topleft
+        self.target.blit(scaled_surface(source, self.camera.zoom), self.camera.to_screen(dest), alpha)
+
+    def line(self, colour: tuple, start, end, width: int = 1) -> None:
+        self.target.line(colour, self.camera.to_screen(start), self.camera.to_screen(end),
+                         self._length(width))
+
+    def circle(self, colour: tuple, center, radius: int, width: int = 0) -> None:
+        self.target.circle(colour, self.camera.to_screen(center), self._length(radius),
+                           self._length(width))
+
+    def rect(self, colour: tuple, rect, width: int = 0, border_radius: int = 0) -> None:
+        self.target.rect(colour, self._rect(rect), self._length(width), self._length(border_radius))
+
+    def splat(self, xs: np.ndarray, ys: np.ndarray, colours: np.ndarray, alphas: np.ndarray) -> None:
+        zoom = self.camera.zoom
+        offset_x, offset_y = self.camera.offset
+        xs = (xs * zoom).astype(np.intp) - offset_x
+        ys = (ys * zoom).astype(np.intp) - offset_y
+        width, height = self.camera.view_size
+        inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        if not inside.all():
+            xs, ys, colours, alphas = xs[inside], ys[inside], colours[inside], alphas[inside]
+        self.target.splat(xs, ys, colours, alphas)
+
+    def invalidate(self, source: pygame.Surface, rects: Iterable[pygame.Rect]) -> None:
+        self.target.invalidate(source, rects)
+
+    @property
+    def retains_frame(self) -> bool:
+        return self.target.retains_frame
+
+    def set_clip(self, rect: Optional[pygame.Rect]) -> None:
+        self.target.set_clip(rect)
+
+
+class SpatialGrid:
+
+    def __init__(self, xs: np.ndarray, ys: np.ndarray, cell_size: int = GRID_CELL):
+        self.cell_size = cell_size
+        cols = np.asarray(xs, dtype=np.intp) // cell_size
+        rows = np.asarray(ys, dtype=np.intp) // cell_size
+        self.origin = (int(cols.min()), int(rows.min())) if len(cols) else (0, 0)
+        cols -= self.origin[0]
+        rows -= self.origin[1]
+        self.shape = (int(rows.max()) + 1, int(cols.max()) + 1) if len(cols) else (0, 0)
+        # Points sorted by cell; each cell is one contiguous run of indices.
+        cells = rows * self.shape[1] + cols
+        self.order = np.argsort(cells, kind="stable")
+        self.starts = np.searchsorted(cells[self.order], np.arange(self.shape[0] * self.shape[1] + 1))
+
+    def query(self, left: float, top: float, right: float, bottom: float) -> np.ndarray:
+        # Indices of every point in the cells the rectangle touches, in their
+        # original order, so overlapping sprites stack as before.
+        size = self.cell_size
+        col_lo = max(int(left // size) - self.origin[0], 0)
+        col_hi = min(int(right // size) - self.origin[0], self.shape[1] - 1)
+        row_lo = max(int(top // size) - self.origin[1], 0)
+        row_hi = min(int(bottom // size) - self.origin[1], self.shape[0] - 1)
+        if col_lo > col_hi or row_lo > row_hi:
+            return np.empty(0, dtype=np.intp)
+        runs = [self.order[self.starts[row * self.shape[1] + col_lo]:
+                           self.starts[row * self.shape[1] + col_hi + 1]]
+                for row in range(row_lo, row_hi + 1)]
+        return np.sort(np.concatenate(runs))
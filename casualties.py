@@ -0,0 +1,152 @@
+"""
+Casualties from population-density rasters convolved with a blast and fallout kernel
+"""
+
+import math
+import weakref
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import CITY_RADIUS, EXPLOSION_RADIUS, WINDOW_HEIGHT, WINDOW_WIDTH
+from scenario import Scenario
+
+CELL_SIZE = 4
+SPRAWL_SIGMA = CITY_RADIUS
+BLAST_CORE = 0.4
+LETHAL_EXPOSURE = -math.log(0.02)
+FALLOUT_LENGTH = EXPLOSION_RADIUS * 3
+FALLOUT_WIDTH = EXPLOSION_RADIUS / 3
+FALLOUT_EXPOSURE = -math.log(0.8)
+
+
+def _fast_length(n: int) -> int:
+    # FFT sizes with only factors 2, 3 and 5 are far faster than arbitrary ones.
+    while True:
+        m = n
+        for factor in (2, 3, 5):
+            while m % factor == 0:
+                m //= factor
+        if m == 1:
+            return n
+        n += 1
+
+
+class Kernel:
+
+    def __init__(self, weights: np.ndarray, origin: Tuple[int, int]):
+        self.weights = weights.astype(np.float64)
+        self.origin = origin
+        self._spectra: Dict[Tuple[int, int], np.ndarray] = {}
+        rows, cols = np.nonzero(self.weights)
+        self._offsets = (rows - origin[0], cols - origin[1])
+        self._values = self.weights[rows, cols]
+
+    def spectrum(self, shape: Tuple[int, int]) -> np.ndarray:
+        spectrum = self._spectra.get(shape)
+        if spectrum is None:
+            spectrum = np.fft.rfft2(self.weights, shape)
+            self._spectra[shape] = spectrum
+        return spectrum
+
+    def footprint(self, row: int, col: int, shape: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+        # Flat cell indices and weights of one impact, clipped to the grid.
+        rows, cols = row + self._offsets[0], col + self._offsets[1]
+        inside = (rows >= 0) & (rows < shape[0]) & (cols >= 0) & (cols < shape[1])
+        return rows[inside] * shape[1] + cols[inside], self._values[inside]
+
+    def convolve(self, rows: np.ndarray, cols: np.ndarray, weights: np.ndarray,
+                 shape: Tuple[int, int]) -> np.ndarray:
+        # A handful of impacts is cheaper to stamp directly; a large salvo is
+        # one FFT of the impact raster against the cached kernel spectrum.
+        height, width = shape
+        if len(rows) * len(self._values) <= height * width:
+            ys = (rows[:, None] + self._offsets[0]).ravel()
+            xs = (cols[:, None] + self._offsets[1]).ravel()
+            values = (weights[:, None] * self._values).ravel()
+            inside = (ys >= 0) & (ys < height) & (xs >= 0) & (xs < width)
+            flat = np.bincount(ys[inside] * width + xs[inside], values[inside],
+                               minlength=height * width)
+            return flat.reshape(shape)
+
+        impacts = np.bincount(rows * width + cols, weights, minlength=height * width).reshape(shape)
+        kernel_height, kernel_width = self.weights.shape
+        padded = (_fast_length(height + kernel_height - 1), _fast_length(width + kernel_width - 1))
+        result = np.fft.irfft2(np.fft.rfft2(impacts, padded) * self.spectrum(padded), padded)
+        top, left = self.origin
+        return result[top:top + height, left:left + width]
+
+
+def sprawl_kernel(sigma: float = SPRAWL_SIGMA) -> Kernel:
+    reach = max(int(math.ceil(3 * sigma / CELL_SIZE)), 1)
+    offsets = np.arange(-reach, reach + 1) * CELL_SIZE
+    profile = np.exp(-offsets ** 2 / (2 * sigma ** 2))
+    weights = np.outer(profile, profile)
+    return Kernel(weights / weights.sum(), (reach, reach))
+
+
+def blast_kernel(radius: float = EXPLOSION_RADIUS) -> Kernel:
+    # Exposure is -ln(survival): full lethality inside the core, fading to
+    # nothing at the blast radius, plus a fallout plume drifting east.
+    reach = int(math.ceil(radius / CELL_SIZE))
+    downwind = int(math.ceil(FALLOUT_LENGTH / CELL_SIZE))
+    dy = np.arange(-reach, reach + 1)[:, None] * CELL_SIZE
+    dx = np.arange(-reach, downwind + 1)[None, :] * CELL_SIZE
+    distance = np.hypot(dx, dy)
+
+    core = radius * BLAST_CORE
+    blast = LETHAL_EXPOSURE * np.clip((radius - distance) / (radius - core), 0, 1)
+    fallout = np.where(dx > 0, FALLOUT_EXPOSURE * np.exp(-dx / FALLOUT_LENGTH) *
+                       np.exp(-dy ** 2 / (2 * FALLOUT_WIDTH ** 2)), 0)
+    return Kernel(blast + fallout, (reach, reach))
+
+
+class CasualtyModel:
+
+    def __init__(self, scenario: Scenario, kernel: Optional[Kernel] = None):
+        self.shape = (-(-WINDOW_HEIGHT // CELL_SIZE), -(-WINDOW_WIDTH // CELL_SIZE))
+        self.kernel = kernel or blast_kernel()
+        self.usa_cells = self._cells(scenario.usa_cities)
+        self.ussr_cells = self._cells(scenario.ussr_cities)
+        self.total_usa = sum(city["population"] for city in scenario.usa_cities)
+        self.total_ussr = sum(city["population"] for city in scenario.ussr_cities)
+
+        sprawl = sprawl_kernel()
+        self.usa_density = self._density(sprawl, self.usa_cells, scenario.usa_cities)
+        self.ussr_density = self._density(sprawl, self.ussr_cells, scenario.ussr_cities)
+
+    def _cells(self, cities: List[dict]) -> Tuple[np.ndarray, np.ndarray]:
+        rows = np.array([city["y"] for city in cities], dtype=np.intp) // CELL_SIZE
+        cols = np.array([city["x"] for city in cities], dtype=np.intp) // CELL_SIZE
+        return np.clip(rows, 0, self.shape[0] - 1), np.clip(cols, 0, self.shape[1] - 1)
+
+    def _density(self, sprawl: Kernel, cells: Tuple[np.ndarray, np.ndarray],
+                 cities: List[dict]) -> np.ndarray:
+        population = np.array([city["population"] for city in cities], dtype=np.float64)
+        return np.maximum(sprawl.convolve(cells[0], cells[1], population, self.shape), 0)
+
+    def exposure(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        return self.kernel.convolve(rows, cols, np.ones(len(rows)), self.shape)
+
+    def casualties(self, usa_hit: Sequence[int], ussr_hit: Sequence[int]) -> Tuple[float, float]:
+        usa_hit = np.asarray(usa_hit, dtype=np.intp)
+        ussr_hit = np.asarray(ussr_hit, dtype=np.intp)
+        rows = np.concatenate((self.usa_cells[0][usa_hit], self.ussr_cells[0][ussr_hit]))
+        cols = np.concatenate((self.usa_cells[1][usa_hit], self.ussr_cells[1][ussr_hit]))
+        if not len(rows):
+            return 0.0, 0.0
+        killed = -np.expm1(-np.maximum(self.exposure(rows, cols), 0))
+        return (float(np.vdot(self.usa_density, killed)),
+                float(np.vdot(self.ussr_density, killed)))
+
+
+_models: "weakref.WeakKeyDictionary[Scenario, CasualtyModel]" = weakref.WeakKeyDictionary()
+
+
+def casualty_model(scenario: Scenario) -> CasualtyModel:
+    # Rasters depend only on the theater, so every game on it shares them.
+    model = _models.get(scenario)
+    if model is None:
+        model = CasualtyModel(scenario)
+        _models[scenario] = model
+    return model
@@ -0,0 +1,302 @@
+"""
+Networked WarGames client that renders a server-owned match
+"""
+
+import asyncio
+import bisect
+import queue
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import pygame
+
+from city_data import USA_CITIES, USSR_CITIES
+from config import DEFENSE_LIMIT, TARGET_LIMIT, GameState
+from missiles import MissileSystem
+from protocol import (
+    DEFAULT_ROOM,
+    ProtocolError,
+    cloud_from_snapshot,
+    decode_message,
+    encode_message,
+    missile_from_snapshot,
+    open_connection,
+    read_frame,
+)
+from snapshot import SnapshotDecoder
+from WarGames import WarGame
+
+INTERPOLATION_DELAY = 100
+
+
+class MatchClient:
+
+    def __init__(self, address: str):
+        self.address = address
+        self.messages: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def join(self, side: str, room: str, defenses: List[int], targets: List[int]) -> None:
+        hello = {"op": "join", "side": side, "room": room,
+                 "defenses": defenses, "targets": targets}
+        self._thread = threading.Thread(target=asyncio.run, args=(self._session(hello),),
+                                        daemon=True)
+        self._thread.start()
+
+    async def _session(self, hello: Dict[str, Any]) -> None:
+        self._loop = asyncio.get_running_loop()
+        try:
+            reader, self._writer = await open_connection(self.address)
+            self._writer.write(encode_message(hello))
+            await self._writer.drain()
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.messages.put(decode_message(line))
+        except (OSError, ValueError, ProtocolError) as exc:
+            self.messages.put({"op": "error", "message": f"CONNECTION FAILED: {exc}"})
+        finally:
+            if self._writer is not None:
+                self._writer.close()
+            self.messages.put({"op": "closed"})
+
+    def poll(self) -> List[Dict[str, Any]]:
+        pending = []
+        while True:
+            try:
+                pending.append(self.messages.get_nowait())
+            except queue.Empty:
+                return pending
+
+    def close(self) -> None:
+        if self._loop is not None and self._writer is not None:
+            self._loop.call_soon_threadsafe(self._writer.close)
+
+
+async def spectate(address: str, room: str = DEFAULT_ROOM) -> AsyncIterator[Tuple[int, SnapshotDecoder]]:
+    reader, writer = await open_connection(address)
+    writer.write(encode_message({"op": "spectate", "room": room}))
+    decoders: Dict[int, SnapshotDecoder] = {}
+    try:
+        while True:
+            match_id, payload = await read_frame(reader)
+            if not payload:
+                decoders.pop(match_id, None)
+                continue
+            decoder = decoders.setdefault(match_id, SnapshotDecoder())
+            decoder.decode(payload)
+            yield match_id, decoder
+    except asyncio.IncompleteReadError:
+        return
+    finally:
+        writer.close()
+
+
+class SnapshotInterpolator:
+
+    def __init__(self, delay: int = INTERPOLATION_DELAY, history: int = 32):
+        self.delay = delay
+        self.snapshots: deque = deque(maxlen=history)
+        self.times: deque = deque(maxlen=history)
+        self.clock_offset: Optional[int] = None
+
+    def push(self, snapshot: Dict[str, Any], local_time: int) -> None:
+        # The least-delayed snapshot gives the tightest estimate of the server clock.
+        offset = snapshot["t"] - local_time
+        if self.clock_offset is None or offset > self.clock_offset:
+            self.clock_offset = offset
+        if self.times and snapshot["t"] <= self.times[-1]:
+            return
+        self.snapshots.append(snapshot)
+        self.times.append(snapshot["t"])
+
+    def server_time(self, local_time: int) -> int:
+        if self.clock_offset is None:
+            return 0
+        return local_time + self.clock_offset - self.delay
+
+    def sample(self, render_time: int) -> Optional[Dict[str, Any]]:
+        if not self.snapshots:
+            return None
+
+        idx = bisect.bisect_right(self.times, render_time)
+        if idx == 0:
+            return self._build(self.snapshots[0], None, 0.0)
+        if idx == len(self.snapshots):
+            return self._build(self.snapshots[-1], None, 0.0)
+
+        before, after = self.snapshots[idx - 1], self.snapshots[idx]
+        alpha = (render_time - before["t"]) / (after["t"] - before["t"])
+        return self._build(before, after, alpha)
+
+    def _build(self, before: Dict[str, Any], after: Optional[Dict[str, Any]],
+               alpha: float) -> Dict[str, Any]:
+        # Missiles are paired by id, not list position, so a snapshot pair
+        # that straddles a change to the missile list never blends two
+        # different missiles.
+        later = {entry[7]: entry[5] for entry in after["m"]} if after is not None else {}
+        missiles = []
+        for entry in before["m"]:
+            progress = entry[5]
+            if entry[7] in later:
+                progress += (later[entry[7]] - progress) * alpha
+            missiles.append(missile_from_snapshot(entry, progress))
+
+        return {
+            "missiles": missiles,
+            "clouds": [cloud_from_snapshot(entry) for entry in before["k"]],
+            "usa_mask": before["u"],
+            "ussr_mask": before["r"],
+        }
+
+
+class RemoteWarGame(WarGame):
+
+    def __init__(self, address: str, side: str, room: str, renderer: str = "surface",
+                 software_renderer: bool = False, display_size: Optional[Tuple[int, int]] = None,
+                 smooth_scaling: bool = False):
+        super().__init__(renderer=renderer, software_renderer=software_renderer,
+                         display_size=display_size, smooth_scaling=smooth_scaling)
+        self.address = address
+        self.side = side
+        self.room = room
+        self.client: Optional[MatchClient] = None
+        self.interpolator = SnapshotInterpolator()
+        self.render_time = 0
+        self.done_time: Optional[int] = None
+        self.status_lines: List[str] = []
+        self.missile_system = MissileSystem(get_ticks=lambda: self.render_time,
+                                            store=self.game_state.store)
+
+    def _own_cities(self) -> List[dict]:
+        return USA_CITIES if self.side == "usa" else USSR_CITIES
+
+    def _enemy_cities(self) -> List[dict]:
+        return USSR_CITIES if self.side == "usa" else USA_CITIES
+
+    def _selection_cities(self, state: GameState) -> List[dict]:
+        if state == GameState.DEFENSIVE:
+            return self._own_cities()
+        if state == GameState.OFFENSIVE:
+            return self._enemy_cities()
+        return []
+
+    def _start_missile_launch(self):
+        self.interpolator = SnapshotInterpolator()
+        self.done_time = None
+        self.status_lines = ["CONNECTING TO " + self.address.upper()]
+        self.missile_system.reset()
+
+        self.client = MatchClient(self.address)
+        self.client.join(self.side, self.room,
+                         sorted(self.game_state.player_defenses),
+                         sorted(self.game_state.player_targets))
+        self.game_state.current_state = GameState.LAUNCHING
+
+    def _handle_message(self, message: Dict[str, Any], local_time: int) -> None:
+        op = message["op"]
+        if op == "waiting":
+            self.status_lines = ["WAITING FOR OPPONENT", "", f"Room: {message['room']}"]
+        elif op == "start":
+            self.game_state.player_defenses = set(message["usa_defenses"])
+            self.game_state.player_targets = set(message["usa_targets"])
+            self.game_state.ai_defenses = set(message["ussr_defenses"])
+            self.game_state.ai_targets = set(message["ussr_targets"])
+            self.status_lines = []
+        elif op == "s":
+            self.interpolator.push(message, local_time)
+        elif op == "done":
+            self.done_time = message["t"]
+        elif op == "error":
+            self.status_lines = [message["message"], "", "Press RESET to return to menu"]
+        elif op == "closed" and self.done_time is None and not self.status_lines:
+            self.status_lines = ["CONNECTION LOST", "", "Press RESET to return to menu"]
+
+    def _apply_destroyed(self, mask: int, destroyed_field: str, names_field: str,
+                         cities: List[dict]) -> None:
+        store = self.game_state.store
+        for idx in range(len(cities)):
+            if mask >> idx & 1 and not store.get(destroyed_field)[idx]:
+                store.mutable(destroyed_field)[idx] = True
+                store.changed(destroyed_field, idx)
+                store.mutable(names_field).append(cities[idx]["name"])
+
+    def update(self):
+        if self.game_state.current_state not in (GameState.LAUNCHING, GameState.RESULTS):
+            if self.client is not None:
+                self.client.close()
+                self.client = None
+            super().update()
+            return
+        if self.client is None:
+            return
+
+        local_time = pygame.time.get_ticks()
+        for message in self.client.poll():
+            self._handle_message(message, local_time)
+
+        self.render_time = self.interpolator.server_time(local_time)
+        sample = self.interpolator.sample(self.render_time)
+        if sample is None:
+            return
+
+        self.missile_system.missile_lines = sample["missiles"]
+        self.missile_system.mushroom_clouds = sample["clouds"]
+        self._apply_destroyed(sample["usa_mask"], "usa_destroyed", "us_cities_destroyed", USA_CITIES)
+        self._apply_destroyed(sample["ussr_mask"], "ussr_destroyed", "ussr_cities_destroyed",
+                              USSR_CITIES)
+
+        if self.done_time is not None and self.render_time >= self.done_time:
+            self.game_state.current_state = GameState.RESULTS
+
+    def _launch_status_lines(self) -> list:
+        return self.status_lines or super()._launch_status_lines()
+
+    def _render_defensive_phase(self):
+        if self.side == "usa":
+            super()._render_defensive_phase()
+            return
+        self._render_selection_phase(
+            ["DEFENSIVE PHASE", "", "Click on USSR cities to place defenses",
+             f"Defenses Selected: {len(self.game_state.player_defenses)}/{DEFENSE_LIMIT}"],
+            lambda: self.ui.city_renderer.draw_ussr_cities(
+                self.screen,
+                self.game_state.ussr_destroyed,
+                self.game_state.player_defenses,
+                set()
+            ),
+            self.game_state.can_continue_to_offensive(), self.ui.continue_button)
+
+    def _render_offensive_phase(self):
+        if self.side == "usa":
+            super()._render_offensive_phase()
+            return
+        self._render_selection_phase(
+            ["OFFENSIVE PHASE", "", "Click on US cities to target",
+             f"Targets Selected: {len(self.game_state.player_targets)}/{TARGET_LIMIT}"],
+            lambda: self.ui.city_renderer.draw_usa_cities(
+                self.screen,
+                self.game_state.usa_destroyed,
+                set(),
+                set(),
+                self.game_state.player_targets
+            ),
+            self.game_state.can_launch_missiles(), self.ui.launch_button)
+
+    def _render_selection_phase(self, instruction_lines: List[str], draw_cities: Callable[[], None],
+                                can_advance: bool, advance_button) -> None:
+        self.ui.draw_title(self.screen)
+        self.ui.draw_windowed_text(self.screen, instruction_lines)
+        self.ui.draw_help_prompt(self.screen)
+        self.ui.reset_button.draw(self.screen)
+        draw_cities()
+
+        if self.game_state.show_help:
+            self.ui.draw_comprehensive_help(self.screen)
+
+        if can_advance:
+            advance_button.draw(self.screen)
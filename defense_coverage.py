@@ -0,0 +1,125 @@
+"""
+Defense coverage heatmap: how many interceptor sites reach each point on the map
+"""
+
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pygame
+
+from camera import Camera
+from config import INTERCEPT_RADIUS, WINDOW_HEIGHT, WINDOW_WIDTH
+from render_backend import Canvas
+
+# Cyan rather than the map green, which would vanish over land.
+COVERAGE_COLOUR = (0, 200, 255)
+# Alpha by number of covering sites; anything past the end uses the last.
+COVERAGE_ALPHA = (0, 40, 75, 100, 120, 135)
+
+
+def coverage_rect(point: Tuple[int, int], camera: Camera, radius: int = INTERCEPT_RADIUS) -> pygame.Rect:
+    # Screen area a site's disc can touch, for partial redraws.
+    left, top = camera.to_screen((point[0] - radius, point[1] - radius))
+    size = int(np.ceil((radius * 2 + 1) * camera.zoom)) + 2
+    return pygame.Rect(left - 1, top - 1, size, size)
+
+
+class CoverageLayer:
+
+    def __init__(self, size: Tuple[int, int] = (WINDOW_WIDTH, WINDOW_HEIGHT),
+                 radius: int = INTERCEPT_RADIUS, alphas: Tuple[int, ...] = COVERAGE_ALPHA):
+        self.size = size
+        self.radius = radius
+        self.counts = np.zeros(size, dtype=np.int16)
+        offsets = np.arange(-radius, radius + 1)
+        self.stencil = (offsets[:, None] ** 2 + offsets[None, :] ** 2 <= radius ** 2).astype(np.int16)
+        self.alphas = np.array(alphas, dtype=np.uint8)
+        self.sites: Dict[int, Tuple[int, int]] = {}
+        self.surface = pygame.Surface(size, pygame.SRCALPHA)
+        self.surface.fill(COVERAGE_COLOUR + (0,))
+        self.bounds: Optional[pygame.Rect] = None
+        self.version = 0
+        self._cities_id: Optional[int] = None
+        self._view: Optional[pygame.Surface] = None
+        self._pending: List[pygame.Rect] = []
+        self._scaled: Optional[Tuple[tuple, pygame.Surface, Tuple[int, int]]] = None
+
+    def _disc(self, point: Tuple[int, int]) -> pygame.Rect:
+        x, y = point
+        rect = pygame.Rect(x - self.radius, y - self.radius, self.radius * 2 + 1, self.radius * 2 + 1)
+        return rect.clip(pygame.Rect((0, 0), self.size))
+
+    def _stamp(self, point: Tuple[int, int], sign: int) -> pygame.Rect:
+        rect = self._disc(point)
+        left, top = rect.left - (point[0] - self.radius), rect.top - (point[1] - self.radius)
+        stencil = self.stencil[left:left + rect.width, top:top + rect.height]
+        self.counts[rect.left:rect.right, rect.top:rect.bottom] += sign * stencil
+        return rect
+
+    def sync(self, defenses: Set[int], cities: List[dict]) -> None:
+        # Only sites that were added or removed since the last call are
+        # stamped, and only the pixels around them are recoloured.
+        if id(cities) != self._cities_id:
+            self.clear()
+            self._cities_id = id(cities)
+        changed = [self._stamp(self.sites.pop(idx), -1) for idx in self.sites.keys() - defenses]
+        for idx in defenses - self.sites.keys():
+            self.sites[idx] = (cities[idx]["x"], cities[idx]["y"])
+            changed.append(self._stamp(self.sites[idx], 1))
+        if changed:
+            # A bulk change such as a restored checkpoint recolours one
+            # bounding box rather than every overlapping disc in turn.
+            self._recolour([changed[0].unionall(changed[1:])] if len(changed) > 8 else changed)
+
+    def clear(self) -> None:
+        if self.sites:
+            self.counts.fill(0)
+            self.sites.clear()
+            self._recolour([pygame.Rect((0, 0), self.size)])
+
+    def _recolour(self, rects: List[pygame.Rect]) -> None:
+        alpha = pygame.surfarray.pixels_alpha(self.surface)
+        top = len(self.alphas) - 1
+        for rect in rects:
+            counts = self.counts[rect.left:rect.right, rect.top:rect.bottom]
+            alpha[rect.left:rect.right, rect.top:rect.bottom] = self.alphas[np.minimum(counts, top)]
+        del alpha
+
+        bounds = [self._disc(point) for point in self.sites.values()]
+        bounds = bounds[0].unionall(bounds[1:]) if bounds else None
+        if bounds != self.bounds:
+            self.bounds = bounds
+            self._view = None if bounds is None else self.surface.subsurface(bounds)
+            self._pending = []
+        elif bounds is not None:
+            self._pending += [rect.clip(bounds).move(-bounds.left, -bounds.top) for rect in rects]
+        self.version += 1
+
+    def draw(self, screen: Canvas, camera: Optional[Camera] = None) -> None:
+        # One blit of a cached surface covering just the defended area. Under
+        # a zoomed camera only the visible part is scaled, once per view.
+        if self._view is None:
+            return
+        if self._pending:
+            screen.invalidate(self._view, self._pending)
+            self._pending = []
+        if camera is None or camera.is_identity:
+            screen.blit(self._view, self.bounds.topleft)
+            return
+
+        key = (camera.key, self.version)
+        if self._scaled is None or self._scaled[0] != key:
+            self._scaled = None
+            left, top, right, bottom = camera.visible_rect()
+            visible = pygame.Rect(int(left), int(top), int(np.ceil(right)) - int(left) + 1,
+                                  int(np.ceil(bottom)) - int(top) + 1).clip(self.bounds)
+            if not visible.width or not visible.height:
+                return
+            zoom = camera.zoom
+            size = (round(visible.width * zoom), round(visible.height * zoom))
+            scaled = pygame.transform.smoothscale(self.surface.subsurface(visible), size)
+            self._scaled = (key, scaled, camera.to_screen(visible.topleft))
+        screen.blit(self._scaled[1], self._scaled[2])
+
+    def surfaces(self) -> List[pygame.Surface]:
+        return [self.surface] + ([self._scaled[1]] if self._scaled is not None else [])
@@ -0,0 +1,131 @@
+"""
+Resolves whole batches of games at once from selection masks, for strategy search and analytics
+"""
+
+import weakref
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from casualties import casualty_model
+from scenario import DEFAULT_SCENARIO, Scenario
+
+SUBSET_LIMIT = 12
+CHUNK_GAMES = 4096
+
+
+def fired_targets(defenses: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    # create_missile_lines pairs targets with defended cities in ascending
+    # index order, so targets past the number of launch sites get no missile.
+    return targets & (np.cumsum(targets, axis=1) <= defenses.sum(axis=1, keepdims=True))
+
+
+class GameEvaluator:
+
+    def __init__(self, scenario: Scenario = DEFAULT_SCENARIO, subset_limit: int = SUBSET_LIMIT):
+        model = casualty_model(scenario)
+        self.usa_count = len(scenario.usa_cities)
+        self.ussr_count = len(scenario.ussr_cities)
+
+        rows = np.concatenate((model.usa_cells[0], model.ussr_cells[0]))
+        cols = np.concatenate((model.usa_cells[1], model.ussr_cells[1]))
+        footprints = [model.kernel.footprint(row, col, model.shape) for row, col in zip(rows, cols)]
+        density = np.stack((model.usa_density.ravel(), model.ussr_density.ravel()), axis=1)
+
+        # Casualties are additive across groups of cities whose blast
+        # footprints never overlap, so each group is resolved on its own.
+        singles: List[int] = []
+        solo: List[np.ndarray] = []
+        self.tables: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        self.dense: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        for members in self._groups(footprints, model.shape):
+            cells = np.unique(np.concatenate([footprints[idx][0] for idx in members]))
+            exposure = np.zeros((len(members), len(cells)))
+            for slot, idx in enumerate(members):
+                exposure[slot, np.searchsorted(cells, footprints[idx][0])] = footprints[idx][1]
+            weights = density[cells]
+            if len(members) == 1:
+                # Lone cities fold into one matrix of their solo casualties.
+                singles.append(members[0])
+                solo.append(-np.expm1(-exposure[0]) @ weights)
+            elif len(members) <= subset_limit:
+                # Every subset of a small group is tabulated once, so a game
+                # costs one lookup per group.
+                subsets = (np.arange(2 ** len(members))[:, None] >> np.arange(len(members))) & 1
+                table = -np.expm1(-(subsets @ exposure)) @ weights
+                self.tables.append((np.array(members), 1 << np.arange(len(members)), table))
+            else:
+                self.dense.append((np.array(members), exposure, weights))
+
+        self.singles = np.array(singles, dtype=np.intp)
+        self.solo = np.array(solo).reshape(len(singles), 2)
+
+    @staticmethod
+    def _groups(footprints: List[Tuple[np.ndarray, np.ndarray]], shape: Tuple[int, int]) -> List[List[int]]:
+        parent = list(range(len(footprints)))
+
+        def find(idx: int) -> int:
+            while parent[idx] != idx:
+                parent[idx] = parent[parent[idx]]
+                idx = parent[idx]
+            return idx
+
+        owner = np.full(shape[0] * shape[1], -1, dtype=np.intp)
+        for idx, (cells, _) in enumerate(footprints):
+            for other in np.unique(owner[cells]):
+                if other >= 0:
+                    parent[find(other)] = idx
+            owner[cells] = idx
+
+        groups: Dict[int, List[int]] = {}
+        for idx in range(len(footprints)):
+            groups.setdefault(find(idx), []).append(idx)
+        return list(groups.values())
+
+    def _masks(self, masks: np.ndarray, count: int) -> np.ndarray:
+        masks = np.asarray(masks, dtype=bool)
+        if masks.ndim != 2 or masks.shape[1] != count:
+            raise ValueError(f"expected masks of shape (games, {count}), got {masks.shape}")
+        return masks
+
+    def evaluate(self, player_defenses: np.ndarray, player_targets: np.ndarray,
+                 ai_defenses: np.ndarray, ai_targets: np.ndarray) -> Dict[str, np.ndarray]:
+        player_defenses = self._masks(player_defenses, self.usa_count)
+        player_targets = self._masks(player_targets, self.ussr_count)
+        ai_defenses = self._masks(ai_defenses, self.ussr_count)
+        ai_targets = self._masks(ai_targets, self.usa_count)
+
+        # A warhead aimed at a defended city is always intercepted.
+        usa_destroyed = fired_targets(ai_defenses, ai_targets) & ~player_defenses
+        ussr_destroyed = fired_targets(player_defenses, player_targets) & ~ai_defenses
+        hits = np.concatenate((usa_destroyed, ussr_destroyed), axis=1)
+
+        casualties = hits[:, self.singles] @ self.solo
+        for members, bits, table in self.tables:
+            casualties += table[hits[:, members] @ bits]
+        for members, exposure, weights in self.dense:
+            # Too many cities to tabulate: exposure over the group's cells is
+            # one matrix product per chunk of games.
+            for start in range(0, len(hits), CHUNK_GAMES):
+                chunk = hits[start:start + CHUNK_GAMES, members].astype(np.float64)
+                casualties[start:start + CHUNK_GAMES] += -np.expm1(-(chunk @ exposure)) @ weights
+
+        return {
+            "usa_destroyed": usa_destroyed,
+            "ussr_destroyed": ussr_destroyed,
+            "us_casualties": casualties[:, 0],
+            "ussr_casualties": casualties[:, 1],
+        }
+
+
+_evaluators: "weakref.WeakKeyDictionary[Scenario, GameEvaluator]" = weakref.WeakKeyDictionary()
+
+
+def evaluate_games(player_defenses: np.ndarray, player_targets: np.ndarray,
+                   ai_defenses: np.ndarray, ai_targets: np.ndarray,
+                   scenario: Scenario = DEFAULT_SCENARIO) -> Dict[str, np.ndarray]:
+    evaluator = _evaluators.get(scenario)
+    if evaluator is None:
+        evaluator = GameEvaluator(scenario)
+        _evaluators[scenario] = evaluator
+    return evaluator.evaluate(player_defenses, player_targets, ai_defenses, ai_targets)
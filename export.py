@@ -0,0 +1,223 @@
+"""
+Offscreen export of complete engagements to GIF or PNG frame sequences
+"""
+
+import argparse
+import os
+import queue
+import random
+import struct
+import threading
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Set
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from city_data import USA_CITIES, USSR_CITIES
+from config import DEFENSE_LIMIT, TARGET_LIMIT, WINDOW_HEIGHT, WINDOW_WIDTH, GameState
+from missiles import MissileSystem
+from render_backend import SurfaceCanvas
+from WarGames import WarGame
+
+EXPORT_FPS = 30
+PNG_COMPRESSION = 6
+MAX_FRAMES = 100000
+
+
+def encode_png(raw: bytes, width: int, height: int) -> bytes:
+    stride = width * 3
+    source = memoryview(raw)
+    scanlines = bytearray((stride + 1) * height)
+    for y in range(height):
+        start = y * (stride + 1) + 1
+        scanlines[start:start + stride] = source[y * stride:(y + 1) * stride]
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return (struct.pack(">I", len(data)) + kind + data +
+                struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+    return (b"\x89PNG\r\n\x1a\n" +
+            chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)) +
+            chunk(b"IDAT", zlib.compress(scanlines, PNG_COMPRESSION)) +
+            chunk(b"IEND", b""))
+
+
+class FrameEncoderPool:
+
+    def __init__(self, encode: Callable[[int, bytes], Any], workers: int, queue_size: int):
+        self.encode = encode
+        self.frames: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        self.results: Dict[int, Any] = {}
+        self.error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+        self._workers = [threading.Thread(target=self._run, name=f"frame-encoder-{i}", daemon=True)
+                         for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self.frames.get()
+            if item is None:
+                return
+            index, raw = item
+            try:
+                result = self.encode(index, raw)
+            except BaseException as exc:
+                with self._lock:
+                    self.error = self.error or exc
+                continue
+            with self._lock:
+                self.results[index] = result
+
+    def submit(self, index: int, raw: bytes) -> None:
+        if self.error is not None:
+            raise self.error
+        self.frames.put((index, raw))
+
+    def close(self) -> Dict[int, Any]:
+        for _ in self._workers:
+            self.frames.put(None)
+        for worker in self._workers:
+            worker.join()
+        if self.error is not None:
+            raise self.error
+        return self.results
+
+
+class PngSequenceSink:
+
+    def __init__(self, path: str, size: tuple):
+        self.path = path
+        self.size = size
+        os.makedirs(path, exist_ok=True)
+
+    def encode(self, index: int, raw: bytes) -> None:
+        with open(os.path.join(self.path, f"frame_{index:05d}.png"), "wb") as frame_file:
+            frame_file.write(encode_png(raw, *self.size))
+
+    def finish(self, results: Dict[int, Any], fps: int) -> None:
+        pass
+
+
+class GifSink:
+
+    def __init__(self, path: str, size: tuple):
+        if Image is None:
+            raise RuntimeError("GIF export requires Pillow (pip install pillow)")
+        self.path = path
+        self.size = size
+
+    def encode(self, index: int, raw: bytes) -> Any:
+        return Image.frombytes("RGB", self.size, raw).quantize(
+            colors=256, method=Image.Quantize.FASTOCTREE)
+
+    def finish(self, results: Dict[int, Any], fps: int) -> None:
+        frames = [results[index] for index in sorted(results)]
+        frames[0].save(self.path, save_all=True, append_images=frames[1:],
+                       duration=round(1000 / fps), loop=0)
+
+
+class EngagementExporter:
+
+    def __init__(self, fps: int = EXPORT_FPS, workers: Optional[int] = None):
+        self.fps = fps
+        self.workers = workers or os.cpu_count() or 2
+        self.time = 0
+
+        if pygame.display.get_surface() is None:
+            pygame.display.set_mode((1, 1))
+        self.surface = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
+        self.game = WarGame(screen=SurfaceCanvas(self.surface))
+        self.game.missile_system = MissileSystem(get_ticks=lambda: self.time,
+                                                 store=self.game.game_state.store,
+                                                 particles=self.game.missile_system.particles)
+
+    def _make_sink(self, path: str, image_format: str):
+        size = self.surface.get_size()
+        if image_format == "gif":
+            return GifSink(path, size)
+        return PngSequenceSink(path, size)
+
+    def export(self, path: str, player_defenses: Set[int], player_targets: Set[int],
+               image_format: str = "gif", seed: Optional[int] = None) -> int:
+        sink = self._make_sink(path, image_format)
+        pool = FrameEncoderPool(sink.encode, self.workers, queue_size=self.workers * 2)
+
+        random.seed(seed)
+        self.time = 0
+        game_state = self.game.game_state
+        game_state.start_new_game()
+        game_state.player_defenses = set(player_defenses)
+        game_state.player_targets = set(player_targets)
+        self.game.missile_system.reset()
+        self.game.missile_system.particles.reseed(seed)
+        self.game._start_missile_launch()
+
+        frame_ms = 1000 / self.fps
+        frame = 0
+        try:
+            while frame < MAX_FRAMES:
+                self.game.draw_frame()
+                pool.submit(frame, pygame.image.tobytes(self.surface, "RGB"))
+                frame += 1
+
+                self.time = round(frame * frame_ms)
+                self.game.update()
+                if (game_state.current_state == GameState.RESULTS and
+                        not self.game.missile_system.mushroom_clouds):
+                    break
+        finally:
+            results = pool.close()
+        sink.finish(results, self.fps)
+        return frame
+
+
+def _parse_selection(value: Optional[str], city_count: int, limit: int,
+                     rng: random.Random) -> Set[int]:
+    if value is None:
+        return set(rng.sample(range(city_count), limit))
+    return {int(idx) for idx in value.split(",")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export WarGames engagements without a display")
+    parser.add_argument("output", help="GIF file or PNG frame directory; a directory when --count > 1")
+    parser.add_argument("--count", type=int, default=1, help="number of engagements to export")
+    parser.add_argument("--format", choices=("gif", "png"), default=None)
+    parser.add_argument("--fps", type=int, default=EXPORT_FPS)
+    parser.add_argument("--workers", type=int, default=None, help="encoder threads")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--defenses", help="comma-separated US city indices to defend")
+    parser.add_argument("--targets", help="comma-separated USSR city indices to target")
+    args = parser.parse_args()
+
+    image_format = args.format or ("gif" if Image is not None else "png")
+    exporter = EngagementExporter(args.fps, args.workers)
+    rng = random.Random(args.seed)
+
+    outputs: List[str] = []
+    if args.count == 1:
+        outputs.append(args.output)
+    else:
+        os.makedirs(args.output, exist_ok=True)
+        suffix = ".gif" if image_format == "gif" else ""
+        outputs.extend(os.path.join(args.output, f"engagement_{i:04d}{suffix}")
+                       for i in range(args.count))
+
+    for i, path in enumerate(outputs):
+        defenses = _parse_selection(args.defenses, len(USA_CITIES), DEFENSE_LIMIT, rng)
+        targets = _parse_selection(args.targets, len(USSR_CITIES), TARGET_LIMIT, rng)
+        frames = exporter.export(path, defenses, targets, image_format, seed=args.seed + i)
+        print(f"{path}: {frames} frames")
+
+
+if __name__ == "__main__":
+    main()
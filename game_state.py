@@ -1,98 +1,129 @@
 import random
-from typing import Set, List, Dict, Any
-from config import GameState, DEFENSE_LIMIT, TARGET_LIMIT
-from city_data import USA_CITIES, USSR_CITIES
+from typing import Optional
+from casualties import casualty_model
+from config import GameState
+from metrics import CASUALTIES, STATE_TRANSITIONS
+from scenario import DEFAULT_SCENARIO, Scenario
+from state_store import StateSnapshot, StateStore, StoreField, initial_state
 
 
 class GameStateManager:
-    def __init__(self):
-        self.current_state = GameState.LOADING
-        self.player_defenses: Set[int] = set()
-        self.player_targets: Set[int] = set()
-        self.ai_defenses: Set[int] = set()
-        self.ai_targets: Set[int] = set()
-        self.usa_destroyed: List[bool] = [False] * len(USA_CITIES)
-        self.ussr_destroyed: List[bool] = [False] * len(USSR_CITIES)
-        self.us_cities_destroyed: List[str] = []
-        self.ussr_cities_destroyed: List[str] = []
-        self.missile_lines: List[Dict[str, Any]] = []
-        self.missile_animation_start_time = 0
-        self.mushroom_clouds: List[Dict[str, Any]] = []
-        self.show_grid = False
-        self.show_help = False
+    player_defenses = StoreField()
+    player_targets = StoreField()
+    ai_defenses = StoreField()
+    ai_targets = StoreField()
+    usa_destroyed = StoreField()
+    ussr_destroyed = StoreField()
+    us_cities_destroyed = StoreField()
+    ussr_cities_destroyed = StoreField()
+    missile_lines = StoreField()
+    missile_animation_start_time = StoreField()
+    mushroom_clouds = StoreField()
+    show_grid = StoreField()
+    show_coverage = StoreField()
+    show_help = StoreField()
+    
+    def __init__(self, ai_opponent=None, store: Optional[StateStore] = None,
+                 scenario: Scenario = DEFAULT_SCENARIO):
+        self.ai_opponent = ai_opponent
+        self.scenario = scenario
+        self.usa_cities = scenario.usa_cities
+        self.ussr_cities = scenario.ussr_cities
+        self.defense_limit = scenario.defense_limit
+        self.target_limit = scenario.target_limit
+        self.store = store or StateStore(initial_state(len(self.usa_cities), len(self.ussr_cities)))
+        self._casualties = None
+        self._entered = self.store.get("current_state")
+    
+    @property
+    def current_state(self) -> GameState:
+        return self.store.get("current_state")
+    
+    @current_state.setter
+    def current_state(self, state: GameState) -> None:
+        # Compared with the last state set here rather than the store, since
+        # start_new_game and reset_to_menu reset the store first.
+        previous, self._entered = self._entered, state
+        self.store.set("current_state", state)
+        if state == previous:
+            return
+        STATE_TRANSITIONS.labels(previous.name.lower(), state.name.lower()).inc()
+        if state == GameState.RESULTS:
+            us_casualties, ussr_casualties = self.calculate_casualties()[:2]
+            CASUALTIES.labels("usa").inc(us_casualties)
+            CASUALTIES.labels("ussr").inc(ussr_casualties)
     
     def start_new_game(self) -> None:
-        self.player_defenses = set()
-        self.player_targets = set()
-        self.ai_defenses = set()
-        self.ai_targets = set()
-        self.usa_destroyed = [False] * len(USA_CITIES)
-        self.ussr_destroyed = [False] * len(USSR_CITIES)
-        self.us_cities_destroyed = []
-        self.ussr_cities_destroyed = []
-        self.missile_lines = []
-        self.mushroom_clouds = []
+        self.store.reset(keep=("show_grid", "show_coverage", "show_help"))
         self.current_state = GameState.DEFENSIVE
     
     def reset_to_menu(self) -> None:
-        self.player_defenses = set()
-        self.player_targets = set()
-        self.ai_defenses = set()
-        self.ai_targets = set()
-        self.usa_destroyed = [False] * len(USA_CITIES)
-        self.ussr_destroyed = [False] * len(USSR_CITIES)
-        self.us_cities_destroyed = []
-        self.ussr_cities_destroyed = []
-        self.missile_lines = []
-        self.mushroom_clouds = []
+        self.store.reset(keep=("show_grid", "show_coverage", "show_help"))
         self.current_state = GameState.MENU
     
+    def checkpoint(self, now: Optional[int] = None) -> StateSnapshot:
+        return self.store.snapshot(now)
+    
+    def restore(self, snapshot: StateSnapshot, now: Optional[int] = None) -> None:
+        self.store.restore(snapshot, now)
+    
     def toggle_defense(self, city_index: int) -> bool:
         if city_index in self.player_defenses:
-            self.player_defenses.remove(city_index)
+            self.store.mutable("player_defenses").remove(city_index)
             return True
-        elif len(self.player_defenses) < DEFENSE_LIMIT:
-            self.player_defenses.add(city_index)
+        elif len(self.player_defenses) < self.defense_limit:
+            self.store.mutable("player_defenses").add(city_index)
             return True
         return False
     
     def toggle_target(self, city_index: int) -> bool:
         if city_index in self.player_targets:
-            self.player_targets.remove(city_index)
+            self.store.mutable("player_targets").remove(city_index)
             return True
-        elif len(self.player_targets) < TARGET_LIMIT:
-            self.player_targets.add(city_index)
+        elif len(self.player_targets) < self.target_limit:
+            self.store.mutable("player_targets").add(city_index)
             return True
         return False
     
     def can_continue_to_offensive(self) -> bool:
-        return len(self.player_defenses) == DEFENSE_LIMIT
+        return len(self.player_defenses) == self.defense_limit
     
     def can_launch_missiles(self) -> bool:
-        return (len(self.player_defenses) == DEFENSE_LIMIT and 
-                len(self.player_targets) == TARGET_LIMIT)
+        return (len(self.player_defenses) == self.defense_limit and 
+                len(self.player_targets) == self.target_limit)
     
     def make_ai_selections(self) -> None:
-        self.ai_defenses = set(random.sample(range(len(USSR_CITIES)), DEFENSE_LIMIT))
-        self.ai_targets = set(random.sample(range(len(USA_CITIES)), TARGET_LIMIT))
+        if self.ai_opponent is not None:
+            self.ai_defenses, self.ai_targets = self.ai_opponent.choose()
+            self.ai_opponent.observe(self.player_defenses, self.player_targets)
+            return
+        self.ai_defenses = set(random.sample(range(len(self.ussr_cities)), self.defense_limit))
+        self.ai_targets = set(random.sample(range(len(self.usa_cities)), self.target_limit))
     
     def toggle_grid(self) -> None:
         self.show_grid = not self.show_grid
     
+    def toggle_coverage(self) -> None:
+        self.show_coverage = not self.show_coverage
+    
     def toggle_help(self) -> None:
         self.show_help = not self.show_help
     
     def calculate_casualties(self) -> tuple[int, int, int, int, float, float]:
-        us_casualties = sum(USA_CITIES[idx]["population"] 
-                           for idx in range(len(USA_CITIES)) 
-                           if self.usa_destroyed[idx])
-        
-        ussr_casualties = sum(USSR_CITIES[idx]["population"] 
-                               for idx in range(len(USSR_CITIES)) 
-                               if self.ussr_destroyed[idx])
-        
-        total_us_population = sum(city["population"] for city in USA_CITIES)
-        total_ussr_population = sum(city["population"] for city in USSR_CITIES)
+        # Destroyed-city lists only grow during a game and are replaced on
+        # reset or restore, so identity plus length says whether anything hit.
+        key = (len(self.us_cities_destroyed), len(self.ussr_cities_destroyed))
+        cached = self._casualties
+        if (cached is None or cached[0] is not self.usa_destroyed or
+                cached[1] is not self.ussr_destroyed or cached[2] != key):
+            model = casualty_model(self.scenario)
+            usa_hit = [idx for idx, hit in enumerate(self.usa_destroyed) if hit]
+            ussr_hit = [idx for idx, hit in enumerate(self.ussr_destroyed) if hit]
+            cached = (self.usa_destroyed, self.ussr_destroyed, key,
+                      model.casualties(usa_hit, ussr_hit), model.total_usa, model.total_ussr)
+            self._casualties = cached
+        (us_casualties, ussr_casualties), total_us_population, total_ussr_population = cached[3:]
+        us_casualties, ussr_casualties = round(us_casualties), round(ussr_casualties)
         
         us_casualty_percent = (us_casualties / total_us_population) * 100 if total_us_population > 0 else 0
         ussr_casualty_percent = (ussr_casualties / total_ussr_population) * 100 if total_ussr_population > 0 else 0
@@ -0,0 +1,256 @@
+"""
+Persistent SQLite history of finished games
+"""
+
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from city_data import USA_CITIES, USSR_CITIES
+
+SIDE_USA = 0
+SIDE_USSR = 1
+
+OUTCOME_LOSS = -1
+OUTCOME_DRAW = 0
+OUTCOME_WIN = 1
+
+BATCH_SIZE = 512
+FLUSH_INTERVAL = 0.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    played_at REAL NOT NULL,
+    duration_ms INTEGER NOT NULL,
+    player_defenses TEXT NOT NULL,
+    player_targets TEXT NOT NULL,
+    ai_defenses TEXT NOT NULL,
+    ai_targets TEXT NOT NULL,
+    intercepts INTEGER NOT NULL,
+    us_casualties INTEGER NOT NULL,
+    ussr_casualties INTEGER NOT NULL,
+    outcome INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS games_by_defense_set ON games (player_defenses, outcome);
+CREATE INDEX IF NOT EXISTS games_by_played_at ON games (played_at);
+
+CREATE TABLE IF NOT EXISTS destroyed_cities (
+    game_id INTEGER NOT NULL,
+    side INTEGER NOT NULL,
+    city INTEGER NOT NULL,
+    PRIMARY KEY (game_id, side, city)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS destroyed_by_city ON destroyed_cities (side, city);
+
+CREATE TABLE IF NOT EXISTS defense_set_stats (
+    player_defenses TEXT PRIMARY KEY,
+    games INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    losses INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS city_destruction_stats (
+    side INTEGER NOT NULL,
+    city INTEGER NOT NULL,
+    destroyed INTEGER NOT NULL,
+    PRIMARY KEY (side, city)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS city_destruction_rank ON city_destruction_stats (side, destroyed);
+"""
+
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+
+def selection_key(selection: Iterable[int]) -> str:
+    return ",".join(str(idx) for idx in sorted(selection))
+
+
+def parse_selection_key(key: str) -> Tuple[int, ...]:
+    return tuple(int(idx) for idx in key.split(",")) if key else ()
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class GameHistory:
+
+    def __init__(self, path: str, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._conn = _connect(path)
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._writer = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._writer.start()
+
+    def record(self, game_state, duration_ms: int, intercepts: int,
+               played_at: Optional[float] = None) -> None:
+        us_casualties, ussr_casualties = game_state.calculate_casualties()[:2]
+        if ussr_casualties > us_casualties:
+            outcome = OUTCOME_WIN
+        elif ussr_casualties < us_casualties:
+            outcome = OUTCOME_LOSS
+        else:
+            outcome = OUTCOME_DRAW
+
+        destroyed = ([(SIDE_USA, idx) for idx, hit in enumerate(game_state.usa_destroyed) if hit] +
+                     [(SIDE_USSR, idx) for idx, hit in enumerate(game_state.ussr_destroyed) if hit])
+
+        self._queue.put((
+            (time.time() if played_at is None else played_at,
+             duration_ms,
+             selection_key(game_state.player_defenses),
+             selection_key(game_state.player_targets),
+             selection_key(game_state.ai_defenses),
+             selection_key(game_state.ai_targets),
+             intercepts,
+             us_casualties,
+             ussr_casualties,
+             outcome),
+            destroyed,
+        ))
+
+    def flush(self) -> None:
+        done = threading.Event()
+        self._queue.put(done)
+        # A writer that died would never answer, so keep checking it is alive.
+        while not done.wait(self.flush_interval):
+            if not self._writer.is_alive():
+                return
+
+    def close(self) -> None:
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+        self._conn.close()
+
+    def _run(self) -> None:
+        conn = _connect(self.path)
+        stopping = False
+        try:
+            while not stopping:
+                batch = []
+                waiters = []
+                item = self._queue.get()
+                deadline = time.monotonic() + self.flush_interval
+                while True:
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    if isinstance(item, threading.Event):
+                        waiters.append(item)
+                        break
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    try:
+                        item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+
+                try:
+                    if batch:
+                        self._write_batch(conn, batch)
+                except sqlite3.Error:
+                    # The batch is rolled back and dropped; the writer keeps
+                    # going so later games are still recorded.
+                    logger.exception("dropped %d history records", len(batch))
+                finally:
+                    for waiter in waiters:
+                        waiter.set()
+        finally:
+            conn.close()
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: List[Tuple[tuple, list]]) -> None:
+        defense_stats: Dict[str, List[int]] = {}
+        city_stats: Counter = Counter()
+
+        with conn:
+            for row, destroyed in batch:
+                game_id = conn.execute(
+                    "INSERT INTO games (played_at, duration_ms, player_defenses, player_targets, "
+                    "ai_defenses, ai_targets, intercepts, us_casualties, ussr_casualties, outcome) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row
+                ).lastrowid
+                conn.executemany(
+                    "INSERT INTO destroyed_cities (game_id, side, city) VALUES (?, ?, ?)",
+                    [(game_id, side, city) for side, city in destroyed]
+                )
+
+                stats = defense_stats.setdefault(row[2], [0, 0, 0])
+                stats[0] += 1
+                stats[1] += row[-1] == OUTCOME_WIN
+                stats[2] += row[-1] == OUTCOME_LOSS
+                city_stats.update(destroyed)
+
+            # Aggregates are folded in per batch so analytics read a handful of
+            # summary rows instead of scanning every recorded game.
+            conn.executemany(
+                "INSERT INTO defense_set_stats (player_defenses, games, wins, losses) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT (player_defenses) DO UPDATE SET "
+                "games = games + excluded.games, wins = wins + excluded.wins, "
+                "losses = losses + excluded.losses",
+                [(key, *stats) for key, stats in defense_stats.items()]
+            )
+            conn.executemany(
+                "INSERT INTO city_destruction_stats (side, city, destroyed) VALUES (?, ?, ?) "
+                "ON CONFLICT (side, city) DO UPDATE SET destroyed = destroyed + excluded.destroyed",
+                [(side, city, count) for (side, city), count in city_stats.items()]
+            )
+
+    def game_count(self) -> int:
+        return self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM games").fetchone()[0]
+
+    def win_rate_by_defense_set(self, min_games: int = 1,
+                                limit: Optional[int] = None) -> List[Tuple[Tuple[int, ...], int, float]]:
+        rows = self._conn.execute(
+            "SELECT player_defenses, games, wins FROM defense_set_stats WHERE games >= ? "
+            "ORDER BY CAST(wins AS REAL) / games DESC, games DESC LIMIT ?",
+            (min_games, -1 if limit is None else limit)
+        ).fetchall()
+        return [(parse_selection_key(key), games, wins / games) for key, games, wins in rows]
+
+    def win_rate_for_defense_set(self, defenses: Iterable[int]) -> Tuple[int, float]:
+        row = self._conn.execute(
+            "SELECT games, wins FROM defense_set_stats WHERE player_defenses = ?",
+            (selection_key(defenses),)
+        ).fetchone()
+        if row is None:
+            return 0, 0.0
+        return row[0], row[1] / row[0]
+
+    def most_destroyed_cities(self, side: Optional[int] = None,
+                              limit: int = 10) -> List[Tuple[str, int]]:
+        if side is None:
+            rows = self._conn.execute(
+                "SELECT side, city, destroyed FROM city_destruction_stats "
+                "ORDER BY destroyed DESC LIMIT ?", (limit,)
+            ).fetchall()
+        else:
+            rows = self._conn.execute(
+                "SELECT side, city, destroyed FROM city_destruction_stats WHERE side = ? "
+                "ORDER BY destroyed DESC LIMIT ?", (side, limit)
+            ).fetchall()
+        return [((USA_CITIES if s == SIDE_USA else USSR_CITIES)[city]["name"], count)
+                for s, city, count in rows]
+
+    def games_destroying_city(self, side: int, city: int) -> int:
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM destroyed_cities WHERE side = ? AND city = ?", (side, city)
+        ).fetchone()[0]
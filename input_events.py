@@ -0,0 +1,114 @@
+"""
+Filtered, coalesced input events with input-to-display latency percentiles
+"""
+
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pygame
+
+from render_backend import Canvas
+
+INPUT_EVENTS = (pygame.QUIT, pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN, pygame.MOUSEMOTION,
+                pygame.MOUSEWHEEL)
+TRACKED_EVENTS = (pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN)
+LATENCY_SAMPLES = 1000
+PERCENTILES = (50, 90, 99)
+
+
+def coalesce_motion(events: List[pygame.event.Event]) -> List[pygame.event.Event]:
+    # Consecutive motion events collapse into the newest one with the summed
+    # relative movement; anything in between (a click) keeps its place.
+    result: List[pygame.event.Event] = []
+    for event in events:
+        if event.type == pygame.MOUSEMOTION and result and result[-1].type == pygame.MOUSEMOTION:
+            previous = result[-1]
+            rel = (previous.rel[0] + event.rel[0], previous.rel[1] + event.rel[1])
+            event = pygame.event.Event(pygame.MOUSEMOTION, event.dict, rel=rel)
+            result[-1] = event
+        else:
+            result.append(event)
+    return result
+
+
+class LatencyTracker:
+
+    def __init__(self, samples: int = LATENCY_SAMPLES):
+        self.samples: Deque[float] = deque(maxlen=samples)
+        self._pending: List[float] = []
+        # Events may be handled on the simulation thread and presented on the
+        # render thread.
+        self._lock = threading.Lock()
+
+    def handled(self, event: pygame.event.Event) -> None:
+        timestamp = getattr(event, "timestamp", None)
+        if event.type in TRACKED_EVENTS and timestamp is not None:
+            with self._lock:
+                self._pending.append(timestamp)
+
+    def presented(self) -> None:
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
+        now = pygame.time.get_ticks()
+        self.samples.extend(float(now - timestamp) for timestamp in pending)
+
+    def percentiles(self, points: Sequence[int] = PERCENTILES) -> Dict[int, float]:
+        if not self.samples:
+            return {}
+        values = np.percentile(np.fromiter(self.samples, dtype=np.float64), points)
+        return dict(zip(points, values.tolist()))
+
+    def report(self) -> str:
+        percentiles = self.percentiles()
+        if not percentiles:
+            return "input latency: no samples"
+        parts = "  ".join(f"p{point} {value:.1f} ms" for point, value in percentiles.items())
+        return f"input latency ({len(self.samples)} inputs): {parts}"
+
+
+class InputQueue:
+
+    def __init__(self, allowed: Sequence[int] = INPUT_EVENTS, canvas: Optional[Canvas] = None):
+        # Blocked types never reach the queue, so window and text-editing
+        # chatter costs nothing per frame.
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed(list(allowed))
+        self.latency = LatencyTracker()
+        self.coalesced = 0
+        # Mouse positions are mapped from the window to the canvas's logical
+        # coordinates, so hit testing never sees the display scale.
+        self.canvas = canvas or Canvas()
+        self.mouse = self.canvas.to_logical(pygame.mouse.get_pos())
+
+    def mouse_pos(self) -> Tuple[int, int]:
+        return self.mouse
+
+    def _stamp(self, events: List[pygame.event.Event]) -> List[pygame.event.Event]:
+        # SDL stamps events in get_ticks() milliseconds when they are queued,
+        # so latency includes time spent waiting to be polled. Events without
+        # one (posted, or from builds that do not expose it) count from here.
+        polled = pygame.time.get_ticks()
+        for event in events:
+            if getattr(event, "timestamp", None) is None:
+                event.timestamp = polled
+            if event.type in (pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN):
+                event.pos = self.mouse = self.canvas.to_logical(event.pos)
+                if event.type == pygame.MOUSEMOTION:
+                    event.rel = tuple(self.canvas.to_logical_length(delta) for delta in event.rel)
+        merged = coalesce_motion(events)
+        self.coalesced += len(events) - len(merged)
+        return merged
+
+    def poll(self) -> List[pygame.event.Event]:
+        return self._stamp(pygame.event.get())
+
+    def wait(self, timeout: float) -> List[pygame.event.Event]:
+        # pygame treats a zero timeout as "wait forever".
+        event = pygame.event.wait(max(int(timeout * 1000), 1))
+        if event.type == pygame.NOEVENT:
+            return []
+        return self._stamp([event] + pygame.event.get())
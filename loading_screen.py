@@ -1,14 +1,33 @@
 import pygame
-from typing import Optional
+from typing import List, Optional
 from config import WINDOW_WIDTH, WINDOW_HEIGHT
+from render_backend import Canvas
+from terminal import Console, Terminal, get_glyph_atlas
+
+MARGIN_COLS = 3
+GAME_INDENT = "  "
 
 
 class LoadingScreen:
     def __init__(self):
-        self.font = pygame.font.Font(None, 24)
-        self.small_font = pygame.font.Font(None, 20)
         self.background_colour = (0, 0, 0)  
         self.text_colour = (0, 255, 0)  
+        self.error_colour = (255, 100, 100)
+        
+        atlas = get_glyph_atlas(24)
+        self.terminal = Terminal(WINDOW_WIDTH // atlas.cell_width, WINDOW_HEIGHT // atlas.cell_height,
+                                 atlas, self.background_colour)
+        self.terminal_position = ((WINDOW_WIDTH - self.terminal.surface.get_width()) // 2,
+                                  (WINDOW_HEIGHT - self.terminal.surface.get_height()) // 2)
+        rows = self.terminal.rows
+        self.error_row = rows - 4
+        self.instruction_row = rows - 2
+        self.console = Console(self.terminal, 5, rows - 5, self.text_colour, left=MARGIN_COLS)
+        
+        self.terminal.write(MARGIN_COLS, 1, "W.O.P.R.", self.text_colour)
+        self.terminal.write(MARGIN_COLS, 2, "WAR OPERATION PLAN RESPONSE", self.text_colour)
+        self.terminal.write(MARGIN_COLS, 3, "-" * (self.terminal.cols - 2 * MARGIN_COLS), self.text_colour)
+        self.console.write(GAME_INDENT)
         
         self.games = [
             "CHESS",
@@ -47,13 +66,20 @@ class LoadingScreen:
                 if self.current_line < len(self.games):
                     current_game = self.games[self.current_line]
                     if self.current_char < len(current_game):
+                        self.console.write(current_game[self.current_char])
                         self.current_char += 1
                         self.last_char_time = current_time
                     else:
                         self.current_line += 1
                         self.current_char = 0
                         self.last_char_time = current_time + self.line_delay
+                        self.console.newline()
+                        if self.current_line < len(self.games):
+                            self.console.write(GAME_INDENT)
                 else:
+                    self.console.newline()
+                    self.console.write(self.input_prompt)
+                    self.console.mark_input()
                     self.loading_complete = True
                     self.show_input = True
                     self.waiting_for_input = True
@@ -74,66 +100,37 @@ class LoadingScreen:
             elif user_game in [game.upper() for game in self.games if game]:
                 self.error_message = f"UNABLE TO FIND PROGRAM: {user_game}"
                 self.error_time = pygame.time.get_ticks()
+                self.console.backspace(len(self.user_input))
                 self.user_input = ""
             else:
                 self.error_message = "INVALID SELECTION"
                 self.error_time = pygame.time.get_ticks()
+                self.console.backspace(len(self.user_input))
                 self.user_input = ""
                 
         elif key == pygame.K_BACKSPACE:
             if self.user_input:
                 self.user_input = self.user_input[:-1]
+                self.console.backspace()
                 
         elif unicode_char and unicode_char.isprintable():
             self.user_input += unicode_char.upper()
+            self.console.write(unicode_char.upper())
             
         return None
     
-    def draw(self, screen: pygame.Surface):
-        screen.fill(self.background_colour)
+    def draw(self, screen: Canvas, full: bool = True) -> List[pygame.Rect]:
+        # Only cells whose contents changed since the last frame are redrawn,
+        # and without full only they reach the screen.
+        cursor_visible = self.show_input and pygame.time.get_ticks() % 1000 < 500
+        self.terminal.set_cursor((self.console.col, self.console.row) if cursor_visible else None,
+                                 self.text_colour)
         
-        title = "W.O.P.R."
-        title_surface = self.font.render(title, True, self.text_colour)
-        screen.blit(title_surface, (50, 30))
+        self.terminal.write_line(self.error_row, self.error_message, self.error_colour, MARGIN_COLS)
         
-        subtitle = "WAR OPERATION PLAN RESPONSE"
-        subtitle_surface = self.small_font.render(subtitle, True, self.text_colour)
-        screen.blit(subtitle_surface, (50, 60))
+        instruction = "TYPE GAME NAME AND PRESS ENTER" if self.waiting_for_input else ""
+        self.terminal.write_line(self.instruction_row, instruction, self.text_colour, MARGIN_COLS)
         
-        pygame.draw.line(screen, self.text_colour, (50, 90), (WINDOW_WIDTH - 50, 90), 1)
-        
-        y_pos = 120
-        for i in range(min(self.current_line + 1, len(self.games))):
-            game = self.games[i]
-            if i == self.current_line:
-                displayed_text = game[:self.current_char]
-            else:
-                displayed_text = game
-                
-            if displayed_text:
-                game_surface = self.font.render(displayed_text, True, self.text_colour)
-                screen.blit(game_surface, (80, y_pos))
-            y_pos += 30
-        
-        if self.show_input:
-            input_y = y_pos + 30
-            prompt_surface = self.font.render(self.input_prompt, True, self.text_colour)
-            screen.blit(prompt_surface, (50, input_y))
-            
-            input_surface = self.font.render(self.user_input, True, self.text_colour)
-            screen.blit(input_surface, (50 + prompt_surface.get_width(), input_y))
-            
-            if pygame.time.get_ticks() % 1000 < 500:  
-                cursor_x = 50 + prompt_surface.get_width() + input_surface.get_width()
-                cursor_rect = pygame.Rect(cursor_x, input_y, 12, 24) 
-                pygame.draw.rect(screen, self.text_colour, cursor_rect)
-        
-        if self.error_message:
-            error_y = WINDOW_HEIGHT - 100
-            error_surface = self.font.render(self.error_message, True, (255, 100, 100)) 
-            screen.blit(error_surface, (50, error_y))
-            
-        if self.waiting_for_input:
-            instruction = "TYPE GAME NAME AND PRESS ENTER"
-            instruction_surface = self.small_font.render(instruction, True, self.text_colour)
-            screen.blit(instruction_surface, (50, WINDOW_HEIGHT - 50))
+        if full:
+            screen.fill(self.background_colour)
+        return self.terminal.draw(screen, self.terminal_position, full)
@@ -0,0 +1,217 @@
+"""
+Opt-in per-subsystem memory accounting built on tracemalloc
+"""
+
+import inspect
+import json
+import os
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional, Tuple
+
+import pygame
+
+from config import GameState
+from missiles import explosion_sprites
+from render_backend import scaled_surfaces
+from ui import TEXT_CACHE, get_background
+
+TRACEBACK_FRAMES = 8
+DUMP_INTERVAL = 10.0
+MAX_GAME_SAMPLES = 100
+OTHER = "other"
+
+SUBSYSTEM_FILES = {
+    "missiles": ("missiles.py", "particles.py", "defense_coverage.py"),
+    "ui": ("ui.py", "pick.py"),
+    "loading_screen": ("loading_screen.py", "terminal.py"),
+    "game_state": ("game_state.py", "state_store.py"),
+    "render": ("render_backend.py", "camera.py"),
+    "background": ("tiles.py",),
+}
+SUBSYSTEM_FUNCTIONS = {
+    "background": (get_background,),
+}
+
+
+def _line_range(function) -> Tuple[str, int, int]:
+    function = inspect.unwrap(function)
+    lines, first = inspect.getsourcelines(function)
+    return os.path.abspath(inspect.getsourcefile(function)), first, first + len(lines) - 1
+
+
+def surface_bytes(surfaces: List[pygame.Surface]) -> int:
+    return sum(surface.get_pitch() * surface.get_height() for surface in surfaces)
+
+
+class MemoryMonitor:
+
+    def __init__(self, dump_path: Optional[str] = None, interval: float = DUMP_INTERVAL,
+                 frames: int = TRACEBACK_FRAMES):
+        self.dump_path = dump_path
+        self.interval = interval
+        self.frames = frames
+        self.game = None
+        self.frame_count = 0
+        self.games: List[Dict[str, Any]] = []
+        self.latest: Optional[Dict[str, Any]] = None
+
+        root = os.path.dirname(os.path.abspath(__file__))
+        self._files = {os.path.join(root, name): subsystem
+                       for subsystem, names in SUBSYSTEM_FILES.items() for name in names}
+        self._functions = [(subsystem,) + _line_range(function)
+                           for subsystem, functions in SUBSYSTEM_FUNCTIONS.items()
+                           for function in functions]
+        self._subsystems: Dict[tracemalloc.Traceback, str] = {}
+        self._previous: Optional[Tuple[int, Dict[str, int], Dict[tracemalloc.Traceback, Tuple[int, int]]]] = None
+        self._last_dump = 0.0
+        self._last_state = None
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        # Allocations made before start() are invisible, so start before the
+        # game loads its assets.
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self._last_dump = time.monotonic()
+
+    def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.join()
+        if tracemalloc.is_tracing():
+            self.dump()
+            tracemalloc.stop()
+
+    def attach(self, game) -> None:
+        self.game = game
+
+    def _subsystem(self, traceback: tracemalloc.Traceback) -> str:
+        subsystem = self._subsystems.get(traceback)
+        if subsystem is not None:
+            return subsystem
+        subsystem = OTHER
+        # The innermost frame in one of our modules owns the allocation, so a
+        # font.render inside TextCache counts towards the UI, not pygame.
+        for frame in reversed(traceback):
+            for name, filename, first, last in self._functions:
+                if frame.filename == filename and first <= frame.lineno <= last:
+                    subsystem = name
+                    break
+            else:
+                subsystem = self._files.get(frame.filename, OTHER)
+            if subsystem != OTHER:
+                break
+        self._subsystems[traceback] = subsystem
+        return subsystem
+
+    def _surfaces(self) -> Dict[str, List[pygame.Surface]]:
+        # tracemalloc only sees the Python side of a Surface; pixel buffers
+        # come from SDL, so they are counted from the caches that hold them.
+        surfaces = {"ui": TEXT_CACHE.surfaces(), "missiles": explosion_sprites(),
+                    "render": scaled_surfaces()}
+        if self.game is not None:
+            terminal = self.game.loading_screen.terminal
+            surfaces["loading_screen"] = [terminal.surface] + terminal.atlas.surfaces()
+            surfaces["background"] = [self.game.background] + self.game.tiles.surfaces()
+            surfaces["ui"] += self.game.ui.city_renderer.surfaces()
+            if self.game.missile_system.coverage is not None:
+                surfaces["missiles"] += self.game.missile_system.coverage.surfaces()
+        return surfaces
+
+    def _capture(self) -> Tuple[tracemalloc.Snapshot, Dict[str, Tuple[int, int]], int, Tuple[int, int]]:
+        surfaces = {name: (len(group), surface_bytes(group)) for name, group in self._surfaces().items()}
+        return (tracemalloc.take_snapshot(), surfaces, self.frame_count,
+                tracemalloc.get_traced_memory())
+
+    def _report(self, snapshot: tracemalloc.Snapshot, surfaces: Dict[str, Tuple[int, int]],
+                frame: int, traced: Tuple[int, int], record_game: bool = False) -> Dict[str, Any]:
+        subsystems: Dict[str, Dict[str, Any]] = {}
+        sites: Dict[tracemalloc.Traceback, Tuple[int, int]] = {}
+        for stat in snapshot.statistics("traceback"):
+            entry = subsystems.setdefault(self._subsystem(stat.traceback), {"bytes": 0, "blocks": 0})
+            entry["bytes"] += stat.size
+            entry["blocks"] += stat.count
+            sites[stat.traceback] = (stat.size, stat.count)
+
+        for name, (count, size) in surfaces.items():
+            entry = subsystems.setdefault(name, {"bytes": 0, "blocks": 0})
+            entry["surfaces"] = count
+            entry["surface_bytes"] = size
+
+        sizes = {name: entry["bytes"] for name, entry in subsystems.items()}
+        with self._lock:
+            if self._previous is not None:
+                previous_frame, previous_sizes, previous_sites = self._previous
+                frames = max(frame - previous_frame, 1)
+                # Net growth hides churn, so allocations are also counted as
+                # what each call site gained since the last snapshot, the same
+                # diff as Snapshot.compare_to without grouping twice. Blocks
+                # freed again before the next snapshot are still missed.
+                allocated: Dict[str, List[int]] = {}
+                for traceback, (size, count) in sites.items():
+                    previous_size, previous_count = previous_sites.get(traceback, (0, 0))
+                    if size > previous_size or count > previous_count:
+                        totals = allocated.setdefault(self._subsystem(traceback), [0, 0])
+                        totals[0] += max(size - previous_size, 0)
+                        totals[1] += max(count - previous_count, 0)
+                for name, entry in subsystems.items():
+                    entry["bytes_per_frame"] = (entry["bytes"] - previous_sizes.get(name, 0)) / frames
+                    allocated_bytes, allocated_blocks = allocated.get(name, (0, 0))
+                    entry["allocated_bytes_per_frame"] = allocated_bytes / frames
+                    entry["allocated_blocks_per_frame"] = allocated_blocks / frames
+            self._previous = (frame, sizes, sites)
+
+            if record_game:
+                # One sample per start_new_game, so growth across games shows
+                # up separately from growth within one.
+                self.games.append({"game": len(self.games) + 1, "frame": frame,
+                                   "traced_bytes": traced[0], "subsystems": sizes})
+                del self.games[:-MAX_GAME_SAMPLES]
+            self.latest = {"frame": frame, "time": time.time(), "traced_bytes": traced[0],
+                           "peak_bytes": traced[1], "subsystems": subsystems,
+                           "games": list(self.games)}
+            return self.latest
+
+    def sample(self) -> Dict[str, Any]:
+        return self._report(*self._capture())
+
+    def _write(self, report: Dict[str, Any]) -> None:
+        if self.dump_path is None:
+            return
+        temp_path = self.dump_path + ".tmp"
+        with open(temp_path, "w") as dump_file:
+            json.dump(report, dump_file, indent=2)
+        os.replace(temp_path, self.dump_path)
+
+    def dump(self) -> None:
+        self._last_dump = time.monotonic()
+        self._write(self.sample())
+
+    def _dump_in_background(self, record_game: bool) -> None:
+        # Grouping a snapshot takes hundreds of milliseconds on a large heap,
+        # so only the snapshot itself is taken on the game loop.
+        if self._worker is not None and self._worker.is_alive():
+            if not record_game:
+                return
+            self._worker.join()
+        self._last_dump = time.monotonic()
+        captured = self._capture()
+
+        def work():
+            self._write(self._report(*captured, record_game=record_game))
+
+        self._worker = threading.Thread(target=work, name="memory-report", daemon=True)
+        self._worker.start()
+
+    def frame(self) -> None:
+        self.frame_count += 1
+        new_game = False
+        if self.game is not None:
+            state = self.game.game_state.current_state
+            new_game = state == GameState.DEFENSIVE and self._last_state != GameState.DEFENSIVE
+            self._last_state = state
+        if new_game or (self.dump_path is not None and
+                        time.monotonic() - self._last_dump >= self.interval):
+            self._dump_in_background(new_game)
@@ -0,0 +1,261 @@
+"""
+Runtime counters, gauges and histograms served in Prometheus text format
+"""
+
+import bisect
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_METRICS_PORT = 9464
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+FRAME_BUCKETS = (0.001, 0.002, 0.004, 0.008, 0.016, 0.033, 0.066, 0.133, 0.25, 0.5, 1.0)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Shards:
+
+    def __init__(self, width: int):
+        # Each recording thread adds into its own list and only a scrape
+        # reads them all, so recording never takes a lock after the first call.
+        self.width = width
+        self._local = threading.local()
+        self._shards: List[List[float]] = []
+        self._lock = threading.Lock()
+
+    def shard(self) -> List[float]:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = [0.0] * self.width
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+
+    def totals(self) -> List[float]:
+        with self._lock:
+            shards = list(self._shards)
+        totals = [0.0] * self.width
+        for shard in shards:
+            for idx, value in enumerate(shard):
+                totals[idx] += value
+        return totals
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], "Metric"] = {}
+        self._lock = threading.Lock()
+
+    def _child(self) -> "Metric":
+        raise NotImplementedError
+
+    def labels(self, *values: str) -> "Metric":
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._child())
+        return child
+
+    def _samples(self) -> List[Tuple[str, Sequence[str], Sequence[str], float]]:
+        raise NotImplementedError
+
+    def samples(self) -> List[Tuple[str, Sequence[str], Sequence[str], float]]:
+        if not self.labelnames:
+            return self._samples()
+        samples = []
+        for values, child in sorted(self._children.items()):
+            for suffix, names, extra, value in child._samples():
+                samples.append((suffix, self.labelnames + tuple(names), values + tuple(extra), value))
+        return samples
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, names, values, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(names, values)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values = _Shards(1)
+
+    def _child(self) -> "Counter":
+        return Counter(self.name, self.documentation)
+
+    def inc(self, amount: float = 1) -> None:
+        self._values.shard()[0] += amount
+
+    @property
+    def value(self) -> float:
+        return self._values.totals()[0]
+
+    def _samples(self):
+        return [("", (), (), self.value)]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 function: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._value = 0.0
+        self.function = function
+
+    def _child(self) -> "Gauge":
+        return Gauge(self.name, self.documentation)
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    @property
+    def value(self) -> float:
+        # A function gauge is evaluated on the scraping thread, so the value
+        # costs nothing until someone asks for it.
+        return self.function() if self.function is not None else self._value
+
+    def _samples(self):
+        return [("", (), (), self.value)]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = FRAME_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # One slot per bucket, one for +Inf and one for the running sum.
+        self._values = _Shards(len(self.buckets) + 2)
+
+    def _child(self) -> "Histogram":
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value: float) -> None:
+        shard = self._values.shard()
+        shard[bisect.bisect_left(self.buckets, value)] += 1
+        shard[-1] += value
+
+    def _samples(self):
+        totals = self._values.totals()
+        samples, cumulative = [], 0.0
+        for bound, count in zip(self.buckets + (math.inf,), totals):
+            cumulative += count
+            samples.append(("_bucket", ("le",), (_format_value(bound),), cumulative))
+        samples.append(("_sum", (), (), totals[-1]))
+        samples.append(("_count", (), (), cumulative))
+        return samples
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines += metric.render()
+            except Exception:
+                # One failing function gauge must not take the endpoint down.
+                continue
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+FRAME_SECONDS = REGISTRY.register(Histogram(
+    "wargames_frame_seconds", "Time to handle input, update and render one frame"))
+UPDATE_SECONDS = REGISTRY.register(Histogram(
+    "wargames_update_seconds", "Time spent in one simulation update"))
+MISSILES_IN_FLIGHT = REGISTRY.register(Gauge(
+    "wargames_missiles_in_flight", "Attack and intercept missiles currently in the air"))
+INTERCEPTS = REGISTRY.register(Counter(
+    "wargames_intercepts_total", "Attack missiles destroyed by interceptors"))
+IMPACTS = REGISTRY.register(Counter(
+    "wargames_impacts_total", "Warheads that destroyed a city", ("side",)))
+STATE_TRANSITIONS = REGISTRY.register(Counter(
+    "wargames_state_transitions_total", "Game state changes", ("from_state", "to_state")))
+CASUALTIES = REGISTRY.register(Counter(
+    "wargames_casualties_total", "Casualties over all finished games", ("side",)))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer:
+
+    def __init__(self, port: int = DEFAULT_METRICS_PORT, host: str = "127.0.0.1",
+                 registry: Registry = REGISTRY):
+        handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self.address = self._server.server_address
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics",
+                                        daemon=True)
+
+    def start(self) -> "MetricsServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
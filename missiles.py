@@ -1,37 +1,78 @@
+import itertools
 import pygame
-from typing import List, Dict, Set, Any
+import weakref
+from typing import List, Dict, Set, Callable, Optional
+from camera import Camera
 from config import (
     COLOURS, 
-    INTERCEPT_RADIUS, 
     MUSHROOM_CLOUD_DURATION, 
     EXPLOSION_RADIUS
 )
-from city_data import USA_CITIES, USSR_CITIES
+from defense_coverage import CoverageLayer
+from metrics import IMPACTS, INTERCEPTS, MISSILES_IN_FLIGHT
+from particles import ParticleSystem
+from render_backend import Canvas
+from scenario import DEFAULT_SCENARIO, Scenario
+from state_store import StateStore, StoreField, initial_state
+
+_explosion_sprites: Dict[int, pygame.Surface] = {}
+_USA_IMPACTS = IMPACTS.labels("usa")
+_USSR_IMPACTS = IMPACTS.labels("ussr")
+# Ids let remote clients pair a missile across snapshots by identity rather
+# than by list position.
+_missile_ids = itertools.count()
+
+
+def explosion_sprite(radius: int) -> pygame.Surface:
+    sprite = _explosion_sprites.get(radius)
+    if sprite is None:
+        sprite = pygame.Surface((radius * 2, radius * 2))
+        pygame.draw.circle(sprite, COLOURS["red"], (radius, radius), radius)
+        pygame.draw.circle(sprite, COLOURS["yellow"], (radius, radius), int(radius * 0.7))
+        pygame.draw.circle(sprite, COLOURS["white"], (radius, radius), int(radius * 0.4))
+        _explosion_sprites[radius] = sprite
+    return sprite
+
+
+def explosion_sprites() -> List[pygame.Surface]:
+    return list(_explosion_sprites.values())
 
 
 class MissileSystem:
+    missile_lines = StoreField()
+    mushroom_clouds = StoreField()
+    animation_start_time = StoreField("missile_animation_start_time")
+    current_player_defenses = StoreField("launch_player_defenses")
+    current_ai_defenses = StoreField("launch_ai_defenses")
     
-    def __init__(self):
-        self.missile_lines: List[Dict[str, Any]] = []
-        self.mushroom_clouds: List[Dict[str, Any]] = []
-        self.animation_start_time = 0
+    def __init__(self, get_ticks: Callable[[], int] = pygame.time.get_ticks,
+                 store: Optional[StateStore] = None, scenario: Scenario = DEFAULT_SCENARIO,
+                 particles: Optional[ParticleSystem] = None):
+        self.get_ticks = get_ticks
+        self.particles = particles
+        self.coverage: Optional[CoverageLayer] = None
+        self.usa_cities = scenario.usa_cities
+        self.ussr_cities = scenario.ussr_cities
+        self.store = store or StateStore(initial_state(len(self.usa_cities), len(self.ussr_cities)))
     
     def create_missile_lines(self, player_targets: Set[int], ai_targets: Set[int], 
                             player_defenses: Set[int], ai_defenses: Set[int]) -> None:
-        self.missile_lines = []
-        self.animation_start_time = pygame.time.get_ticks()
+        missile_lines = self.missile_lines = []
+        self.animation_start_time = self.get_ticks()
         
-        self.current_player_defenses = player_defenses
-        self.current_ai_defenses = ai_defenses
+        self.current_player_defenses = set(player_defenses)
+        self.current_ai_defenses = set(ai_defenses)
         
-        defense_list = list(player_defenses)
-        target_list = list(player_targets)
+        # Sorted so a launch pairs the same cities however the sets were built.
+        defense_list = sorted(player_defenses)
+        target_list = sorted(player_targets)
         for i, target_idx in enumerate(target_list):
             if i < len(defense_list):  
                 launch_city_idx = defense_list[i]
-                launch_pos = (USA_CITIES[launch_city_idx]["x"], USA_CITIES[launch_city_idx]["y"])
-                target_pos = (USSR_CITIES[target_idx]["x"], USSR_CITIES[target_idx]["y"])
-                self.missile_lines.append({
+                launch_pos = (self.usa_cities[launch_city_idx]["x"], self.usa_cities[launch_city_idx]["y"])
+                target_pos = (self.ussr_cities[target_idx]["x"], self.ussr_cities[target_idx]["y"])
+                missile_lines.append({
+                    "id": next(_missile_ids),
                     "start": launch_pos,
                     "end": target_pos,
                     "colour": (255, 255, 0),  
@@ -44,14 +85,15 @@ class MissileSystem:
                     "intercepted": False
                 })
         
-        ai_defense_list = list(ai_defenses)
-        ai_target_list = list(ai_targets)
+        ai_defense_list = sorted(ai_defenses)
+        ai_target_list = sorted(ai_targets)
         for i, target_idx in enumerate(ai_target_list):
             if i < len(ai_defense_list):  
                 launch_city_idx = ai_defense_list[i]
-                launch_pos = (USSR_CITIES[launch_city_idx]["x"], USSR_CITIES[launch_city_idx]["y"])
-                target_pos = (USA_CITIES[target_idx]["x"], USA_CITIES[target_idx]["y"])
-                self.missile_lines.append({
+                launch_pos = (self.ussr_cities[launch_city_idx]["x"], self.ussr_cities[launch_city_idx]["y"])
+                target_pos = (self.usa_cities[target_idx]["x"], self.usa_cities[target_idx]["y"])
+                missile_lines.append({
+                    "id": next(_missile_ids),
                     "start": launch_pos,
                     "end": target_pos,
                     "colour": (255, 100, 100),  
@@ -65,77 +107,87 @@ class MissileSystem:
                 })
     
     def update_missiles(self) -> bool:
-        current_time = pygame.time.get_ticks()
+        current_time = self.get_ticks()
         animation_duration = 3000  
         elapsed = current_time - self.animation_start_time
+        missile_lines = self.store.mutable("missile_lines")
         
         if elapsed < animation_duration:
             progress = elapsed / animation_duration
             
             if progress >= 0.5:
-                for missile in self.missile_lines:
+                for missile_idx, missile in enumerate(missile_lines):
                     if (missile["type"] == "attack" and not missile.get("intercept_launched", False) and 
                         not missile.get("intercepted", False)):
                         target_idx = missile["target_idx"]
                         
                         if not missile["is_ussr_target"] and target_idx in self.current_player_defenses:
                             
-                            defending_city_pos = (USA_CITIES[target_idx]["x"], USA_CITIES[target_idx]["y"])
+                            defending_city_pos = (self.usa_cities[target_idx]["x"], self.usa_cities[target_idx]["y"])
                             
                             start_x, start_y = missile["start"]
                             end_x, end_y = missile["end"]
                             intercept_x = start_x + (end_x - start_x) * 0.5
                             intercept_y = start_y + (end_y - start_y) * 0.5
                             
-                            self.missile_lines.append({
+                            missile_lines.append({
+                                "id": next(_missile_ids),
                                 "start": defending_city_pos,
                                 "end": (intercept_x, intercept_y),
                                 "colour": (0, 255, 0), 
                                 "progress": 0.0,
                                 "type": "intercept",
-                                "target_missile": missile,
+                                "target_index": missile_idx,
                                 "impact_applied": False
                             })
                             missile["intercept_launched"] = True
                         
                         elif missile["is_ussr_target"] and target_idx in self.current_ai_defenses:
-                            defending_city_pos = (USSR_CITIES[target_idx]["x"], USSR_CITIES[target_idx]["y"])
+                            defending_city_pos = (self.ussr_cities[target_idx]["x"], self.ussr_cities[target_idx]["y"])
                             start_x, start_y = missile["start"]
                             end_x, end_y = missile["end"]
                             intercept_x = start_x + (end_x - start_x) * 0.5
                             intercept_y = start_y + (end_y - start_y) * 0.5
                             
-                            self.missile_lines.append({
+                            missile_lines.append({
+                                "id": next(_missile_ids),
                                 "start": defending_city_pos,
                                 "end": (intercept_x, intercept_y),
                                 "colour": (0, 255, 0),  
                                 "progress": 0.0,
                                 "type": "intercept",
-                                "target_missile": missile,
+                                "target_index": missile_idx,
                                 "impact_applied": False
                             })
                             missile["intercept_launched"] = True
             
-            for missile in self.missile_lines:
+            for idx, missile in enumerate(missile_lines):
                 if missile["type"] == "intercept":
-                    missile["progress"] = min(1.0, (progress - 0.5) * 4)  
+                    self._advance(missile_lines, idx, min(1.0, (progress - 0.5) * 4))
                 else:
-                    missile["progress"] = progress
+                    self._advance(missile_lines, idx, progress)
             
             return False
         else:
-            for missile in self.missile_lines:
-                missile["progress"] = 1.0
+            for idx in range(len(missile_lines)):
+                self._advance(missile_lines, idx, 1.0)
             return True
     
+    def _advance(self, missile_lines: List[dict], idx: int, progress: float) -> None:
+        if missile_lines[idx]["progress"] != progress:
+            missile_lines[idx]["progress"] = progress
+            self.store.changed("missile_lines", idx)
+    
     def check_intercepts(self, player_defenses: Set[int], ai_defenses: Set[int]) -> Set[int]:
         intercepted = set()
-        current_time = pygame.time.get_ticks()
+        current_time = self.get_ticks()
         
-        for i, missile in enumerate(self.missile_lines):
+        missile_lines = self.store.mutable("missile_lines")
+        for i, missile in enumerate(missile_lines):
             if missile["type"] == "intercept" and missile["progress"] >= 0.95 and not missile.get("impact_applied", False):
-                target_missile = missile["target_missile"]
-                target_missile["intercepted"] = True
+                target_index = missile["target_index"]
+                missile_lines[target_index]["intercepted"] = True
+                self.store.changed("missile_lines", target_index)
                 missile["impact_applied"] = True
                 
                 start_x, start_y = missile["start"]
@@ -143,25 +195,24 @@ class MissileSystem:
                 current_x = start_x + (end_x - start_x) * missile["progress"]
                 current_y = start_y + (end_y - start_y) * missile["progress"]
                 
-                self.mushroom_clouds.append({
+                self._add_cloud({
                     "position": (int(current_x), int(current_y)),
                     "start_time": current_time,
                     "duration": 800 
                 })
+                if self.particles is not None:
+                    self.particles.intercept((current_x, current_y))
                 
-                for j, m in enumerate(self.missile_lines):
-                    if m is target_missile:
-                        intercepted.add(j)
-                        break
+                intercepted.add(target_index)
         
+        if intercepted:
+            INTERCEPTS.inc(len(intercepted))
         return intercepted
     
-    def create_explosions(self, intercepted_missiles: Set[int], 
-                         usa_destroyed: List[bool], ussr_destroyed: List[bool],
-                         us_destroyed_cities: List[str], ussr_destroyed_cities: List[str]):
-        current_time = pygame.time.get_ticks()
+    def create_explosions(self, intercepted_missiles: Set[int]) -> None:
+        current_time = self.get_ticks()
         
-        for missile in self.missile_lines:
+        for missile in self.store.mutable("missile_lines"):
             if (missile["type"] == "attack" and missile["progress"] >= 0.98 and 
                 not missile.get("impact_applied", False) and not missile.get("intercepted", False)):
                 
@@ -173,36 +224,56 @@ class MissileSystem:
                 current_x = start_x + (end_x - start_x) * missile["progress"]
                 current_y = start_y + (end_y - start_y) * missile["progress"]
                 
-                if not missile["is_ussr_target"]: 
-                    if not usa_destroyed[target_idx]:
-                        usa_destroyed[target_idx] = True
-                        us_destroyed_cities.append(USA_CITIES[target_idx]["name"])
-                        
-                        self.mushroom_clouds.append({
-                            "position": (int(current_x), int(current_y)),
-                            "start_time": current_time,
-                            "duration": MUSHROOM_CLOUD_DURATION
-                        })
+                if missile["is_ussr_target"]:
+                    hit = self._destroy("ussr_destroyed", "ussr_cities_destroyed",
+                                        self.ussr_cities, target_idx)
+                    if hit:
+                        _USSR_IMPACTS.inc()
+                else:
+                    hit = self._destroy("usa_destroyed", "us_cities_destroyed",
+                                        self.usa_cities, target_idx)
+                    if hit:
+                        _USA_IMPACTS.inc()
                 
-                else: 
-                    if not ussr_destroyed[target_idx]:
-                        ussr_destroyed[target_idx] = True
-                        ussr_destroyed_cities.append(USSR_CITIES[target_idx]["name"])
-                        
-                        self.mushroom_clouds.append({
-                            "position": (int(current_x), int(current_y)),
-                            "start_time": current_time,
-                            "duration": MUSHROOM_CLOUD_DURATION
-                        })
+                if hit:
+                    self._add_cloud({
+                        "position": (int(current_x), int(current_y)),
+                        "start_time": current_time,
+                        "duration": MUSHROOM_CLOUD_DURATION
+                    })
+                    if self.particles is not None:
+                        self.particles.explosion((current_x, current_y))
+    
+    def _add_cloud(self, cloud: dict) -> None:
+        clouds = self.store.mutable("mushroom_clouds")
+        self.store.changed("mushroom_clouds", len(clouds))
+        clouds.append(cloud)
+    
+    def _destroy(self, destroyed_field: str, names_field: str, cities: List[dict],
+                 idx: int) -> bool:
+        # Read through the shared list; only a fresh hit copies it out of the
+        # last snapshot, so the casualty cache sees a new list exactly then.
+        if self.store.get(destroyed_field)[idx]:
+            return False
+        self.store.mutable(destroyed_field)[idx] = True
+        self.store.changed(destroyed_field, idx)
+        self.store.mutable(names_field).append(cities[idx]["name"])
+        return True
     
     def update_mushroom_clouds(self) -> None:
-        current_time = pygame.time.get_ticks()
-        self.mushroom_clouds = [
-            cloud for cloud in self.mushroom_clouds
-            if current_time - cloud["start_time"] < MUSHROOM_CLOUD_DURATION
-        ]
+        current_time = self.get_ticks()
+        clouds = self.mushroom_clouds
+        if any(current_time - cloud["start_time"] >= MUSHROOM_CLOUD_DURATION for cloud in clouds):
+            self.mushroom_clouds = [
+                cloud for cloud in clouds
+                if current_time - cloud["start_time"] < MUSHROOM_CLOUD_DURATION
+            ]
     
-    def draw_missiles(self, screen: pygame.Surface) -> None:
+    def update_particles(self) -> None:
+        if self.particles is not None:
+            self.particles.update(self.get_ticks())
+    
+    def draw_missiles(self, screen: Canvas) -> None:
         for missile in self.missile_lines:
             if missile.get("intercepted", False):
                 continue
@@ -213,44 +284,73 @@ class MissileSystem:
                 current_x = start_x + (end_x - start_x) * missile["progress"]
                 current_y = start_y + (end_y - start_y) * missile["progress"]
                 
-                pygame.draw.line(screen, missile["colour"], missile["start"], (current_x, current_y), 2)
+                screen.line(missile["colour"], missile["start"], (current_x, current_y), 2)
                 
-                pygame.draw.circle(screen, missile["colour"], (int(current_x), int(current_y)), 3)
+                screen.circle(missile["colour"], (int(current_x), int(current_y)), 3)
     
-    def draw_mushroom_clouds(self, screen: pygame.Surface) -> None:
-        current_time = pygame.time.get_ticks()
+    def draw_mushroom_clouds(self, screen: Canvas) -> None:
+        current_time = self.get_ticks()
         
         for cloud in self.mushroom_clouds:
             elapsed = current_time - cloud["start_time"]
             if elapsed < cloud["duration"]:
                 progress = elapsed / cloud["duration"]
                 
-                current_radius = EXPLOSION_RADIUS * (0.5 + 0.5 * progress)
+                current_radius = int(EXPLOSION_RADIUS * (0.5 + 0.5 * progress))
                 alpha = int(255 * (1 - progress))
                 
                 pos_x, pos_y = cloud["position"]
                 
-                explosion_surface = pygame.Surface((current_radius * 2, current_radius * 2))
-                explosion_surface.set_alpha(alpha)
-                explosion_surface = explosion_surface.convert_alpha()
-
-                pygame.draw.circle(explosion_surface, COLOURS["red"], 
-                                 (int(current_radius), int(current_radius)), int(current_radius))
-                pygame.draw.circle(explosion_surface, COLOURS["yellow"], 
-                                 (int(current_radius), int(current_radius)), int(current_radius * 0.7))
-                pygame.draw.circle(explosion_surface, COLOURS["white"], 
-                                 (int(current_radius), int(current_radius)), int(current_radius * 0.4))
-                
-                screen.blit(explosion_surface, 
-                           (pos_x - current_radius, pos_y - current_radius))
+                screen.blit(explosion_sprite(current_radius),
+                            (pos_x - current_radius, pos_y - current_radius), alpha=alpha)
+    
+    def draw_particles(self, screen: Canvas) -> None:
+        if self.particles is not None:
+            self.particles.draw(screen)
     
-    def draw_defense_ranges(self, screen: pygame.Surface, defenses: Set[int], cities: List[dict]) -> None:
-        for defense_idx in defenses:
-            city = cities[defense_idx]
-            pygame.draw.circle(screen, COLOURS["green"], 
-                             (city["x"], city["y"]), INTERCEPT_RADIUS, 1)
+    def draw_defense_ranges(self, screen: Canvas, defenses: Set[int], cities: List[dict],
+                            camera: Optional[Camera] = None) -> None:
+        if self.coverage is None:
+            self.coverage = CoverageLayer()
+        self.coverage.sync(defenses, cities)
+        self.coverage.draw(screen, camera)
     
     def reset(self) -> None:
         self.missile_lines = []
         self.mushroom_clouds = []
         self.animation_start_time = 0
+        if self.particles is not None:
+            self.particles.clear()
+
+
+_launching: "weakref.WeakSet[MissileSystem]" = weakref.WeakSet()
+
+
+def missiles_in_flight() -> int:
+    # Counted when metrics are scraped, not every frame.
+    count = 0
+    for missile_system in list(_launching):
+        for missile in missile_system.store.get("missile_lines"):
+            if (missile["progress"] > 0 and not missile.get("impact_applied", False) and
+                    not missile.get("intercepted", False)):
+                count += 1
+    return count
+
+
+MISSILES_IN_FLIGHT.function = missiles_in_flight
+
+
+def advance_launch(game_state, missile_system: MissileSystem) -> bool:
+    _launching.add(missile_system)
+    animation_complete = missile_system.update_missiles()
+    
+    intercepted = missile_system.check_intercepts(
+        game_state.player_defenses,
+        game_state.ai_defenses
+    )
+    
+    missile_system.create_explosions(intercepted)
+    
+    missile_system.update_mushroom_clouds()
+    missile_system.update_particles()
+    return animation_complete
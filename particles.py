@@ -0,0 +1,137 @@
+"""
+Particle bursts for explosions, intercepts and fallout, stored and stepped as NumPy arrays
+"""
+
+import threading
+from typing import Optional, Sequence
+
+import numpy as np
+
+from render_backend import Canvas
+
+MAX_PARTICLES = 200000
+MAX_STEP_MS = 100
+DRAG_PER_MS = 0.998
+COMPACT_FRACTION = 8
+
+EXPLOSION_SPARKS = 4000
+EXPLOSION_FALLOUT = 2000
+INTERCEPT_SPARKS = 800
+
+EXPLOSION_PALETTE = ((255, 255, 255), (255, 255, 0), (255, 160, 0), (255, 60, 0))
+FALLOUT_PALETTE = ((120, 110, 100), (90, 85, 80), (150, 140, 120))
+INTERCEPT_PALETTE = ((0, 255, 0), (180, 255, 180), (255, 255, 255))
+
+
+class ParticleSystem:
+
+    def __init__(self, capacity: int = MAX_PARTICLES, seed: Optional[int] = None):
+        self.capacity = capacity
+        self.count = 0
+        self.last_update: Optional[int] = None
+        self.rng = np.random.default_rng(seed)
+        # Bursts may be emitted and stepped on a simulation thread while the
+        # render thread draws.
+        self.lock = threading.Lock()
+
+        self.position = np.zeros((capacity, 2), dtype=np.float32)
+        self.velocity = np.zeros((capacity, 2), dtype=np.float32)
+        self.gravity = np.zeros(capacity, dtype=np.float32)
+        self.life = np.zeros(capacity, dtype=np.float32)
+        self.max_life = np.ones(capacity, dtype=np.float32)
+        self.colour = np.zeros((capacity, 3), dtype=np.uint8)
+
+    def emit(self, position: Sequence[float], count: int, speed: tuple, life: tuple,
+             palette: Sequence[tuple], gravity: float = 0.0, lift: float = 0.0,
+             drift: float = 0.0) -> int:
+        with self.lock:
+            return self._emit(position, count, speed, life, palette, gravity, lift, drift)
+
+    def _emit(self, position: Sequence[float], count: int, speed: tuple, life: tuple,
+              palette: Sequence[tuple], gravity: float, lift: float, drift: float) -> int:
+        count = min(count, self.capacity - self.count)
+        if count <= 0:
+            return 0
+        start, end = self.count, self.count + count
+        rng = self.rng
+
+        angle = rng.uniform(0.0, 2 * np.pi, count)
+        magnitude = rng.uniform(speed[0], speed[1], count)
+        self.position[start:end] = position
+        self.velocity[start:end, 0] = np.cos(angle) * magnitude + drift
+        self.velocity[start:end, 1] = np.sin(angle) * magnitude - lift
+        self.gravity[start:end] = gravity
+        lifetimes = rng.uniform(life[0], life[1], count)
+        self.life[start:end] = lifetimes
+        self.max_life[start:end] = lifetimes
+        colours = np.asarray(palette, dtype=np.uint8)
+        self.colour[start:end] = colours[rng.integers(0, len(colours), count)]
+
+        self.count = end
+        return count
+
+    def explosion(self, position: Sequence[float]) -> None:
+        self.emit(position, EXPLOSION_SPARKS, (0.02, 0.25), (600, 1800), EXPLOSION_PALETTE,
+                  gravity=0.0002)
+        self.emit(position, EXPLOSION_FALLOUT, (0.002, 0.03), (2000, 3000), FALLOUT_PALETTE,
+                  gravity=0.00001, lift=0.03, drift=0.01)
+
+    def intercept(self, position: Sequence[float]) -> None:
+        self.emit(position, INTERCEPT_SPARKS, (0.02, 0.12), (300, 800), INTERCEPT_PALETTE)
+
+    def update(self, now: int) -> None:
+        with self.lock:
+            self._update(now)
+
+    def _update(self, now: int) -> None:
+        last, self.last_update = self.last_update, now
+        if last is None or not self.count:
+            return
+        dt = min(max(now - last, 0), MAX_STEP_MS)
+        if not dt:
+            return
+
+        live = slice(0, self.count)
+        velocity = self.velocity[live]
+        velocity[:, 1] += self.gravity[live] * dt
+        velocity *= DRAG_PER_MS ** dt
+        self.position[live] += velocity * dt
+        self.life[live] -= dt
+
+        # Dead particles stay in place, drawn fully transparent, until enough
+        # accumulate to make one compaction pass worthwhile.
+        dead = self.count - int(np.count_nonzero(self.life[live] > 0))
+        if dead and dead * COMPACT_FRACTION >= self.count:
+            keep = np.flatnonzero(self.life[live] > 0)
+            for array in (self.position, self.velocity, self.gravity, self.life,
+                          self.max_life, self.colour):
+                array[:len(keep)] = array[live].take(keep, axis=0)
+            self.count = len(keep)
+
+    def draw(self, screen: Canvas) -> None:
+        with self.lock:
+            if not self.count:
+                return
+            live = slice(0, self.count)
+            points = self.position[live].astype(np.intp)
+            alpha = (np.maximum(self.life[live], 0) / self.max_life[live] * 255).astype(np.uint8)
+            colours = self.colour[live].copy()
+
+        xs, ys = points[:, 0], points[:, 1]
+        # Off-screen particles are clamped to the edge with zero alpha rather
+        # than filtered out, which would copy every array each frame.
+        width, height = screen.size
+        offscreen = (xs < 0) | (xs >= width) | (ys < 0) | (ys >= height)
+        if offscreen.any():
+            np.clip(xs, 0, width - 1, out=xs)
+            np.clip(ys, 0, height - 1, out=ys)
+            alpha[offscreen] = 0
+        screen.splat(xs, ys, colours, alpha)
+
+    def reseed(self, seed: Optional[int]) -> None:
+        self.rng = np.random.default_rng(seed)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.count = 0
+            self.last_update = None
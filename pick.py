@@ -0,0 +1,88 @@
+"""
+Screen-resolution ID map that resolves clicks and hovers to entities with one lookup
+"""
+
+import bisect
+from typing import Any, Hashable, List, Optional, Tuple
+
+import numpy as np
+import pygame
+
+CITY = "city"
+BUTTON = "button"
+PANEL = "panel"
+
+
+class PickBuffer:
+
+    def __init__(self, size: Tuple[int, int]):
+        self.ids = np.zeros(size, dtype=np.int32)
+        self.key: Optional[Hashable] = None
+        self._bases: List[int] = []
+        self._groups: List[Tuple[str, Any, bool]] = []
+        self._next_id = 1
+
+    def clear(self, key: Optional[Hashable] = None) -> None:
+        self.ids.fill(0)
+        self.key = key
+        self._bases.clear()
+        self._groups.clear()
+        self._next_id = 1
+
+    def _allocate(self, count: int, kind: str, value: Any, indexed: bool) -> int:
+        base = self._next_id
+        self._bases.append(base)
+        self._groups.append((kind, value, indexed))
+        self._next_id += count
+        return base
+
+    def add_rect(self, rect: pygame.Rect, kind: str, value: Any) -> None:
+        entity_id = self._allocate(1, kind, value, False)
+        rect = pygame.Rect(rect).clip(pygame.Rect((0, 0), self.ids.shape))
+        self.ids[rect.left:rect.right, rect.top:rect.bottom] = entity_id
+
+    def add_discs(self, points: List[dict], radius: int, kind: str) -> None:
+        if not points:
+            return
+        xs = np.array([point["x"] for point in points], dtype=np.intp)
+        ys = np.array([point["y"] for point in points], dtype=np.intp)
+        self.add_disc_points(xs, ys, np.arange(len(points)), len(points), radius, kind)
+
+    def add_disc_points(self, xs: np.ndarray, ys: np.ndarray, indices: np.ndarray, count: int,
+                        radius: int, kind: str) -> None:
+        # Later additions win, and within a group the lowest index wins, which
+        # matches a first-match linear scan.
+        if not count:
+            return
+        base = self._allocate(count, kind, None, True)
+        offsets = np.arange(-radius, radius + 1)
+        dx, dy = np.meshgrid(offsets, offsets, indexing="ij")
+        inside = dx * dx + dy * dy <= radius * radius
+        dx, dy = dx[inside], dy[inside]
+
+        ids = (base + np.asarray(indices)).astype(np.int32)
+        xs = (np.asarray(xs, dtype=np.intp)[:, None] + dx).ravel()
+        ys = (np.asarray(ys, dtype=np.intp)[:, None] + dy).ravel()
+        ids = np.repeat(ids, len(dx))
+        width, height = self.ids.shape
+        visible = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+
+        # Overlapping discs are resolved by taking the smallest id per pixel,
+        # since the order fancy assignment writes duplicates in is unspecified.
+        empty = np.iinfo(np.int32).max
+        nearest = np.full(width * height, empty, dtype=np.int32)
+        np.minimum.at(nearest, xs[visible] * height + ys[visible], ids[visible])
+        covered = nearest != empty
+        self.ids.reshape(-1)[covered] = nearest[covered]
+
+    def entity_at(self, pos: Tuple[int, int]) -> Optional[Tuple[str, Any]]:
+        x, y = int(pos[0]), int(pos[1])
+        width, height = self.ids.shape
+        if not (0 <= x < width and 0 <= y < height):
+            return None
+        entity_id = int(self.ids[x, y])
+        if not entity_id:
+            return None
+        group = bisect.bisect_right(self._bases, entity_id) - 1
+        kind, value, indexed = self._groups[group]
+        return kind, entity_id - self._bases[group] if indexed else value
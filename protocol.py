@@ -0,0 +1,140 @@
+"""
+Wire protocol shared by the multiplayer server and clients
+"""
+
+import asyncio
+import json
+import struct
+from typing import Any, Dict, List, Tuple
+
+from city_data import USA_CITIES, USSR_CITIES
+from config import DEFENSE_LIMIT, TARGET_LIMIT
+
+SIDES = ("usa", "ussr")
+DEFAULT_ROOM = "default"
+DEFAULT_PORT = 8765
+MAX_MESSAGE_SIZE = 64 * 1024
+
+FRAME_HEADER = struct.Struct("<II")
+
+KIND_US_ATTACK = 0
+KIND_USSR_ATTACK = 1
+KIND_INTERCEPT = 2
+
+KIND_COLOURS = {
+    KIND_US_ATTACK: (255, 255, 0),
+    KIND_USSR_ATTACK: (255, 100, 100),
+    KIND_INTERCEPT: (0, 255, 0),
+}
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode_message(message: Dict[str, Any]) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+def decode_message(line: bytes) -> Dict[str, Any]:
+    try:
+        message = json.loads(line)
+    except ValueError as exc:
+        raise ProtocolError(f"malformed message: {exc}") from None
+    if not isinstance(message, dict) or "op" not in message:
+        raise ProtocolError("message must be an object with an 'op' field")
+    return message
+
+
+def encode_frame_header(match_id: int, size: int) -> bytes:
+    return FRAME_HEADER.pack(size, match_id)
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    size, match_id = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    return match_id, await reader.readexactly(size)
+
+
+def parse_address(address: str) -> Tuple[str, Any]:
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    host, sep, port = address.rpartition(":")
+    if not sep:
+        return "tcp", (address, DEFAULT_PORT)
+    return "tcp", (host or "127.0.0.1", int(port))
+
+
+async def open_connection(address: str) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    kind, target = parse_address(address)
+    if kind == "unix":
+        return await asyncio.open_unix_connection(target, limit=MAX_MESSAGE_SIZE)
+    return await asyncio.open_connection(target[0], target[1], limit=MAX_MESSAGE_SIZE)
+
+
+def side_cities(side: str) -> Tuple[List[dict], List[dict]]:
+    if side == "usa":
+        return USA_CITIES, USSR_CITIES
+    return USSR_CITIES, USA_CITIES
+
+
+def validate_selection(side: str, defenses: Any, targets: Any) -> Tuple[List[int], List[int]]:
+    if side not in SIDES:
+        raise ProtocolError(f"unknown side: {side!r}")
+    own_cities, enemy_cities = side_cities(side)
+    checked = []
+    for label, values, limit, cities in (("defenses", defenses, DEFENSE_LIMIT, own_cities),
+                                         ("targets", targets, TARGET_LIMIT, enemy_cities)):
+        if (not isinstance(values, list) or len(values) != limit or
+                len(set(values)) != limit or
+                not all(isinstance(v, int) and not isinstance(v, bool) and 0 <= v < len(cities)
+                        for v in values)):
+            raise ProtocolError(f"{label} must be {limit} distinct city indices")
+        checked.append(values)
+    return checked[0], checked[1]
+
+
+def missile_kind(missile: Dict[str, Any]) -> int:
+    if missile["type"] == "intercept":
+        return KIND_INTERCEPT
+    return KIND_US_ATTACK if missile["is_ussr_target"] else KIND_USSR_ATTACK
+
+
+def destroyed_mask(destroyed: List[bool]) -> int:
+    mask = 0
+    for idx, is_destroyed in enumerate(destroyed):
+        if is_destroyed:
+            mask |= 1 << idx
+    return mask
+
+
+def snapshot_message(game_state, missile_system, now: int) -> Dict[str, Any]:
+    return {
+        "op": "s",
+        "t": now,
+        "m": [[*missile["start"], *missile["end"], missile_kind(missile),
+               round(missile["progress"], 4), int(missile.get("intercepted", False)),
+               missile["id"]]
+              for missile in missile_system.missile_lines],
+        "k": [[*cloud["position"], cloud["start_time"], cloud["duration"]]
+              for cloud in missile_system.mushroom_clouds],
+        "u": destroyed_mask(game_state.usa_destroyed),
+        "r": destroyed_mask(game_state.ussr_destroyed),
+    }
+
+
+def missile_from_snapshot(entry: List[Any], progress: float) -> Dict[str, Any]:
+    start_x, start_y, end_x, end_y, kind, _, intercepted, missile_id = entry
+    return {
+        "id": missile_id,
+        "start": (start_x, start_y),
+        "end": (end_x, end_y),
+        "colour": KIND_COLOURS[kind],
+        "progress": progress,
+        "type": "intercept" if kind == KIND_INTERCEPT else "attack",
+        "intercepted": bool(intercepted),
+    }
+
+
+def cloud_from_snapshot(entry: List[Any]) -> Dict[str, Any]:
+    x, y, start_time, duration = entry
+    return {"position": (x, y), "start_time": start_time, "duration": duration}
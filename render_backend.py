@@ -0,0 +1,475 @@
+"""
+Drawing backends: software surfaces or SDL2 renderer textures
+"""
+
+import math
+import os
+import weakref
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pygame
+from pygame._sdl2 import video
+
+BACKENDS = ("surface", "texture")
+BLENDMODE_BLEND = 1
+MAX_SCALE_BLOCK = 64
+
+
+class Canvas:
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        raise NotImplementedError
+
+    def fill(self, colour: tuple) -> None:
+        raise NotImplementedError
+
+    def blit(self, source: pygame.Surface, dest, alpha: Optional[int] = None) -> None:
+        raise NotImplementedError
+
+    def blits(self, sequence: Iterable[Tuple[pygame.Surface, tuple]]) -> None:
+        for source, dest in sequence:
+            self.blit(source, dest)
+
+    def line(self, colour: tuple, start, end, width: int = 1) -> None:
+        raise NotImplementedError
+
+    def circle(self, colour: tuple, center, radius: int, width: int = 0) -> None:
+        raise NotImplementedError
+
+    def rect(self, colour: tuple, rect, width: int = 0, border_radius: int = 0) -> None:
+        raise NotImplementedError
+
+    def splat(self, xs: np.ndarray, ys: np.ndarray, colours: np.ndarray, alphas: np.ndarray) -> None:
+        raise NotImplementedError
+
+    def invalidate(self, source: pygame.Surface, rects: Iterable[pygame.Rect]) -> None:
+        pass
+
+    def to_logical(self, pos) -> Tuple[int, int]:
+        # Display coordinates, such as a mouse position, in drawing coordinates.
+        return pos
+
+    def to_logical_length(self, length: float) -> float:
+        return length
+
+    @property
+    def retains_frame(self) -> bool:
+        # Whether the last frame survives present(), so a redraw can be clipped
+        # to the regions that changed.
+        return False
+
+    def set_clip(self, rect: Optional[pygame.Rect]) -> None:
+        pass
+
+    def present(self, rects: Optional[List[pygame.Rect]] = None) -> None:
+        pass
+
+
+class SurfaceCanvas(Canvas):
+
+    def __init__(self, surface: pygame.Surface, is_display: bool = False):
+        self.surface = surface
+        self.is_display = is_display
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.surface.get_size()
+
+    def fill(self, colour: tuple) -> None:
+        self.surface.fill(colour)
+
+    def blit(self, source: pygame.Surface, dest, alpha: Optional[int] = None) -> None:
+        if alpha is None:
+            self.surface.blit(source, dest)
+            return
+        # Sources are often cached and shared, so the alpha is only lent.
+        previous = source.get_alpha()
+        source.set_alpha(alpha)
+        self.surface.blit(source, dest)
+        source.set_alpha(previous)
+
+    def blits(self, sequence: Iterable[Tuple[pygame.Surface, tuple]]) -> None:
+        self.surface.blits(sequence, doreturn=False)
+
+    def line(self, colour: tuple, start, end, width: int = 1) -> None:
+        pygame.draw.line(self.surface, colour, start, end, width)
+
+    def circle(self, colour: tuple, center, radius: int, width: int = 0) -> None:
+        pygame.draw.circle(self.surface, colour, center, radius, width)
+
+    def rect(self, colour: tuple, rect, width: int = 0, border_radius: int = 0) -> None:
+        pygame.draw.rect(self.surface, colour, rect, width, border_radius=border_radius)
+
+    def splat(self, xs: np.ndarray, ys: np.ndarray, colours: np.ndarray, alphas: np.ndarray) -> None:
+        clip = self.surface.get_clip()
+        if clip.size != self.surface.get_size():
+            outside = (xs < clip.left) | (xs >= clip.right) | (ys < clip.top) | (ys >= clip.bottom)
+            alphas = np.where(outside, 0, alphas).astype(np.uint8)
+
+        red_shift, green_shift, blue_shift, _ = self.surface.get_shifts()
+        if self.surface.get_bytesize() != 4 or green_shift != 8:
+            pixels = pygame.surfarray.pixels3d(self.surface)
+            existing = pixels[xs, ys].astype(np.uint16)
+            weight = alphas[:, None].astype(np.uint16)
+            pixels[xs, ys] = ((colours * weight + existing * (256 - weight)) >> 8).astype(np.uint8)
+            del pixels
+            return
+
+        # Blend packed 32-bit pixels two channels at a time: red and blue share
+        # one multiply, green gets the other.
+        pixels, index = _flat_pixels(self.surface, xs, ys)
+        source = _pack(colours, red_shift, green_shift, blue_shift)
+        existing = pixels[index]
+        weight = alphas.astype(np.uint32)
+        inverse = 256 - weight
+        red_blue = (((source & 0xFF00FF) * weight + (existing & 0xFF00FF) * inverse) >> 8) & 0xFF00FF
+        green = (((source & 0x00FF00) * weight + (existing & 0x00FF00) * inverse) >> 8) & 0x00FF00
+        pixels[index] = red_blue | green
+        del pixels
+
+    @property
+    def retains_frame(self) -> bool:
+        return True
+
+    def set_clip(self, rect: Optional[pygame.Rect]) -> None:
+        self.surface.set_clip(rect)
+
+    def present(self, rects: Optional[List[pygame.Rect]] = None) -> None:
+        if not self.is_display:
+            return
+        if rects:
+            pygame.display.update(rects)
+        else:
+            pygame.display.flip()
+
+
+class TextureCanvas(Canvas):
+
+    def __init__(self, renderer: video.Renderer):
+        self.renderer = renderer
+        # Textures live as long as the surface they were uploaded from, so
+        # persistent surfaces (background, cached text, sprites) upload once.
+        self._textures: "weakref.WeakKeyDictionary[pygame.Surface, video.Texture]" = \
+            weakref.WeakKeyDictionary()
+        self._shapes: Dict[tuple, video.Texture] = {}
+        self._layer: Optional[pygame.Surface] = None
+        self._layer_points = None
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        # A scaled window's viewport is rounded to whole window pixels.
+        width, height = self.renderer.logical_size
+        return (width, height) if width else self.renderer.get_viewport().size
+
+    def texture(self, source: pygame.Surface) -> video.Texture:
+        texture = self._textures.get(source)
+        if texture is None:
+            texture = video.Texture.from_surface(self.renderer, source)
+            self._textures[source] = texture
+        return texture
+
+    def invalidate(self, source: pygame.Surface, rects: Iterable[pygame.Rect]) -> None:
+        texture = self._textures.get(source)
+        if texture is None:
+            return
+        for rect in rects:
+            texture.update(source.subsurface(rect), rect)
+
+    def _shape(self, key: tuple, size: Tuple[int, int], draw) -> video.Texture:
+        texture = self._shapes.get(key)
+        if texture is None:
+            surface = pygame.Surface(size, pygame.SRCALPHA)
+            draw(surface)
+            texture = video.Texture.from_surface(self.renderer, surface)
+            texture.blend_mode = BLENDMODE_BLEND
+            self._shapes[key] = texture
+        return texture
+
+    def fill(self, colour: tuple) -> None:
+        self.renderer.draw_color = pygame.Color(colour)
+        self.renderer.clear()
+
+    def blit(self, source: pygame.Surface, dest, alpha: Optional[int] = None) -> None:
+        if not source.get_width() or not source.get_height():
+            return
+        texture = self.texture(source)
+        if isinstance(dest, pygame.Rect):
+            dest = dest.topleft
+        dstrect = (int(dest[0]), int(dest[1]), texture.width, texture.height)
+        if alpha is None:
+            texture.draw(dstrect=dstrect)
+            return
+        previous = texture.blend_mode, texture.alpha
+        texture.blend_mode = BLENDMODE_BLEND
+        texture.alpha = alpha
+        texture.draw(dstrect=dstrect)
+        texture.blend_mode, texture.alpha = previous
+
+    def line(self, colour: tuple, start, end, width: int = 1) -> None:
+        self.renderer.draw_color = pygame.Color(colour)
+        (x1, y1), (x2, y2) = start, end
+        if width <= 1:
+            self.renderer.draw_line((x1, y1), (x2, y2))
+            return
+        steep = abs(y2 - y1) > abs(x2 - x1)
+        for offset in range(-(width // 2), width - width // 2):
+            if steep:
+                self.renderer.draw_line((x1 + offset, y1), (x2 + offset, y2))
+            else:
+                self.renderer.draw_line((x1, y1 + offset), (x2, y2 + offset))
+
+    def circle(self, colour: tuple, center, radius: int, width: int = 0) -> None:
+        radius = int(radius)
+        size = radius * 2 + 1
+        texture = self._shape(("circle", tuple(colour), radius, width), (size, size),
+                              lambda surface: pygame.draw.circle(surface, colour, (radius, radius),
+                                                                 radius, width))
+        texture.draw(dstrect=(int(center[0]) - radius, int(center[1]) - radius, size, size))
+
+    def rect(self, colour: tuple, rect, width: int = 0, border_radius: int = 0) -> None:
+        rect = pygame.Rect(rect)
+        if border_radius:
+            texture = self._shape(("rect", tuple(colour), rect.size, width, border_radius), rect.size,
+                                  lambda surface: pygame.draw.rect(surface, colour, surface.get_rect(),
+                                                                   width, border_radius=border_radius))
+            texture.draw(dstrect=rect)
+            return
+        self.renderer.draw_color = pygame.Color(colour)
+        if width:
+            self.renderer.draw_rect(rect)
+        else:
+            self.renderer.fill_rect(rect)
+
+    def splat(self, xs: np.ndarray, ys: np.ndarray, colours: np.ndarray, alphas: np.ndarray) -> None:
+        # Points go to one transparent layer that is re-uploaded and drawn as a
+        # single texture; only the previous frame's points are cleared from it.
+        if self._layer is None or self._layer.get_size() != self.size:
+            self._layer = pygame.Surface(self.size, pygame.SRCALPHA)
+            self._layer_points = None
+        pixels, index = _flat_pixels(self._layer, xs, ys)
+        if self._layer_points is not None:
+            pixels[self._layer_points] = 0
+        red_shift, green_shift, blue_shift, alpha_shift = self._layer.get_shifts()
+        pixels[index] = (_pack(colours, red_shift, green_shift, blue_shift) |
+                         (alphas.astype(np.uint32) << alpha_shift))
+        del pixels
+        self._layer_points = index
+
+        texture = self._textures.get(self._layer)
+        if texture is None:
+            texture = self.texture(self._layer)
+        else:
+            texture.update(self._layer)
+        texture.draw()
+
+    def present(self, rects: Optional[List[pygame.Rect]] = None) -> None:
+        self.renderer.present()
+
+
+_scaled_surfaces: "weakref.WeakKeyDictionary[pygame.Surface, Dict[float, pygame.Surface]]" = \
+    weakref.WeakKeyDictionary()
+
+
+def scaled_surface(source: pygame.Surface, scale: float) -> pygame.Surface:
+    # Scaled copies live as long as their source, so every viewport drawing
+    # the same background, label or sprite at the same scale shares one copy.
+    copies = _scaled_surfaces.setdefault(source, {})
+    scaled = copies.get(scale)
+    if scaled is None:
+        width, height = source.get_size()
+        size = (max(round(width * scale), 1), max(round(height * scale), 1))
+        if source.get_colorkey() is not None:
+            # Filtering would blend the key colour into the edges, where it no
+            # longer matches the key and shows.
+            scaled = pygame.transform.scale(source, size)
+        else:
+            try:
+                scaled = pygame.transform.smoothscale(source, size)
+            except ValueError:
+                scaled = pygame.transform.scale(source, size)
+        copies[scale] = scaled
+    return scaled
+
+
+def scaled_surfaces() -> List[pygame.Surface]:
+    return [scaled for copies in list(_scaled_surfaces.values()) for scaled in copies.values()]
+
+
+class ViewportCanvas(Canvas):
+
+    def __init__(self, target: Canvas, viewport: pygame.Rect, logical_size: Tuple[int, int]):
+        self.target = target
+        self.logical_size = logical_size
+        # One uniform scale, letterboxed inside the viewport.
+        self.scale = min(viewport.width / logical_size[0], viewport.height / logical_size[1])
+        width, height = round(logical_size[0] * self.scale), round(logical_size[1] * self.scale)
+        self.viewport = pygame.Rect(0, 0, width, height)
+        self.viewport.center = viewport.center
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.logical_size
+
+    def _point(self, point) -> Tuple[int, int]:
+        return (self.viewport.x + round(point[0] * self.scale),
+                self.viewport.y + round(point[1] * self.scale))
+
+    def _length(self, length: int) -> int:
+        return max(round(length * self.scale), 1) if length else 0
+
+    def _rect(self, rect) -> pygame.Rect:
+        rect = pygame.Rect(rect)
+        left, top = self._point(rect.topleft)
+        right, bottom = self._point(rect.bottomright)
+        return pygame.Rect(left, top, right - left, bottom - top)
+
+    def fill(self, colour: tuple) -> None:
+        self.target.rect(colour, self.viewport)
+
+    def blit(self, source: pygame.Surface, dest, alpha: Optional[int] = None) -> None:
+        if isinstance(dest, pygame.Rect):
+            dest = dest.topleft
+        self.target.blit(scaled_surface(source, self.scale), self._point(dest), alpha)
+
+    def line(self, colour: tuple, start, end, width: int = 1) -> None:
+        self.target.line(colour, self._point(start), self._point(end), self._length(width))
+
+    def circle(self, colour: tuple, center, radius: int, width: int = 0) -> None:
+        self.target.circle(colour, self._point(center), self._length(radius), self._length(width))
+
+    def rect(self, colour: tuple, rect, width: int = 0, border_radius: int = 0) -> None:
+        self.target.rect(colour, self._rect(rect), self._length(width), self._length(border_radius))
+
+    def splat(self, xs: np.ndarray, ys: np.ndarray, colours: np.ndarray, alphas: np.ndarray) -> None:
+        xs = self.viewport.x + (xs * self.scale).astype(np.intp)
+        ys = self.viewport.y + (ys * self.scale).astype(np.intp)
+        self.target.splat(xs, ys, colours, alphas)
+
+    def invalidate(self, source: pygame.Surface, rects: Iterable[pygame.Rect]) -> None:
+        _scaled_surfaces.pop(source, None)
+
+    @property
+    def retains_frame(self) -> bool:
+        return self.target.retains_frame
+
+    def set_clip(self, rect: Optional[pygame.Rect]) -> None:
+        self.target.set_clip(self.viewport if rect is None else self._rect(rect).clip(self.viewport))
+
+
+def _scale_block(scale: float, limit: int = MAX_SCALE_BLOCK) -> Optional[int]:
+    # Smallest run of logical pixels that maps onto a whole number of display
+    # pixels, so regions aligned to it scale exactly as the full frame does.
+    for block in range(1, limit + 1):
+        if abs(block * scale - round(block * scale)) < 1e-6:
+            return block
+    return None
+
+
+class ScaledCanvas(SurfaceCanvas):
+
+    def __init__(self, display: pygame.Surface, logical_size: Tuple[int, int], smooth: bool = False):
+        # Everything draws at the logical size offscreen; present() scales the
+        # changed regions onto the display, letterboxed with one uniform scale.
+        super().__init__(pygame.Surface(logical_size, 0, display))
+        self.display = display
+        self.logical_size = logical_size
+        display_width, display_height = display.get_size()
+        self.scale = min(display_width / logical_size[0], display_height / logical_size[1])
+        width, height = round(logical_size[0] * self.scale), round(logical_size[1] * self.scale)
+        self.viewport = pygame.Rect(0, 0, width, height)
+        self.viewport.center = display.get_rect().center
+        self._frame = display.subsurface(self.viewport)
+        self.block = _scale_block(self.scale)
+        # Nearest-neighbour by default. The smooth filter enlarges by a whole
+        # factor and box-filters down, since pygame's bilinear upscale would
+        # not line up across separately scaled regions.
+        self.factor = math.ceil(self.scale) if smooth and self.block != 1 else 0
+        self._enlarged = (pygame.Surface((logical_size[0] * self.factor, logical_size[1] * self.factor),
+                                         0, display) if self.factor else None)
+        display.fill((0, 0, 0))
+
+    def to_logical(self, pos) -> Tuple[int, int]:
+        return (int((pos[0] - self.viewport.x) // self.scale),
+                int((pos[1] - self.viewport.y) // self.scale))
+
+    def to_logical_length(self, length: float) -> float:
+        return length / self.scale
+
+    def _rescale(self, rect: pygame.Rect) -> pygame.Rect:
+        left, top = round(rect.left * self.scale), round(rect.top * self.scale)
+        right, bottom = round(rect.right * self.scale), round(rect.bottom * self.scale)
+        target = pygame.Rect(left, top, right - left, bottom - top)
+        source, dest = self.surface.subsurface(rect), self._frame.subsurface(target)
+        if self._enlarged is None:
+            pygame.transform.scale(source, target.size, dest)
+        else:
+            factor = self.factor
+            enlarged = self._enlarged.subsurface(rect.x * factor, rect.y * factor,
+                                                 rect.width * factor, rect.height * factor)
+            pygame.transform.scale(source, enlarged.get_size(), enlarged)
+            pygame.transform.smoothscale(enlarged, target.size, dest)
+        return target.move(self.viewport.topleft)
+
+    def _aligned(self, rect) -> pygame.Rect:
+        # Regions snapped to whole blocks scale exactly as the full frame does.
+        block = self.block
+        rect = pygame.Rect(rect)
+        left, top = rect.left // block * block, rect.top // block * block
+        right, bottom = -(-rect.right // block) * block, -(-rect.bottom // block) * block
+        return pygame.Rect(left, top, right - left, bottom - top).clip(pygame.Rect((0, 0), self.logical_size))
+
+    def present(self, rects: Optional[List[pygame.Rect]] = None) -> None:
+        if not rects or self.block is None:
+            self._rescale(pygame.Rect((0, 0), self.logical_size))
+            pygame.display.flip()
+            return
+        regions = [self._aligned(rect) for rect in rects]
+        pygame.display.update([self._rescale(rect) for rect in regions if rect.width and rect.height])
+
+
+def _flat_pixels(surface: pygame.Surface, xs: np.ndarray, ys: np.ndarray):
+    pixels = pygame.surfarray.pixels2d(surface)
+    rows = pixels.T
+    if rows.flags.c_contiguous:
+        return rows.reshape(-1), ys * surface.get_width() + xs
+    return pixels, (xs, ys)
+
+
+def _pack(colours: np.ndarray, red_shift: int, green_shift: int, blue_shift: int) -> np.ndarray:
+    colours = colours.astype(np.uint32)
+    return (colours[:, 0] << red_shift) | (colours[:, 1] << green_shift) | (colours[:, 2] << blue_shift)
+
+
+def _software_driver_index() -> int:
+    for index, info in enumerate(video.get_drivers()):
+        if info.name == "software":
+            return index
+    return -1
+
+
+def create_display_canvas(backend: str, size: Tuple[int, int], title: str,
+                          software: bool = False, display_size: Optional[Tuple[int, int]] = None,
+                          smooth: bool = False) -> Canvas:
+    # With a display size, drawing stays at the logical size and is scaled to
+    # the window once per frame: in software by ScaledCanvas, on the GPU by
+    # the renderer's logical size.
+    window_size = display_size or size
+    if backend == "surface":
+        surface = pygame.display.set_mode(window_size)
+        pygame.display.set_caption(title)
+        if window_size != size:
+            return ScaledCanvas(surface, size, smooth)
+        return SurfaceCanvas(surface, is_display=True)
+
+    if smooth:
+        os.environ["SDL_RENDER_SCALE_QUALITY"] = "linear"
+    window = video.Window(title, window_size)
+    if software:
+        renderer = video.Renderer(window, index=_software_driver_index(), accelerated=0)
+    else:
+        renderer = video.Renderer(window, vsync=True)
+    if window_size != size:
+        renderer.logical_size = size
+    return TextureCanvas(renderer)
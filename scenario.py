@@ -0,0 +1,111 @@
+"""
+Theater definitions and a seeded generator for synthetic stress-test scenarios
+"""
+
+import math
+import random
+from typing import List, Optional, Tuple
+
+from city_data import USA_CITIES, USSR_CITIES
+from config import DEFENSE_LIMIT, TARGET_LIMIT
+
+SPATIAL_DISTRIBUTIONS = ("uniform", "clustered", "jittered")
+POPULATION_DISTRIBUTIONS = ("zipf", "lognormal", "uniform")
+
+REGION_PADDING = 30
+MAX_POPULATION = 9000000
+MIN_POPULATION = 10000
+
+
+class Scenario:
+
+    def __init__(self, usa_cities: List[dict], ussr_cities: List[dict],
+                 defense_limit: int = DEFENSE_LIMIT, target_limit: int = TARGET_LIMIT,
+                 name: str = "default", seed: Optional[int] = None):
+        if defense_limit > len(usa_cities) or defense_limit > len(ussr_cities):
+            raise ValueError("defense_limit exceeds the number of cities on a side")
+        if target_limit > len(usa_cities) or target_limit > len(ussr_cities):
+            raise ValueError("target_limit exceeds the number of cities on a side")
+        self.usa_cities = usa_cities
+        self.ussr_cities = ussr_cities
+        self.defense_limit = defense_limit
+        self.target_limit = target_limit
+        self.name = name
+        self.seed = seed
+
+
+DEFAULT_SCENARIO = Scenario(USA_CITIES, USSR_CITIES)
+
+
+def _region(cities: List[dict]) -> Tuple[int, int, int, int]:
+    xs = [city["x"] for city in cities]
+    ys = [city["y"] for city in cities]
+    return (min(xs) - REGION_PADDING, min(ys) - REGION_PADDING,
+            max(xs) + REGION_PADDING, max(ys) + REGION_PADDING)
+
+
+USA_REGION = _region(USA_CITIES)
+USSR_REGION = _region(USSR_CITIES)
+
+
+def _clamp_point(x: float, y: float, region: Tuple[int, int, int, int]) -> Tuple[int, int]:
+    left, top, right, bottom = region
+    return int(min(max(x, left), right)), int(min(max(y, top), bottom))
+
+
+def _positions(rng: random.Random, count: int, spatial: str, region: Tuple[int, int, int, int],
+               anchors: List[dict]) -> List[Tuple[int, int]]:
+    left, top, right, bottom = region
+    if spatial == "uniform":
+        return [(rng.randint(left, right), rng.randint(top, bottom)) for _ in range(count)]
+
+    if spatial == "jittered":
+        centres = [(city["x"], city["y"]) for city in anchors]
+        spread = 12.0
+    else:
+        cluster_count = max(1, int(math.sqrt(count)))
+        centres = [(rng.uniform(left, right), rng.uniform(top, bottom)) for _ in range(cluster_count)]
+        spread = max(right - left, bottom - top) / (2 * math.sqrt(cluster_count))
+
+    positions = []
+    for _ in range(count):
+        centre_x, centre_y = centres[rng.randrange(len(centres))]
+        positions.append(_clamp_point(rng.gauss(centre_x, spread), rng.gauss(centre_y, spread), region))
+    return positions
+
+
+def _populations(rng: random.Random, count: int, distribution: str) -> List[int]:
+    if distribution == "zipf":
+        populations = [max(MIN_POPULATION, int(MAX_POPULATION / rank)) for rank in range(1, count + 1)]
+        rng.shuffle(populations)
+        return populations
+    if distribution == "lognormal":
+        return [int(min(MAX_POPULATION, max(MIN_POPULATION, rng.lognormvariate(13.5, 1.0))))
+                for _ in range(count)]
+    return [rng.randint(MIN_POPULATION, MAX_POPULATION) for _ in range(count)]
+
+
+def _cities(rng: random.Random, prefix: str, count: int, spatial: str, population: str,
+            region: Tuple[int, int, int, int], anchors: List[dict]) -> List[dict]:
+    positions = _positions(rng, count, spatial, region, anchors)
+    populations = _populations(rng, count, population)
+    return [{"name": f"{prefix}-{idx:05d}", "x": x, "y": y, "population": pop}
+            for idx, ((x, y), pop) in enumerate(zip(positions, populations))]
+
+
+def generate_scenario(seed: int, usa_count: int, ussr_count: Optional[int] = None,
+                      spatial: str = "clustered", population: str = "zipf",
+                      defense_limit: int = DEFENSE_LIMIT,
+                      target_limit: int = TARGET_LIMIT) -> Scenario:
+    if spatial not in SPATIAL_DISTRIBUTIONS:
+        raise ValueError(f"unknown spatial distribution: {spatial!r}")
+    if population not in POPULATION_DISTRIBUTIONS:
+        raise ValueError(f"unknown population distribution: {population!r}")
+    if ussr_count is None:
+        ussr_count = usa_count
+
+    rng = random.Random(seed)
+    usa_cities = _cities(rng, "US", usa_count, spatial, population, USA_REGION, USA_CITIES)
+    ussr_cities = _cities(rng, "SU", ussr_count, spatial, population, USSR_REGION, USSR_CITIES)
+    name = f"{spatial}-{population}-{usa_count}x{ussr_count}-seed{seed}"
+    return Scenario(usa_cities, ussr_cities, defense_limit, target_limit, name, seed)
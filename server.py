@@ -0,0 +1,336 @@
+"""
+Authoritative asyncio server for two-player WarGames matches
+"""
+
+import argparse
+import asyncio
+import itertools
+import time
+from typing import Dict, Optional, Set
+
+from config import GameState
+from history import GameHistory
+from metrics import DEFAULT_METRICS_PORT, UPDATE_SECONDS, MetricsServer
+from game_state import GameStateManager
+from missiles import MissileSystem, advance_launch
+from protocol import (
+    DEFAULT_PORT,
+    DEFAULT_ROOM,
+    MAX_MESSAGE_SIZE,
+    ProtocolError,
+    decode_message,
+    encode_frame_header,
+    encode_message,
+    snapshot_message,
+    validate_selection,
+)
+from snapshot import FRAME_KEY, SnapshotEncoder
+
+TICK_RATE = 30
+MAX_PENDING_BYTES = 256 * 1024
+
+
+class Player:
+
+    def __init__(self, writer: asyncio.StreamWriter, side: str, room: str,
+                 defenses: list, targets: list):
+        self.writer = writer
+        self.side = side
+        self.room = room
+        self.defenses = defenses
+        self.targets = targets
+        self.connected = True
+
+    def send(self, message: dict, droppable: bool = False) -> None:
+        if not self.connected or self.writer.is_closing():
+            self.connected = False
+            return
+        # Snapshots are superseded by the next tick, so a slow reader skips them
+        # instead of letting the server buffer an unbounded backlog.
+        if droppable and self.writer.transport.get_write_buffer_size() > MAX_PENDING_BYTES:
+            return
+        self.writer.write(encode_message(message))
+
+    def close(self) -> None:
+        self.connected = False
+        if not self.writer.is_closing():
+            self.writer.close()
+
+
+class Spectator:
+
+    def __init__(self, writer: asyncio.StreamWriter, room: str):
+        self.writer = writer
+        self.room = room
+        self.synced: Set[int] = set()
+
+    def send_frame(self, match_id: int, payload: bytes, keyframe: bool) -> bool:
+        if self.writer.is_closing():
+            return True
+        if keyframe:
+            self.synced.add(match_id)
+        elif match_id not in self.synced:
+            return True
+        # A skipped delta breaks the chain, so the spectator waits for a keyframe.
+        if self.writer.transport.get_write_buffer_size() > MAX_PENDING_BYTES:
+            self.synced.discard(match_id)
+            return False
+        self.writer.write(encode_frame_header(match_id, len(payload)))
+        self.writer.write(payload)
+        return True
+
+    def end_match(self, match_id: int) -> None:
+        if match_id in self.synced and not self.writer.is_closing():
+            self.synced.discard(match_id)
+            self.writer.write(encode_frame_header(match_id, 0))
+
+
+class Match:
+
+    def __init__(self, match_id: int, usa: Player, ussr: Player, tick_rate: int = TICK_RATE,
+                 spectators: Optional[Dict[str, Set[Spectator]]] = None,
+                 history: Optional[GameHistory] = None):
+        self.match_id = match_id
+        self.history = history
+        self.players = {"usa": usa, "ussr": ussr}
+        self.room = usa.room
+        self.spectators = spectators if spectators is not None else {}
+        self.encoder = SnapshotEncoder()
+        self.keyframe_requested = True
+        self.tick_interval = 1.0 / tick_rate
+        self.loop = asyncio.get_running_loop()
+        self.clock_origin = self.loop.time()
+
+        self.game_state = GameStateManager()
+        self.missile_system = MissileSystem(get_ticks=self.get_ticks, store=self.game_state.store)
+
+    def get_ticks(self) -> int:
+        return int((self.loop.time() - self.clock_origin) * 1000)
+
+    def broadcast(self, message: dict, droppable: bool = False) -> None:
+        for player in self.players.values():
+            player.send(message, droppable)
+
+    def request_keyframe(self) -> None:
+        self.keyframe_requested = True
+
+    def _stream_to_spectators(self) -> None:
+        spectators = self.spectators.get(self.room)
+        if not spectators:
+            return
+        # Transports may queue the payload rather than send it, so it is copied
+        # out of the encoder's reused buffer once for every spectator.
+        payload = bytes(self.encoder.encode(self.game_state, self.missile_system,
+                                            self.get_ticks(), self.keyframe_requested))
+        self.keyframe_requested = False
+        is_keyframe = payload[0] == FRAME_KEY
+        for spectator in spectators:
+            if not spectator.send_frame(self.match_id, payload, is_keyframe):
+                self.keyframe_requested = True
+
+    def _record(self) -> None:
+        if self.history is None:
+            return
+        intercepts = sum(1 for missile in self.missile_system.missile_lines
+                         if missile.get("intercepted", False))
+        self.history.record(self.game_state, self.get_ticks(), intercepts)
+
+    def _apply_selections(self) -> None:
+        usa, ussr = self.players["usa"], self.players["ussr"]
+        self.game_state.start_new_game()
+        self.game_state.player_defenses = set(usa.defenses)
+        self.game_state.player_targets = set(usa.targets)
+        self.game_state.ai_defenses = set(ussr.defenses)
+        self.game_state.ai_targets = set(ussr.targets)
+        self.game_state.current_state = GameState.LAUNCHING
+        self.missile_system.create_missile_lines(
+            self.game_state.player_targets,
+            self.game_state.ai_targets,
+            self.game_state.player_defenses,
+            self.game_state.ai_defenses
+        )
+
+    async def run(self) -> None:
+        self._apply_selections()
+        for side, player in self.players.items():
+            player.send({
+                "op": "start",
+                "match": self.match_id,
+                "side": side,
+                "t": self.get_ticks(),
+                "usa_defenses": self.players["usa"].defenses,
+                "usa_targets": self.players["usa"].targets,
+                "ussr_defenses": self.players["ussr"].defenses,
+                "ussr_targets": self.players["ussr"].targets,
+            })
+
+        next_tick = self.loop.time()
+        try:
+            while True:
+                if self.game_state.current_state == GameState.LAUNCHING:
+                    update_start = time.perf_counter()
+                    animation_complete = advance_launch(self.game_state, self.missile_system)
+                    UPDATE_SECONDS.observe(time.perf_counter() - update_start)
+                    if animation_complete:
+                        self.game_state.current_state = GameState.RESULTS
+                        self.broadcast({"op": "done", "t": self.get_ticks()})
+                        self._record()
+                else:
+                    self.missile_system.update_mushroom_clouds()
+
+                self.broadcast(snapshot_message(self.game_state, self.missile_system,
+                                                self.get_ticks()), droppable=True)
+                self._stream_to_spectators()
+
+                if (self.game_state.current_state == GameState.RESULTS and
+                        not self.missile_system.mushroom_clouds):
+                    break
+                if not any(player.connected for player in self.players.values()):
+                    break
+
+                next_tick += self.tick_interval
+                await asyncio.sleep(max(0.0, next_tick - self.loop.time()))
+
+            self.broadcast({"op": "end", "t": self.get_ticks()})
+        finally:
+            for player in self.players.values():
+                player.close()
+            for spectator in self.spectators.get(self.room, ()):
+                spectator.end_match(self.match_id)
+
+
+class MatchServer:
+
+    def __init__(self, tick_rate: int = TICK_RATE, history: Optional[GameHistory] = None):
+        self.tick_rate = tick_rate
+        self.history = history
+        self.waiting: Dict[str, Dict[str, Player]] = {}
+        self.spectators: Dict[str, Set[Spectator]] = {}
+        self.active: Dict[str, Set[Match]] = {}
+        self.matches: Set[asyncio.Task] = set()
+        self.match_ids = itertools.count(1)
+
+    def _join(self, player: Player) -> None:
+        room = self.waiting.setdefault(player.room, {})
+        if player.side in room:
+            raise ProtocolError(f"side {player.side!r} is already taken in room {player.room!r}")
+
+        opponent_side = "ussr" if player.side == "usa" else "usa"
+        opponent = room.pop(opponent_side, None)
+        if opponent is None:
+            room[player.side] = player
+            player.send({"op": "waiting", "room": player.room})
+            return
+
+        if not room:
+            del self.waiting[player.room]
+        players = {player.side: player, opponent.side: opponent}
+        match = Match(next(self.match_ids), players["usa"], players["ussr"], self.tick_rate,
+                      self.spectators, self.history)
+        self.active.setdefault(player.room, set()).add(match)
+        task = asyncio.create_task(match.run())
+        self.matches.add(task)
+        task.add_done_callback(self.matches.discard)
+        task.add_done_callback(lambda _: self._finish(player.room, match))
+
+    def _finish(self, room: str, match: Match) -> None:
+        matches = self.active.get(room)
+        if matches is not None:
+            matches.discard(match)
+            if not matches:
+                del self.active[room]
+
+    def _spectate(self, spectator: Spectator) -> None:
+        self.spectators.setdefault(spectator.room, set()).add(spectator)
+        for match in self.active.get(spectator.room, ()):
+            match.request_keyframe()
+
+    def _unspectate(self, spectator: Spectator) -> None:
+        spectators = self.spectators.get(spectator.room)
+        if spectators is not None:
+            spectators.discard(spectator)
+            if not spectators:
+                del self.spectators[spectator.room]
+
+    def _leave(self, player: Player) -> None:
+        room = self.waiting.get(player.room)
+        if room and room.get(player.side) is player:
+            del room[player.side]
+            if not room:
+                del self.waiting[player.room]
+
+    async def handle_client(self, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> None:
+        player: Optional[Player] = None
+        spectator: Optional[Spectator] = None
+        try:
+            message = decode_message(await reader.readline())
+            if message["op"] == "spectate":
+                spectator = Spectator(writer, str(message.get("room", DEFAULT_ROOM)))
+                self._spectate(spectator)
+                while await reader.readline():
+                    pass
+                return
+            if message["op"] != "join":
+                raise ProtocolError("expected a 'join' or 'spectate' message")
+            side = message.get("side")
+            defenses, targets = validate_selection(side, message.get("defenses"),
+                                                   message.get("targets"))
+            player = Player(writer, side, str(message.get("room", DEFAULT_ROOM)),
+                            defenses, targets)
+            self._join(player)
+
+            while await reader.readline():
+                pass
+        except ProtocolError as exc:
+            writer.write(encode_message({"op": "error", "message": str(exc)}))
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            if player is not None:
+                player.connected = False
+                self._leave(player)
+            if spectator is not None:
+                self._unspectate(spectator)
+            if not writer.is_closing():
+                writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                    unix_path: Optional[str] = None) -> None:
+        if unix_path:
+            server = await asyncio.start_unix_server(self.handle_client, unix_path,
+                                                     limit=MAX_MESSAGE_SIZE)
+        else:
+            server = await asyncio.start_server(self.handle_client, host, port,
+                                                limit=MAX_MESSAGE_SIZE)
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WarGames multiplayer server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--tick-rate", type=int, default=TICK_RATE)
+    parser.add_argument("--history", metavar="PATH",
+                        help="record finished matches to a SQLite database")
+    parser.add_argument("--metrics-port", type=int, nargs="?", const=DEFAULT_METRICS_PORT,
+                        metavar="PORT", help="serve Prometheus metrics on PORT")
+    parser.add_argument("--metrics-host", default="127.0.0.1")
+    args = parser.parse_args()
+
+    if args.metrics_port is not None:
+        MetricsServer(args.metrics_port, args.metrics_host).start()
+    history = GameHistory(args.history) if args.history else None
+    try:
+        asyncio.run(MatchServer(args.tick_rate, history).serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if history is not None:
+            history.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Fixed-rate simulation on a worker thread, rendered from double-buffered snapshots
+"""
+
+import copy
+import queue
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+import pygame
+
+from config import FPS, GameState
+from game_state import GameStateManager
+from metrics import FRAME_SECONDS, UPDATE_SECONDS
+from missiles import MissileSystem
+from pick import PickBuffer
+from state_store import StateSnapshot
+
+DEFAULT_SIM_RATE = 60
+MAX_CATCH_UP_TICKS = 5
+
+
+def interpolate_missiles(before: List[dict], after: List[dict], alpha: float) -> List[dict]:
+    missiles = []
+    for idx, missile in enumerate(before):
+        if idx < len(after):
+            progress = missile["progress"] + (after[idx]["progress"] - missile["progress"]) * alpha
+            missile = dict(missile, progress=progress)
+        missiles.append(missile)
+    return missiles
+
+
+class ThreadedRunner:
+
+    def __init__(self, game, sim_rate: int = DEFAULT_SIM_RATE, render_fps: int = FPS):
+        self.game = game
+        self.interval = 1000 / sim_rate
+        self.render_fps = render_fps
+        self.sim_time = pygame.time.get_ticks()
+        self.render_time = self.sim_time
+        # Work for the simulation thread: event handlers and resolved clicks.
+        self.events: "queue.SimpleQueue[Tuple[Callable, tuple]]" = queue.SimpleQueue()
+        # Guards objects that are shared rather than snapshotted, i.e. the
+        # loading screen's terminal. The camera, hover state and pick buffers
+        # belong to the render thread alone and are never touched here.
+        self.lock = threading.Lock()
+
+        # Checkpoints, autosaves and game timing follow the simulation clock,
+        # the same one the missiles advance on.
+        game.get_ticks = lambda: self.sim_time
+        particles = game.missile_system.particles
+        game.missile_system = MissileSystem(get_ticks=lambda: self.sim_time,
+                                            store=game.game_state.store,
+                                            scenario=game.scenario, particles=particles)
+
+        # The view shares the UI, screen and assets with the game but draws
+        # from its own store, which is refreshed from the published snapshots.
+        self.view = copy.copy(game)
+        self.view.game_state = GameStateManager(scenario=game.scenario)
+        self.view.get_ticks = lambda: self.render_time
+        self.view.pick_buffer = PickBuffer(game.pick_buffer.ids.shape)
+        self.view.missile_system = MissileSystem(get_ticks=lambda: self.render_time,
+                                                 store=self.view.game_state.store,
+                                                 scenario=game.scenario, particles=particles)
+
+        self.snapshots: Tuple[Optional[StateSnapshot], StateSnapshot] = (
+            None, game.game_state.store.snapshot(self.sim_time))
+        self.ticks = 0
+        self._thread = threading.Thread(target=self._simulate, name="simulation", daemon=True)
+
+    def _step(self) -> None:
+        while True:
+            try:
+                handler, args = self.events.get_nowait()
+            except queue.Empty:
+                break
+            with self.lock:
+                handler(*args)
+        # Every render here is a full frame, so click damage is not needed.
+        self.game.redraw = []
+        self.game.full_redraw = False
+
+        update_start = time.perf_counter()
+        with self.lock:
+            self.game.update()
+        UPDATE_SECONDS.observe(time.perf_counter() - update_start)
+        # Snapshots are copy-on-write, so publishing one is O(fields) and the
+        # simulation never mutates containers the render thread can see.
+        self.snapshots = (self.snapshots[1], self.game.game_state.store.snapshot(self.sim_time))
+        self.ticks += 1
+
+    def _simulate(self) -> None:
+        start_ticks = self.sim_time
+        start = time.perf_counter()
+        step = 0
+        while self.game.running:
+            self.sim_time = start_ticks + round(step * self.interval)
+            self._step()
+            step += 1
+
+            behind = (time.perf_counter() - start) * 1000 / self.interval - step
+            if behind > MAX_CATCH_UP_TICKS:
+                step += int(behind)
+            elif behind < 0:
+                time.sleep(-behind * self.interval / 1000)
+
+    def _refresh_view(self) -> None:
+        before, after = self.snapshots
+        store = self.view.game_state.store
+        if before is None:
+            store.restore(after)
+            return
+
+        # Draw one tick behind the simulation so there is always a newer
+        # snapshot to interpolate towards.
+        span = after.taken_at - before.taken_at
+        alpha = min(max((self.render_time - before.taken_at) / span, 0.0), 1.0) if span > 0 else 1.0
+        store.restore(before)
+        if (before.values["missile_animation_start_time"] ==
+                after.values["missile_animation_start_time"]):
+            store.set("missile_lines", interpolate_missiles(before.values["missile_lines"],
+                                                            after.values["missile_lines"], alpha))
+
+    def dispatch(self, event: pygame.event.Event) -> None:
+        # Camera and hover input is handled here against the view, and clicks
+        # are hit-tested against what is on screen, so the simulation thread
+        # only ever receives changes to the game state.
+        view = self.view
+        if event.type == pygame.QUIT:
+            self.game.running = False
+        if view.is_view_event(event):
+            view.handle_event(event)
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            state = view.game_state.current_state
+            if event.button == 1 and state != GameState.LOADING:
+                self.events.put((self.game.handle_click, (view._entity_at(event.pos), state)))
+            view.input.latency.handled(event)
+        else:
+            self.events.put((self.game.handle_event, (event,)))
+
+    def render(self) -> None:
+        self.render_time = pygame.time.get_ticks() - round(self.interval)
+        self._refresh_view()
+        if self.view.game_state.current_state != GameState.LOADING:
+            # Buttons come and go with the state, so hover follows the view.
+            self.view.ui.set_hover(self.view._entity_at(self.view.input.mouse_pos()))
+        if self.view.game_state.current_state == GameState.LOADING:
+            with self.lock:
+                self.view.render()
+        else:
+            self.view.render()
+
+    def run(self) -> None:
+        self._thread.start()
+        while self.game.running:
+            frame_start = time.perf_counter()
+            for event in self.game.input.poll():
+                self.dispatch(event)
+            self.render()
+            FRAME_SECONDS.observe(time.perf_counter() - frame_start)
+            self.game.clock.tick(self.render_fps)
+            if self.game.memory is not None:
+                self.game.memory.frame()
+        self._thread.join()
+        self.game.shutdown()
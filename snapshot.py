@@ -0,0 +1,298 @@
+"""
+Binary keyframe/delta snapshot codec for spectators and remote rendering
+"""
+
+import struct
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from protocol import KIND_COLOURS, KIND_INTERCEPT, missile_kind
+
+FRAME_KEY = 0
+FRAME_DELTA = 1
+VERSION = 2
+KEYFRAME_INTERVAL = 30
+
+SIDE_USA = 0
+SIDE_USSR = 1
+
+FLAG_INTERCEPTED = 1
+PROGRESS_SCALE = 65535
+
+HEADER = struct.Struct("<BBII")
+KEY_COUNTS = struct.Struct("<IIII")
+DELTA_COUNTS = struct.Struct("<IIIII")
+MISSILE = struct.Struct("<ffffBBH")
+MISSILE_UPDATE = struct.Struct("<IBH")
+CLOUD = struct.Struct("<hhIH")
+INDEX = struct.Struct("<I")
+DESTROYED = struct.Struct("<BI")
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _missile_flags(missile: Dict[str, Any]) -> int:
+    return FLAG_INTERCEPTED if missile.get("intercepted", False) else 0
+
+
+def _quantize(progress: float) -> int:
+    return int(round(min(1.0, max(0.0, progress)) * PROGRESS_SCALE))
+
+
+def _cloud_key(cloud: Dict[str, Any]) -> Tuple[int, int, int]:
+    return (cloud["position"][0], cloud["position"][1], cloud["start_time"])
+
+
+class SnapshotEncoder:
+
+    def __init__(self, keyframe_interval: int = KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self.sequence = 0
+        self._buffer = bytearray(1024)
+        self._since_keyframe = keyframe_interval
+        self._missiles: List[Tuple[int, int]] = []
+        self._clouds: List[Tuple[int, int, int]] = []
+        self._usa_destroyed: List[bool] = []
+        self._ussr_destroyed: List[bool] = []
+
+    def _reserve(self, size: int) -> None:
+        # The buffer is reused, so the view encode() returns is overwritten by
+        # the next call. Anything that holds on to it, such as a transport
+        # that queues writes, must be given a copy.
+        if size > len(self._buffer):
+            self._buffer = bytearray(max(size, len(self._buffer) * 2))
+
+    def encode(self, game_state, missile_system, tick: int,
+               keyframe: bool = False) -> memoryview:
+        self.sequence += 1
+        self._since_keyframe += 1
+        changes = missile_system.store.take_changes()
+        # A replaced missile list cannot be diffed by index against the last one.
+        if (keyframe or self._since_keyframe >= self.keyframe_interval or
+                changes.get("missile_lines", ()) is None):
+            self._since_keyframe = 0
+            return self._encode_keyframe(game_state, missile_system, tick)
+        return self._encode_delta(game_state, missile_system, tick, changes)
+
+    def _encode_keyframe(self, game_state, missile_system, tick: int) -> memoryview:
+        missiles = missile_system.missile_lines
+        clouds = missile_system.mushroom_clouds
+        usa_destroyed = game_state.usa_destroyed
+        ussr_destroyed = game_state.ussr_destroyed
+        usa_bytes = (len(usa_destroyed) + 7) // 8
+        ussr_bytes = (len(ussr_destroyed) + 7) // 8
+
+        self._reserve(HEADER.size + KEY_COUNTS.size + usa_bytes + ussr_bytes +
+                      MISSILE.size * len(missiles) + CLOUD.size * len(clouds))
+        buffer = self._buffer
+        HEADER.pack_into(buffer, 0, FRAME_KEY, VERSION, self.sequence, tick)
+        offset = HEADER.size
+        KEY_COUNTS.pack_into(buffer, offset, len(usa_destroyed), len(ussr_destroyed),
+                             len(missiles), len(clouds))
+        offset += KEY_COUNTS.size
+
+        for destroyed, size in ((usa_destroyed, usa_bytes), (ussr_destroyed, ussr_bytes)):
+            buffer[offset:offset + size] = bytes(size)
+            for idx, is_destroyed in enumerate(destroyed):
+                if is_destroyed:
+                    buffer[offset + (idx >> 3)] |= 1 << (idx & 7)
+            offset += size
+
+        self._missiles = []
+        for missile in missiles:
+            flags, progress = _missile_flags(missile), _quantize(missile["progress"])
+            MISSILE.pack_into(buffer, offset, *missile["start"], *missile["end"],
+                              missile_kind(missile), flags, progress)
+            offset += MISSILE.size
+            self._missiles.append((flags, progress))
+
+        for cloud in clouds:
+            CLOUD.pack_into(buffer, offset, *cloud["position"], cloud["start_time"],
+                            cloud["duration"])
+            offset += CLOUD.size
+
+        self._clouds = [_cloud_key(cloud) for cloud in clouds]
+        self._usa_destroyed = list(usa_destroyed)
+        self._ussr_destroyed = list(ussr_destroyed)
+        return memoryview(buffer)[:offset]
+
+    def _encode_delta(self, game_state, missile_system, tick: int,
+                      changes: Dict[str, Optional[Set[int]]]) -> memoryview:
+        # Only indices the store saw written since the last frame are looked
+        # at; a field that was replaced outright (None) is compared in full.
+        missiles = missile_system.missile_lines
+        clouds = missile_system.mushroom_clouds
+        known = len(self._missiles)
+
+        changed = []
+        for idx in sorted(changes.get("missile_lines", ())):
+            if idx >= known:
+                continue
+            state = (_missile_flags(missiles[idx]), _quantize(missiles[idx]["progress"]))
+            if state != self._missiles[idx]:
+                self._missiles[idx] = state
+                changed.append((idx, state))
+        added = missiles[known:]
+
+        appended = changes.get("mushroom_clouds", ())
+        if appended is None:
+            current_keys = [_cloud_key(cloud) for cloud in clouds]
+            current_set = set(current_keys)
+            previous_set = set(self._clouds)
+            removed = [idx for idx, key in enumerate(self._clouds) if key not in current_set]
+            new_clouds = [cloud for cloud, key in zip(clouds, current_keys)
+                          if key not in previous_set]
+            self._clouds = current_keys
+        else:
+            removed = []
+            new_clouds = [clouds[idx] for idx in sorted(appended)]
+            self._clouds.extend(_cloud_key(cloud) for cloud in new_clouds)
+
+        destroyed = []
+        for side, name, previous in ((SIDE_USA, "usa_destroyed", self._usa_destroyed),
+                                     (SIDE_USSR, "ussr_destroyed", self._ussr_destroyed)):
+            current = getattr(game_state, name)
+            indices = changes.get(name, ())
+            for idx in (range(len(current)) if indices is None else sorted(indices)):
+                if current[idx] and not previous[idx]:
+                    previous[idx] = True
+                    destroyed.append((side, idx))
+
+        self._reserve(HEADER.size + DELTA_COUNTS.size + MISSILE_UPDATE.size * len(changed) +
+                      MISSILE.size * len(added) + CLOUD.size * len(new_clouds) +
+                      INDEX.size * len(removed) + DESTROYED.size * len(destroyed))
+        buffer = self._buffer
+        HEADER.pack_into(buffer, 0, FRAME_DELTA, VERSION, self.sequence, tick)
+        offset = HEADER.size
+        DELTA_COUNTS.pack_into(buffer, offset, len(changed), len(added), len(new_clouds),
+                               len(removed), len(destroyed))
+        offset += DELTA_COUNTS.size
+
+        for idx, (flags, progress) in changed:
+            MISSILE_UPDATE.pack_into(buffer, offset, idx, flags, progress)
+            offset += MISSILE_UPDATE.size
+        for missile in added:
+            flags, progress = _missile_flags(missile), _quantize(missile["progress"])
+            MISSILE.pack_into(buffer, offset, *missile["start"], *missile["end"],
+                              missile_kind(missile), flags, progress)
+            offset += MISSILE.size
+            self._missiles.append((flags, progress))
+        for cloud in new_clouds:
+            CLOUD.pack_into(buffer, offset, *cloud["position"], cloud["start_time"],
+                            cloud["duration"])
+            offset += CLOUD.size
+        for idx in removed:
+            INDEX.pack_into(buffer, offset, idx)
+            offset += INDEX.size
+        for side, idx in destroyed:
+            DESTROYED.pack_into(buffer, offset, side, idx)
+            offset += DESTROYED.size
+
+        return memoryview(buffer)[:offset]
+
+
+class SnapshotDecoder:
+
+    def __init__(self):
+        self.sequence: Optional[int] = None
+        self.tick = 0
+        self.missiles: List[Dict[str, Any]] = []
+        self.mushroom_clouds: List[Dict[str, Any]] = []
+        self.usa_destroyed: List[bool] = []
+        self.ussr_destroyed: List[bool] = []
+        self.newly_destroyed: List[Tuple[int, int]] = []
+
+    @property
+    def synced(self) -> bool:
+        return self.sequence is not None
+
+    def decode(self, data) -> None:
+        view = memoryview(data)
+        kind, version, sequence, tick = HEADER.unpack_from(view, 0)
+        if version != VERSION:
+            raise SnapshotError(f"unsupported snapshot version {version}")
+
+        if kind == FRAME_KEY:
+            self._decode_keyframe(view, HEADER.size)
+        elif kind == FRAME_DELTA:
+            if self.sequence is None or sequence != self.sequence + 1:
+                raise SnapshotError("delta does not follow the last decoded snapshot")
+            self._decode_delta(view, HEADER.size)
+        else:
+            raise SnapshotError(f"unknown frame kind {kind}")
+
+        self.sequence = sequence
+        self.tick = tick
+
+    def _decode_missile(self, view: memoryview, offset: int) -> Dict[str, Any]:
+        start_x, start_y, end_x, end_y, kind, flags, progress = MISSILE.unpack_from(view, offset)
+        return {
+            "start": (start_x, start_y),
+            "end": (end_x, end_y),
+            "colour": KIND_COLOURS[kind],
+            "progress": progress / PROGRESS_SCALE,
+            "type": "intercept" if kind == KIND_INTERCEPT else "attack",
+            "intercepted": bool(flags & FLAG_INTERCEPTED),
+        }
+
+    def _decode_cloud(self, view: memoryview, offset: int) -> Dict[str, Any]:
+        x, y, start_time, duration = CLOUD.unpack_from(view, offset)
+        return {"position": (x, y), "start_time": start_time, "duration": duration}
+
+    def _decode_keyframe(self, view: memoryview, offset: int) -> None:
+        n_usa, n_ussr, n_missiles, n_clouds = KEY_COUNTS.unpack_from(view, offset)
+        offset += KEY_COUNTS.size
+
+        masks = []
+        for count in (n_usa, n_ussr):
+            size = (count + 7) // 8
+            masks.append([bool(view[offset + (idx >> 3)] >> (idx & 7) & 1) for idx in range(count)])
+            offset += size
+        self.usa_destroyed, self.ussr_destroyed = masks
+        self.newly_destroyed = []
+
+        self.missiles = []
+        for _ in range(n_missiles):
+            self.missiles.append(self._decode_missile(view, offset))
+            offset += MISSILE.size
+
+        self.mushroom_clouds = []
+        for _ in range(n_clouds):
+            self.mushroom_clouds.append(self._decode_cloud(view, offset))
+            offset += CLOUD.size
+
+    def _decode_delta(self, view: memoryview, offset: int) -> None:
+        n_changed, n_added, n_new_clouds, n_removed, n_destroyed = DELTA_COUNTS.unpack_from(view, offset)
+        offset += DELTA_COUNTS.size
+
+        for _ in range(n_changed):
+            idx, flags, progress = MISSILE_UPDATE.unpack_from(view, offset)
+            offset += MISSILE_UPDATE.size
+            missile = self.missiles[idx]
+            missile["progress"] = progress / PROGRESS_SCALE
+            missile["intercepted"] = bool(flags & FLAG_INTERCEPTED)
+
+        for _ in range(n_added):
+            self.missiles.append(self._decode_missile(view, offset))
+            offset += MISSILE.size
+
+        new_clouds = []
+        for _ in range(n_new_clouds):
+            new_clouds.append(self._decode_cloud(view, offset))
+            offset += CLOUD.size
+
+        removed = []
+        for _ in range(n_removed):
+            removed.append(INDEX.unpack_from(view, offset)[0])
+            offset += INDEX.size
+        for idx in reversed(removed):
+            del self.mushroom_clouds[idx]
+        self.mushroom_clouds.extend(new_clouds)
+
+        self.newly_destroyed = []
+        for _ in range(n_destroyed):
+            side, idx = DESTROYED.unpack_from(view, offset)
+            offset += DESTROYED.size
+            (self.usa_destroyed if side == SIDE_USA else self.ussr_destroyed)[idx] = True
+            self.newly_destroyed.append((side, idx))
@@ -0,0 +1,182 @@
+"""
+Single state store for game and missile state with copy-on-write snapshots
+"""
+
+import json
+import os
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+
+from config import GameState
+
+TIME_FIELDS = ("missile_animation_start_time",)
+
+
+def initial_state(usa_count: int, ussr_count: int) -> Dict[str, Any]:
+    return {
+        "current_state": GameState.LOADING,
+        "player_defenses": set(),
+        "player_targets": set(),
+        "ai_defenses": set(),
+        "ai_targets": set(),
+        "usa_destroyed": [False] * usa_count,
+        "ussr_destroyed": [False] * ussr_count,
+        "us_cities_destroyed": [],
+        "ussr_cities_destroyed": [],
+        "missile_lines": [],
+        "mushroom_clouds": [],
+        "missile_animation_start_time": 0,
+        "launch_player_defenses": set(),
+        "launch_ai_defenses": set(),
+        "show_grid": False,
+        "show_coverage": False,
+        "show_help": False,
+    }
+
+
+def _copy_missiles(missiles: list) -> list:
+    return [dict(missile) for missile in missiles]
+
+
+def _copy_value(value: Any) -> Any:
+    if isinstance(value, (set, list, dict)):
+        return type(value)(value)
+    return value
+
+
+COPIERS: Dict[str, Callable[[Any], Any]] = {
+    "missile_lines": _copy_missiles,
+}
+
+
+class StateSnapshot:
+
+    def __init__(self, values: Dict[str, Any], taken_at: Optional[int] = None):
+        self.values = values
+        self.taken_at = taken_at
+
+
+class StateStore:
+
+    def __init__(self, values: Dict[str, Any]):
+        self._values = values
+        self._owned = set(values)
+        # Indices written in place since the last take_changes(), per field;
+        # None means the whole field was replaced.
+        self._changes: Dict[str, Optional[Set[int]]] = {}
+        self._initial = self.snapshot()
+
+    def get(self, name: str) -> Any:
+        return self._values[name]
+
+    def mutable(self, name: str) -> Any:
+        # Containers are shared with snapshots until the first write access
+        # after a snapshot or restore, which copies just that one field.
+        value = self._values[name]
+        if name not in self._owned:
+            value = COPIERS.get(name, _copy_value)(value)
+            self._values[name] = value
+            self._owned.add(name)
+        return value
+
+    def set(self, name: str, value: Any) -> None:
+        self._values[name] = value
+        self._owned.add(name)
+        self._changes[name] = None
+
+    def changed(self, name: str, index: int) -> None:
+        indices = self._changes.setdefault(name, set())
+        if indices is not None:
+            indices.add(index)
+
+    def take_changes(self) -> Dict[str, Optional[Set[int]]]:
+        changes, self._changes = self._changes, {}
+        return changes
+
+    def snapshot(self, now: Optional[int] = None) -> StateSnapshot:
+        self._owned.clear()
+        return StateSnapshot(dict(self._values), now)
+
+    def restore(self, snapshot: StateSnapshot, now: Optional[int] = None) -> None:
+        self._values = dict(snapshot.values)
+        self._owned.clear()
+        self._changes = dict.fromkeys(self._values)
+        if now is not None and snapshot.taken_at is not None and now != snapshot.taken_at:
+            self._rebase(now - snapshot.taken_at)
+
+    def reset(self, keep: Iterable[str] = ()) -> None:
+        kept = {name: self._values[name] for name in keep}
+        self.restore(self._initial)
+        self._values.update(kept)
+
+    def _rebase(self, shift: int) -> None:
+        for name in TIME_FIELDS:
+            self._values[name] += shift
+        self._values["mushroom_clouds"] = [
+            dict(cloud, start_time=cloud["start_time"] + shift)
+            for cloud in self._values["mushroom_clouds"]
+        ]
+        self._owned.add("mushroom_clouds")
+
+
+class StoreField:
+
+    def __init__(self, name: Optional[str] = None):
+        self.name = name
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        if self.name is None:
+            self.name = name
+
+    def __get__(self, obj: Any, objtype: Optional[type] = None) -> Any:
+        if obj is None:
+            return self
+        # Plain reads share the container with the last snapshot; code that
+        # changes it in place goes through store.mutable() instead.
+        return obj.store.get(self.name)
+
+    def __set__(self, obj: Any, value: Any) -> None:
+        obj.store.set(self.name, value)
+
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, GameState):
+        return value.name
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    if isinstance(value, (list, tuple)):
+        return [_to_json(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _to_json(item) for key, item in value.items()}
+    return value
+
+
+def _from_json(name: str, value: Any) -> Any:
+    if name == "current_state":
+        return GameState[value]
+    if name in ("player_defenses", "player_targets", "ai_defenses", "ai_targets",
+                "launch_player_defenses", "launch_ai_defenses"):
+        return set(value)
+    if name == "missile_lines":
+        return [{key: tuple(item) if isinstance(item, list) else item
+                 for key, item in missile.items()} for missile in value]
+    if name == "mushroom_clouds":
+        return [dict(cloud, position=tuple(cloud["position"])) for cloud in value]
+    return value
+
+
+def save_snapshot(snapshot: StateSnapshot, path: str) -> None:
+    data = {"taken_at": snapshot.taken_at,
+            "values": {name: _to_json(value) for name, value in snapshot.values.items()}}
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as snapshot_file:
+        json.dump(data, snapshot_file, separators=(",", ":"))
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+    os.replace(temp_path, path)
+
+
+def load_snapshot(path: str) -> StateSnapshot:
+    with open(path) as snapshot_file:
+        data = json.load(snapshot_file)
+    return StateSnapshot({name: _from_json(name, value) for name, value in data["values"].items()},
+                         data["taken_at"])
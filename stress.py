@@ -0,0 +1,102 @@
+"""
+Per-subsystem timings on generated theaters of increasing size
+"""
+
+import argparse
+import os
+import time
+from typing import Callable, List, Tuple
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from config import CITY_RADIUS, FPS, WINDOW_HEIGHT, WINDOW_WIDTH
+from game_state import GameStateManager
+from missiles import MissileSystem, advance_launch
+from pick import CITY, PickBuffer
+from render_backend import Canvas, SurfaceCanvas
+from scenario import POPULATION_DISTRIBUTIONS, SPATIAL_DISTRIBUTIONS, Scenario, generate_scenario
+from ui import CityRenderer, get_clicked_city
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+FRAME_BUDGET_MS = 1000 / FPS
+LAUNCH_STEPS = 60
+
+
+def _time_ms(action: Callable[[], object], repeat: int = 1) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        action()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def measure(scenario: Scenario, surface: Canvas) -> List[Tuple[str, float]]:
+    clock = [0]
+    game_state = GameStateManager(scenario=scenario)
+    missile_system = MissileSystem(get_ticks=lambda: clock[0], store=game_state.store,
+                                   scenario=scenario)
+    renderer = CityRenderer(scenario)
+
+    game_state.start_new_game()
+    results = [("ai selections", _time_ms(game_state.make_ai_selections))]
+    game_state.player_defenses = set(game_state.ai_targets)
+    game_state.player_targets = set(game_state.ai_defenses)
+
+    results.append(("create missile lines", _time_ms(lambda: missile_system.create_missile_lines(
+        game_state.player_targets, game_state.ai_targets,
+        game_state.player_defenses, game_state.ai_defenses))))
+
+    def launch_step():
+        clock[0] += 3000 // LAUNCH_STEPS
+        advance_launch(game_state, missile_system)
+    results.append(("launch step", _time_ms(launch_step, LAUNCH_STEPS)))
+
+    results.append(("casualties", _time_ms(game_state.calculate_casualties)))
+    def draw_cities():
+        renderer.draw_usa_cities(surface, game_state.usa_destroyed, game_state.player_defenses,
+                                 game_state.ai_targets, set())
+        renderer.draw_ussr_cities(surface, game_state.ussr_destroyed, game_state.ai_defenses, set())
+    # The first pass renders every label sprite; later frames only blit.
+    results.append(("draw cities (first)", _time_ms(draw_cities)))
+    results.append(("draw cities", _time_ms(draw_cities, 10)))
+    results.append(("hit test (miss)", _time_ms(lambda: get_clicked_city((0, 0), scenario.usa_cities))))
+
+    pick_buffer = PickBuffer((WINDOW_WIDTH, WINDOW_HEIGHT))
+    results.append(("pick rasterize", _time_ms(lambda: (
+        pick_buffer.clear(), pick_buffer.add_discs(scenario.usa_cities, CITY_RADIUS, CITY)))))
+    results.append(("pick lookup", _time_ms(lambda: pick_buffer.entity_at((0, 0)), 1000)))
+    results.append(("snapshot", _time_ms(game_state.checkpoint, 100)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time each subsystem on generated theaters")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="cities per side")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--spatial", choices=SPATIAL_DISTRIBUTIONS, default="clustered")
+    parser.add_argument("--population", choices=POPULATION_DISTRIBUTIONS, default="zipf")
+    parser.add_argument("--limit-fraction", type=float, default=0.01,
+                        help="defense/target limit as a fraction of cities per side")
+    args = parser.parse_args()
+
+    pygame.init()
+    surface = SurfaceCanvas(pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT)))
+
+    for size in args.sizes:
+        limit = max(1, int(size * args.limit_fraction))
+        start = time.perf_counter()
+        scenario = generate_scenario(args.seed, size, spatial=args.spatial,
+                                     population=args.population,
+                                     defense_limit=limit, target_limit=limit)
+        generate_ms = (time.perf_counter() - start) * 1000
+
+        print(f"{scenario.name} (limit {limit}, generated in {generate_ms:.1f} ms)")
+        for name, elapsed in measure(scenario, surface):
+            marker = "  OVER FRAME BUDGET" if elapsed > FRAME_BUDGET_MS else ""
+            print(f"  {name:<22}{elapsed:>12.3f} ms{marker}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Character-cell terminal rendering from a monospace glyph atlas
+"""
+
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+
+import pygame
+
+from render_backend import Canvas
+
+FIRST_GLYPH = 32
+LAST_GLYPH = 126
+MISSING_GLYPH = "?"
+MONOSPACE_FONTS = "dejavusansmono,couriernew,courier,monospace"
+
+Cell = Tuple[str, tuple, Optional[tuple]]
+
+
+class GlyphAtlas:
+
+    def __init__(self, size: int):
+        font = pygame.font.SysFont(MONOSPACE_FONTS, size)
+        glyphs = [font.render(chr(code), True, (255, 255, 255))
+                  for code in range(FIRST_GLYPH, LAST_GLYPH + 1)]
+        self.cell_width = max(glyph.get_width() for glyph in glyphs)
+        self.cell_height = max(font.get_linesize(), max(glyph.get_height() for glyph in glyphs))
+
+        # Glyphs are centred in fixed-width cells so the grid stays monospace
+        # even when only a proportional font is installed.
+        self.white = pygame.Surface((self.cell_width * len(glyphs), self.cell_height), pygame.SRCALPHA)
+        for idx, glyph in enumerate(glyphs):
+            x = idx * self.cell_width + (self.cell_width - glyph.get_width()) // 2
+            self.white.blit(glyph, (x, 0))
+        self._sheets: Dict[tuple, pygame.Surface] = {}
+
+    def sheet(self, colour: tuple) -> pygame.Surface:
+        sheet = self._sheets.get(colour)
+        if sheet is None:
+            sheet = self.white.copy()
+            sheet.fill(tuple(colour[:3]) + (255,), special_flags=pygame.BLEND_RGBA_MULT)
+            self._sheets[colour] = sheet
+        return sheet
+
+    def area(self, char: str) -> pygame.Rect:
+        code = ord(char)
+        if not FIRST_GLYPH <= code <= LAST_GLYPH:
+            code = ord(MISSING_GLYPH)
+        return pygame.Rect((code - FIRST_GLYPH) * self.cell_width, 0, self.cell_width, self.cell_height)
+
+    def surfaces(self) -> List[pygame.Surface]:
+        return [self.white] + list(self._sheets.values())
+
+
+@lru_cache(maxsize=None)
+def get_glyph_atlas(size: int) -> GlyphAtlas:
+    return GlyphAtlas(size)
+
+
+class Terminal:
+
+    def __init__(self, cols: int, rows: int, atlas: GlyphAtlas, background: tuple = (0, 0, 0)):
+        self.cols = cols
+        self.rows = rows
+        self.atlas = atlas
+        self.background = background
+        self.blank: Cell = (" ", background, None)
+        self.cells: List[List[Cell]] = [[self.blank] * cols for _ in range(rows)]
+        self.surface = pygame.Surface((cols * atlas.cell_width, rows * atlas.cell_height))
+        self.surface.fill(background)
+        self._dirty: Set[Tuple[int, int]] = set()
+        self._moved: List[pygame.Rect] = []
+        self.cursor: Optional[Tuple[int, int]] = None
+        self.cursor_colour = (255, 255, 255)
+
+    def cell_rect(self, col: int, row: int) -> pygame.Rect:
+        return pygame.Rect(col * self.atlas.cell_width, row * self.atlas.cell_height,
+                           self.atlas.cell_width, self.atlas.cell_height)
+
+    def put(self, col: int, row: int, char: str, colour: tuple, background: Optional[tuple] = None) -> None:
+        if not (0 <= col < self.cols and 0 <= row < self.rows):
+            return
+        cell = (char, colour, background)
+        if self.cells[row][col] != cell:
+            self.cells[row][col] = cell
+            self._dirty.add((col, row))
+
+    def set_cursor(self, position: Optional[Tuple[int, int]], colour: Optional[tuple] = None) -> None:
+        if colour is not None:
+            self.cursor_colour = colour
+        if position != self.cursor:
+            for cell in (self.cursor, position):
+                if cell is not None:
+                    self._dirty.add(cell)
+            self.cursor = position
+
+    def write(self, col: int, row: int, text: str, colour: tuple) -> None:
+        for offset, char in enumerate(text[:max(self.cols - col, 0)]):
+            self.put(col + offset, row, char, colour)
+
+    def write_line(self, row: int, text: str, colour: tuple, col: int = 0) -> None:
+        self.write(col, row, text, colour)
+        self.clear_row(row, col + len(text))
+
+    def clear_row(self, row: int, from_col: int = 0) -> None:
+        for col in range(max(from_col, 0), self.cols):
+            self.put(col, row, " ", self.background)
+
+    def scroll(self, top: int, bottom: int, lines: int = 1) -> None:
+        # Shift the already-rendered pixels of rows [top, bottom) up instead of
+        # redrawing them, so scrolling costs one row of glyphs, not a screenful.
+        region = pygame.Rect(0, top * self.atlas.cell_height, self.surface.get_width(),
+                             (bottom - top) * self.atlas.cell_height)
+        lines = min(lines, bottom - top)
+        self.surface.subsurface(region).scroll(0, -lines * self.atlas.cell_height)
+        self._moved.append(region)
+
+        self._dirty = {(col, row - lines) if top <= row < bottom else (col, row)
+                       for col, row in self._dirty
+                       if not top <= row < top + lines}
+        self.cells[top:bottom] = self.cells[top + lines:bottom] + \
+            [[self.blank] * self.cols for _ in range(lines)]
+        self.surface.fill(self.background, pygame.Rect(
+            0, (bottom - lines) * self.atlas.cell_height, self.surface.get_width(),
+            lines * self.atlas.cell_height))
+        if self.cursor is not None and top <= self.cursor[1] < bottom:
+            col, row = self.cursor
+            self._dirty.add((col, row))
+            if row - lines >= top:
+                self._dirty.add((col, row - lines))
+
+    def render(self) -> List[pygame.Rect]:
+        changed = self._moved
+        self._moved = []
+        for col, row in self._dirty:
+            char, colour, background = self.cells[row][col]
+            rect = self.cell_rect(col, row)
+            self.surface.fill(background or self.background, rect)
+            if (col, row) == self.cursor:
+                self.surface.fill(self.cursor_colour, rect)
+            elif char != " ":
+                self.surface.blit(self.atlas.sheet(colour), rect, self.atlas.area(char))
+            changed.append(rect)
+        self._dirty.clear()
+        return changed
+
+    def draw(self, screen: Canvas, position: Tuple[int, int] = (0, 0),
+             full: bool = True) -> List[pygame.Rect]:
+        # Returns the screen areas that changed. Without full, only those are
+        # blitted, onto a canvas that still holds the previous frame.
+        changed = self.render()
+        if changed:
+            screen.invalidate(self.surface, changed)
+        moved = [rect.move(position) for rect in changed]
+        if full:
+            screen.blit(self.surface, position)
+            return moved
+        for rect in moved:
+            screen.set_clip(rect)
+            screen.blit(self.surface, position)
+        screen.set_clip(None)
+        return moved
+
+
+class Console:
+
+    def __init__(self, terminal: Terminal, top: int, bottom: int, colour: tuple, left: int = 0):
+        self.terminal = terminal
+        self.top = top
+        self.bottom = bottom
+        self.left = left
+        self.colour = colour
+        self.col = left
+        self.row = top
+        # Backspace stops here, as (row, col), even once input has wrapped
+        # onto the rows below.
+        self.input_start = (top, left)
+
+    def mark_input(self) -> None:
+        self.input_start = (self.row, self.col)
+
+    def write(self, text: str, colour: Optional[tuple] = None) -> None:
+        for char in text:
+            if char == "\n":
+                self.newline()
+                continue
+            if self.col >= self.terminal.cols:
+                self.newline()
+            self.terminal.put(self.col, self.row, char, colour or self.colour)
+            self.col += 1
+
+    def print(self, text: str = "", colour: Optional[tuple] = None) -> None:
+        self.write(text, colour)
+        self.newline()
+
+    def newline(self) -> None:
+        self.col = self.left
+        if self.row + 1 < self.bottom:
+            self.row += 1
+        else:
+            self.terminal.scroll(self.top, self.bottom)
+            row, col = self.input_start
+            self.input_start = (row - 1, col) if row > self.top else (self.top, self.left)
+
+    def backspace(self, count: int = 1) -> None:
+        for _ in range(count):
+            if (self.row, self.col) <= self.input_start:
+                return
+            if self.col > self.left:
+                self.col -= 1
+            else:
+                self.row -= 1
+                self.col = self.terminal.cols - 1
+            self.terminal.put(self.col, self.row, " ", self.terminal.background)
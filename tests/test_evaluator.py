@@ -0,0 +1,59 @@
+import os
+import random
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pytest
+
+from evaluator import evaluate_games
+from game_state import GameStateManager
+from missiles import MissileSystem, advance_launch
+from scenario import DEFAULT_SCENARIO, generate_scenario
+
+
+def play(scenario, player_defenses, player_targets, ai_defenses, ai_targets):
+    clock = [0]
+    game_state = GameStateManager(scenario=scenario)
+    missile_system = MissileSystem(get_ticks=lambda: clock[0], store=game_state.store,
+                                   scenario=scenario)
+    game_state.start_new_game()
+    game_state.player_defenses = set(player_defenses)
+    game_state.player_targets = set(player_targets)
+    game_state.ai_defenses = set(ai_defenses)
+    game_state.ai_targets = set(ai_targets)
+    missile_system.create_missile_lines(game_state.player_targets, game_state.ai_targets,
+                                        game_state.player_defenses, game_state.ai_defenses)
+    while not advance_launch(game_state, missile_system):
+        clock[0] += 50
+    advance_launch(game_state, missile_system)
+    return game_state
+
+
+@pytest.mark.parametrize("scenario", [DEFAULT_SCENARIO, generate_scenario(3, 40)],
+                         ids=["default", "generated"])
+def test_matches_played_games(scenario):
+    rng = random.Random(7)
+    usa_count, ussr_count = len(scenario.usa_cities), len(scenario.ussr_cities)
+    games = 200
+    masks = [np.zeros((games, count), dtype=bool)
+             for count in (usa_count, ussr_count, ussr_count, usa_count)]
+    played = []
+    for game in range(games):
+        # Picks are unconstrained, so many games have more targets than
+        # launch sites and only some of the targets are fired at.
+        picks = [rng.sample(range(usa_count), rng.randint(0, 8)),
+                 rng.sample(range(ussr_count), rng.randint(0, 8)),
+                 rng.sample(range(ussr_count), rng.randint(0, 8)),
+                 rng.sample(range(usa_count), rng.randint(0, 8))]
+        for mask, pick in zip(masks, picks):
+            mask[game, pick] = True
+        played.append(play(scenario, *picks))
+
+    results = evaluate_games(*masks, scenario=scenario)
+    for game, game_state in enumerate(played):
+        assert results["usa_destroyed"][game].tolist() == game_state.usa_destroyed
+        assert results["ussr_destroyed"][game].tolist() == game_state.ussr_destroyed
+        us_casualties, ussr_casualties = game_state.calculate_casualties()[:2]
+        assert round(results["us_casualties"][game]) == us_casualties
+        assert round(results["ussr_casualties"][game]) == ussr_casualties
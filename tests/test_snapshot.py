@@ -0,0 +1,74 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pytest
+
+from game_state import GameStateManager
+from missiles import MissileSystem, advance_launch
+from scenario import DEFAULT_SCENARIO, generate_scenario
+from snapshot import FRAME_DELTA, FRAME_KEY, PROGRESS_SCALE, SnapshotDecoder, SnapshotEncoder
+from state_store import StateStore, initial_state
+
+
+def assert_decoded(decoder, game_state, missile_system):
+    assert decoder.usa_destroyed == game_state.usa_destroyed
+    assert decoder.ussr_destroyed == game_state.ussr_destroyed
+    assert ([(cloud["position"], cloud["start_time"]) for cloud in decoder.mushroom_clouds] ==
+            [(cloud["position"], cloud["start_time"]) for cloud in missile_system.mushroom_clouds])
+    assert len(decoder.missiles) == len(missile_system.missile_lines)
+    for decoded, missile in zip(decoder.missiles, missile_system.missile_lines):
+        assert decoded["intercepted"] == missile.get("intercepted", False)
+        assert abs(decoded["progress"] - missile["progress"]) <= 1 / PROGRESS_SCALE
+
+
+@pytest.mark.parametrize("scenario", [DEFAULT_SCENARIO, generate_scenario(3, 40)],
+                         ids=["default", "generated"])
+def test_keyframe_and_deltas_round_trip(scenario):
+    clock = [0]
+    game_state = GameStateManager(scenario=scenario)
+    missile_system = MissileSystem(get_ticks=lambda: clock[0], store=game_state.store,
+                                   scenario=scenario)
+    game_state.start_new_game()
+    game_state.player_defenses = {0, 1, 2, 3, 4}
+    game_state.player_targets = {0, 1, 2, 3, 4}
+    game_state.ai_defenses = {0, 1, 2, 5, 6}
+    game_state.ai_targets = {0, 1, 2, 5, 6}
+    missile_system.create_missile_lines(game_state.player_targets, game_state.ai_targets,
+                                        game_state.player_defenses, game_state.ai_defenses)
+
+    encoder = SnapshotEncoder(keyframe_interval=25)
+    decoder = SnapshotDecoder()
+    kinds = []
+    done = False
+    while not done or missile_system.mushroom_clouds:
+        if done:
+            missile_system.update_mushroom_clouds()
+        else:
+            done = advance_launch(game_state, missile_system)
+        payload = bytes(encoder.encode(game_state, missile_system, clock[0]))
+        kinds.append(payload[0])
+        decoder.decode(payload)
+        assert_decoded(decoder, game_state, missile_system)
+        clock[0] += 50
+
+    assert kinds[0] == FRAME_KEY
+    assert FRAME_DELTA in kinds and kinds.count(FRAME_KEY) > 1
+    assert any(decoder.usa_destroyed) and any(decoder.ussr_destroyed)
+
+
+def test_indices_past_sixteen_bits():
+    store = StateStore(initial_state(70000, 3))
+    game_state = GameStateManager(store=store)
+    missile_system = MissileSystem(get_ticks=lambda: 0, store=store)
+    encoder = SnapshotEncoder()
+    decoder = SnapshotDecoder()
+    decoder.decode(bytes(encoder.encode(game_state, missile_system, 0)))
+
+    store.mutable("usa_destroyed")[69999] = True
+    store.changed("usa_destroyed", 69999)
+    decoder.decode(bytes(encoder.encode(game_state, missile_system, 1)))
+
+    assert len(decoder.usa_destroyed) == 70000
+    assert decoder.newly_destroyed == [(0, 69999)]
+    assert decoder.usa_destroyed[69999]
@@ -0,0 +1,157 @@
+"""
+Multi-resolution background tile pyramid, loaded lazily and kept in an LRU cache
+"""
+
+import argparse
+import math
+import os
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import pygame
+
+from camera import MAX_ZOOM_STEP, STEPS_PER_DOUBLING, Camera
+from config import WINDOW_HEIGHT, WINDOW_WIDTH
+from render_backend import Canvas
+from ui import BACKGROUND_PATH, get_background
+
+TILE_SIZE = 256
+TILE_CACHE_SIZE = 128
+MAX_LEVEL = -(-MAX_ZOOM_STEP // STEPS_PER_DOUBLING)
+TILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tiles")
+
+
+def _resize(surface: pygame.Surface, size: Tuple[int, int]) -> pygame.Surface:
+    try:
+        return pygame.transform.smoothscale(surface, size)
+    except ValueError:
+        return pygame.transform.scale(surface, size)
+
+
+class TilePyramid:
+
+    def __init__(self, world_size: Tuple[int, int] = (WINDOW_WIDTH, WINDOW_HEIGHT),
+                 source_path: str = BACKGROUND_PATH, tile_dir: Optional[str] = TILE_DIR,
+                 levels: int = MAX_LEVEL + 1, cache_size: int = TILE_CACHE_SIZE):
+        self.world_size = world_size
+        self.source_path = source_path
+        self.tile_dir = tile_dir
+        self.levels = levels
+        self.cache_size = cache_size
+        self._source: Optional[pygame.Surface] = None
+        self._tiles: "OrderedDict[tuple, pygame.Surface]" = OrderedDict()
+        self.loaded = 0
+
+    def level_size(self, level: int) -> Tuple[int, int]:
+        scale = 2 ** level
+        return self.world_size[0] * scale, self.world_size[1] * scale
+
+    def tile_count(self, level: int) -> Tuple[int, int]:
+        width, height = self.level_size(level)
+        return -(-width // TILE_SIZE), -(-height // TILE_SIZE)
+
+    def tile_rect(self, level: int, col: int, row: int) -> pygame.Rect:
+        rect = pygame.Rect(col * TILE_SIZE, row * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+        return rect.clip(pygame.Rect((0, 0), self.level_size(level)))
+
+    def tile_path(self, level: int, col: int, row: int) -> str:
+        return os.path.join(self.tile_dir, str(level), f"{col}_{row}.png")
+
+    def source(self) -> pygame.Surface:
+        # The full-resolution map is only needed for tiles that were not
+        # precomputed.
+        if self._source is None:
+            try:
+                self._source = pygame.image.load(self.source_path)
+            except (pygame.error, FileNotFoundError):
+                self._source = get_background(self.world_size)
+        return self._source
+
+    def render_tile(self, level: int, col: int, row: int) -> pygame.Surface:
+        rect = self.tile_rect(level, col, row)
+        source = self.source()
+        scale_x = source.get_width() / self.level_size(level)[0]
+        scale_y = source.get_height() / self.level_size(level)[1]
+        left, top = math.floor(rect.left * scale_x), math.floor(rect.top * scale_y)
+        right = min(math.ceil(rect.right * scale_x), source.get_width())
+        bottom = min(math.ceil(rect.bottom * scale_y), source.get_height())
+        area = source.subsurface(pygame.Rect(left, top, max(right - left, 1), max(bottom - top, 1)))
+        return _resize(area, rect.size)
+
+    def _load(self, level: int, col: int, row: int) -> pygame.Surface:
+        self.loaded += 1
+        if self.tile_dir is not None:
+            path = self.tile_path(level, col, row)
+            if os.path.exists(path):
+                return pygame.image.load(path)
+        return self.render_tile(level, col, row)
+
+    def tile(self, level: int, col: int, row: int, size: Tuple[int, int]) -> pygame.Surface:
+        key = (level, col, row, size)
+        tile = self._tiles.get(key)
+        if tile is None:
+            tile = self._load(level, col, row)
+            if tile.get_size() != size:
+                tile = _resize(tile, size)
+            if pygame.display.get_surface() is not None:
+                tile = tile.convert()
+            self._tiles[key] = tile
+            if len(self._tiles) > self.cache_size:
+                self._tiles.popitem(last=False)
+        else:
+            self._tiles.move_to_end(key)
+        return tile
+
+    def draw(self, screen: Canvas, camera: Camera) -> None:
+        # The finest level at or above the zoom, scaled down to it, so a frame
+        # only ever touches the tiles that are on screen.
+        zoom = camera.zoom
+        level = min(max(math.ceil(math.log2(zoom) - 1e-9), 0), self.levels - 1)
+        scale = zoom / 2 ** level
+        offset_x, offset_y = camera.offset
+        view_width, view_height = camera.view_size
+        cols, rows = self.tile_count(level)
+        tile_span = TILE_SIZE * scale
+        first_col, first_row = int(offset_x // tile_span), int(offset_y // tile_span)
+        last_col = min(int((offset_x + view_width) // tile_span), cols - 1)
+        last_row = min(int((offset_y + view_height) // tile_span), rows - 1)
+
+        blits = []
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                rect = self.tile_rect(level, col, row)
+                left, top = round(rect.left * scale), round(rect.top * scale)
+                right, bottom = round(rect.right * scale), round(rect.bottom * scale)
+                blits.append((self.tile(level, col, row, (right - left, bottom - top)),
+                              (left - offset_x, top - offset_y)))
+        screen.blits(blits)
+
+    def build(self, levels: Optional[int] = None) -> int:
+        written = 0
+        for level in range(self.levels if levels is None else levels):
+            os.makedirs(os.path.join(self.tile_dir, str(level)), exist_ok=True)
+            cols, rows = self.tile_count(level)
+            for row in range(rows):
+                for col in range(cols):
+                    pygame.image.save(self.render_tile(level, col, row), self.tile_path(level, col, row))
+                    written += 1
+        return written
+
+    def surfaces(self) -> List[pygame.Surface]:
+        return list(self._tiles.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute the background tile pyramid")
+    parser.add_argument("--source", default=BACKGROUND_PATH, help="full-resolution map image")
+    parser.add_argument("--out", default=TILE_DIR, help="tile directory")
+    parser.add_argument("--levels", type=int, default=MAX_LEVEL + 1)
+    args = parser.parse_args()
+
+    pygame.init()
+    pyramid = TilePyramid(source_path=args.source, tile_dir=args.out, levels=args.levels)
+    print(f"wrote {pyramid.build()} tiles to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,67 @@
 import pygame
 import math
-from typing import Set, List
+import numpy as np
+import os
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
 from config import (COLOURS, WINDOW_WIDTH, WINDOW_HEIGHT, CITY_RADIUS, 
                    SELECTED_COLOUR, TARGETED_COLOUR, DEFENDED_COLOUR, HIT_COLOUR, GAME_TITLE)
-from city_data import USA_CITIES, USSR_CITIES
+from camera import GRID_CELL, Camera, SpatialGrid
+from pick import BUTTON
+from render_backend import Canvas
+from scenario import DEFAULT_SCENARIO, Scenario
+
+TEXT_CACHE_SIZE = 2048
+BACKGROUND_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'neon_map.png')
+HOVER_COLOUR = (0, 70, 0)
+LINE_HEIGHT = 22
+
+
+@lru_cache(maxsize=None)
+def get_background(size: tuple) -> pygame.Surface:
+    try:
+        background = pygame.image.load(BACKGROUND_PATH)
+        if pygame.display.get_surface() is not None:
+            background = background.convert()
+        return pygame.transform.scale(background, size)
+    except (pygame.error, FileNotFoundError):
+        background = pygame.Surface(size)
+        width, height = size
+        for y in range(height):
+            colour_value = int(20 + (y / height) * 40)
+            pygame.draw.line(background, (0, 0, colour_value), (0, y), (width, y))
+        return background
+
+
+@lru_cache(maxsize=None)
+def get_font(size: int) -> pygame.font.Font:
+    return pygame.font.Font(None, size)
+
+
+class TextCache:
+
+    def __init__(self, max_entries: int = TEXT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._surfaces: "OrderedDict[tuple, pygame.Surface]" = OrderedDict()
+
+    def render(self, font: pygame.font.Font, text: str, colour: tuple) -> pygame.Surface:
+        key = (font, text, colour)
+        surface = self._surfaces.get(key)
+        if surface is None:
+            surface = font.render(text, True, colour)
+            self._surfaces[key] = surface
+            if len(self._surfaces) > self.max_entries:
+                self._surfaces.popitem(last=False)
+        else:
+            self._surfaces.move_to_end(key)
+        return surface
+
+    def surfaces(self) -> List[pygame.Surface]:
+        return list(self._surfaces.values())
+
+
+TEXT_CACHE = TextCache()
 
 
 class Button:
@@ -14,22 +72,21 @@ class Button:
         self.text = text
         self.colour = colour
         self.text_colour = text_colour
-        self.font = pygame.font.Font(None, 24)
+        self.font = get_font(24)
         self.enabled = True
+        self.hovered = False
     
-    def draw(self, screen: pygame.Surface) -> None:
-        mouse = pygame.mouse.get_pos()
-        # hover = self.rect.collidepoint(mouse)
-        
+    def draw(self, screen: Canvas) -> None:
         colour = COLOURS["green"] if self.enabled else (60, 60, 60)
         
-        pygame.draw.rect(screen, colour, self.rect, border_radius=6)
+        screen.rect(colour, self.rect, border_radius=6)
         
         inner_rect = self.rect.inflate(-6, -6)
-        pygame.draw.rect(screen, COLOURS["black"], inner_rect, border_radius=6)
+        inner_colour = HOVER_COLOUR if self.hovered and self.enabled else COLOURS["black"]
+        screen.rect(inner_colour, inner_rect, border_radius=6)
         
         text_colour = COLOURS["green"] if self.enabled else (100, 100, 100)
-        text_surface = self.font.render(self.text, True, text_colour)
+        text_surface = TEXT_CACHE.render(self.font, self.text, text_colour)
         text_rect = text_surface.get_rect(center=self.rect.center)
         screen.blit(text_surface, text_rect)
     
@@ -37,74 +94,222 @@ class Button:
         return self.enabled and self.rect.collidepoint(mouse_pos)
 
 
-class CityRenderer:
+NORMAL, TARGETED, DEFENDED, SELECTED, DESTROYED = range(5)
+CITY_LABEL_CACHE_SIZE = 20000
+MARKER_COLOURKEY = (255, 0, 255)
+LABEL_CELL = (24, 12)
+MAX_LABELS = 500
+LABEL_REACH = 200
+
+
+def _marker_sprite(state: int, base_colour: tuple) -> pygame.Surface:
+    # Markers are hard-edged, so an RLE colour key blits several times
+    # faster than per-pixel alpha.
+    size = CITY_RADIUS
+    sprite = pygame.Surface((size * 2 + 3, size * 2 + 3))
+    sprite.fill(MARKER_COLOURKEY)
+    sprite.set_colorkey(MARKER_COLOURKEY, pygame.RLEACCEL)
+    centre = size + 1
+    if state == DESTROYED:
+        pygame.draw.line(sprite, COLOURS["black"], (1, 1), (size * 2 + 1, size * 2 + 1), 3)
+        pygame.draw.line(sprite, COLOURS["black"], (1, size * 2 + 1), (size * 2 + 1, 1), 3)
+    else:
+        colour = {TARGETED: TARGETED_COLOUR, DEFENDED: DEFENDED_COLOUR,
+                  SELECTED: SELECTED_COLOUR}.get(state, base_colour)
+        pygame.draw.circle(sprite, colour, (centre, centre), size)
+    return sprite
+
+
+class CityLayer:
     
-    def __init__(self):
-        self.font = pygame.font.Font(None, 18)
+    def __init__(self, cities: List[dict], base_colour: tuple, font: pygame.font.Font):
+        self.cities = cities
+        self.font = font
+        self.label_colours = (base_colour, HIT_COLOUR)
+        self.sprites = [_marker_sprite(state, base_colour) for state in range(DESTROYED + 1)]
+        self._sprite_array = np.empty(len(self.sprites), dtype=object)
+        self._sprite_array[:] = self.sprites
+        offset = CITY_RADIUS + 1
+        self.markers = [(city["x"] - offset, city["y"] - offset) for city in cities]
+        self.labels: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self.xs = np.array([city["x"] for city in cities], dtype=np.intp)
+        self.ys = np.array([city["y"] for city in cities], dtype=np.intp)
+        self.population = np.array([city["population"] for city in cities], dtype=np.float64)
+        self.grid = SpatialGrid(self.xs, self.ys)
+        self._label_candidates: Dict[int, np.ndarray] = {}
+        self._view_key = None
+        self._view: tuple = ()
+        self._key = None
+        self._states: Optional[np.ndarray] = None
+        self._batch: list = []
     
-    def _get_city_colour(self, is_destroyed: bool, is_defended: bool, 
-                       is_selected: bool, is_targeted: bool, is_us_city: bool = True) -> tuple:
-        if is_destroyed:
-            return HIT_COLOUR
-        elif is_selected:
-            return SELECTED_COLOUR
-        elif is_defended:
-            return DEFENDED_COLOUR
-        elif is_targeted:
-            return TARGETED_COLOUR
-        else:
-            return COLOURS["blue"] if is_us_city else COLOURS["red"]
+    def states(self, destroyed: List[bool], defenses: Set[int], targets: Set[int],
+               selected: Set[int]) -> np.ndarray:
+        states = np.zeros(len(self.cities), dtype=np.int8)
+        # Later assignments win, matching the old colour priority.
+        for state, indices in ((TARGETED, targets), (DEFENDED, defenses), (SELECTED, selected)):
+            if indices:
+                states[np.fromiter(indices, dtype=np.intp, count=len(indices))] = state
+        states[np.asarray(destroyed, dtype=bool)] = DESTROYED
+        return states
     
-    def draw_city(self, screen: pygame.Surface, city: dict, colour: tuple, 
-                  is_destroyed: bool = False, is_defended: bool = False, 
-                  is_selected: bool = False, is_us_city: bool = True):
-        x, y = city["x"], city["y"]
-        size = CITY_RADIUS
-        
-        if is_destroyed:
-            pygame.draw.line(screen, COLOURS["black"], (x-size, y-size), (x+size, y+size), 3)
-            pygame.draw.line(screen, COLOURS["black"], (x-size, y+size), (x+size, y-size), 3)
-            text_colour = HIT_COLOUR
+    def label(self, idx: int, destroyed: bool) -> tuple:
+        key = (idx, destroyed)
+        label = self.labels.get(key)
+        if label is None:
+            city = self.cities[idx]
+            surface = self.font.render(city["name"], True, self.label_colours[destroyed])
+            label = (surface, (city["x"] + 12, city["y"] - surface.get_height() // 2))
+            self.labels[key] = label
+            if len(self.labels) > CITY_LABEL_CACHE_SIZE:
+                self.labels.popitem(last=False)
         else:
-            pygame.draw.circle(screen, colour, (x, y), size)
-            text_colour = COLOURS["blue"] if is_us_city else COLOURS["red"]
+            self.labels.move_to_end(key)
+        return label
+    
+    def label_candidates(self, camera: Camera) -> np.ndarray:
+        # Two cities sharing a cell smaller than any label would have
+        # overlapping labels, so only the most populous one is a candidate.
+        # Computed once per zoom step.
+        candidates = self._label_candidates.get(camera.step)
+        if candidates is None and not self.cities:
+            candidates = np.zeros(0, dtype=bool)
+        elif candidates is None:
+            zoom = camera.zoom
+            cols = (self.xs * zoom // LABEL_CELL[0]).astype(np.int64)
+            rows = (self.ys * zoom // LABEL_CELL[1]).astype(np.int64)
+            cells = (rows - rows.min()) * (cols.max() - cols.min() + 1) + cols - cols.min()
+            order = np.lexsort((-self.population, cells))
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = cells[order[1:]] != cells[order[:-1]]
+            candidates = np.zeros(len(self.cities), dtype=bool)
+            candidates[order[first]] = True
+            self._label_candidates[camera.step] = candidates
+        return candidates
+    
+    def _declutter(self, indices: np.ndarray, xs: np.ndarray, ys: np.ndarray) -> List[int]:
+        # Greedy by population: a label is shown only if it overlaps none of
+        # the labels already placed, checked against a grid of screen cells.
+        placed: List[int] = []
+        occupied: Dict[tuple, List[pygame.Rect]] = {}
+        for pos in np.argsort(-self.population[indices], kind="stable").tolist():
+            surface = self.label(int(indices[pos]), False)[0]
+            rect = surface.get_rect(left=int(xs[pos]) + 12, centery=int(ys[pos]))
+            cells = [(col, row) for col in range(rect.left // GRID_CELL, rect.right // GRID_CELL + 1)
+                     for row in range(rect.top // GRID_CELL, rect.bottom // GRID_CELL + 1)]
+            if any(rect.colliderect(other) for cell in cells for other in occupied.get(cell, ())):
+                continue
+            for cell in cells:
+                occupied.setdefault(cell, []).append(rect)
+            placed.append(pos)
+        return sorted(placed)
+    
+    def view(self, camera: Camera) -> tuple:
+        # Cities near enough to the screen to show a marker or label, their
+        # screen positions and which of them are labelled.
+        if self._view_key != camera.key:
+            zoom = camera.zoom
+            offset_x, offset_y = camera.offset
+            left, top, right, bottom = camera.visible_rect()
+            reach = (CITY_RADIUS + 1) / zoom
+            indices = self.grid.query(left - LABEL_REACH / zoom, top - reach,
+                                      right + reach, bottom + reach)
+            xs = np.rint(self.xs[indices] * zoom).astype(np.intp) - offset_x
+            ys = np.rint(self.ys[indices] * zoom).astype(np.intp) - offset_y
+            labelled = np.flatnonzero(self.label_candidates(camera)[indices])
+            if len(labelled) > MAX_LABELS:
+                top = np.argpartition(-self.population[indices[labelled]], MAX_LABELS)[:MAX_LABELS]
+                labelled = np.sort(labelled[top])
+            placed = self._declutter(indices[labelled], xs[labelled], ys[labelled])
+            self._view = (indices, xs, ys, labelled[placed])
+            self._view_key = camera.key
+        return self._view
+    
+    def _camera_batch(self, states: np.ndarray, camera: Camera) -> list:
+        indices, xs, ys, labelled = self.view(camera)
+        offset = CITY_RADIUS + 1
+        codes = states[indices]
+        markers = list(zip(self._sprite_array[codes].tolist(),
+                           zip((xs - offset).tolist(), (ys - offset).tolist())))
+        # Each label goes straight after its own marker, as in the full draw.
+        batch, start = [], 0
+        for pos in labelled.tolist():
+            surface = self.label(int(indices[pos]), bool(codes[pos] == DESTROYED))[0]
+            batch += markers[start:pos + 1]
+            batch.append((surface, (int(xs[pos]) + 12, int(ys[pos]) - surface.get_height() // 2)))
+            start = pos + 1
+        batch += markers[start:]
+        return batch
+    
+    def draw(self, screen: Canvas, states: np.ndarray, camera: Optional[Camera] = None) -> None:
+        # Sprites only change with a city's state, so an unchanged state
+        # array and view resubmit the previous batch as is.
+        key = None if camera is None else camera.key
+        if key != self._key or self._states is None or not np.array_equal(states, self._states):
+            if camera is None:
+                sprites, markers = self.sprites, self.markers
+                self._batch = []
+                for idx, code in enumerate(states.tolist()):
+                    self._batch += ((sprites[code], markers[idx]), self.label(idx, code == DESTROYED))
+            else:
+                self._batch = self._camera_batch(states, camera)
+            self._states = states
+            self._key = key
+        screen.blits(self._batch)
+    
+    def surfaces(self) -> List[pygame.Surface]:
+        return self.sprites + [surface for surface, _ in self.labels.values()]
+
 
-        text_surface = self.font.render(city["name"], True, text_colour)
-        text_x = x + 12  
-        text_y = y - text_surface.get_height() // 2
-        screen.blit(text_surface, (text_x, text_y))
+class CityRenderer:
+    
+    def __init__(self, scenario: Scenario = DEFAULT_SCENARIO):
+        self.font = get_font(18)
+        self.usa_cities = scenario.usa_cities
+        self.ussr_cities = scenario.ussr_cities
+        self.usa_layer = CityLayer(self.usa_cities, COLOURS["blue"], self.font)
+        self.ussr_layer = CityLayer(self.ussr_cities, COLOURS["red"], self.font)
+        self.camera: Optional[Camera] = None
+    
+    def city_rect(self, city: dict) -> pygame.Rect:
+        x, y = city["x"], city["y"]
+        if self.camera is not None:
+            x, y = self.camera.to_screen((x, y))
+        size = CITY_RADIUS + 2
+        label = TEXT_CACHE.render(self.font, city["name"], COLOURS["blue"])
+        marker = pygame.Rect(x - size, y - size, size * 2 + 1, size * 2 + 1)
+        return marker.union(label.get_rect(midleft=(x + 12, y)))
+    
+    def screen_points(self, cities: List[dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if not cities:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        layers = {id(self.usa_cities): self.usa_layer, id(self.ussr_cities): self.ussr_layer}
+        layer = layers.get(id(cities)) or CityLayer(cities, COLOURS["blue"], self.font)
+        if self.camera is None:
+            return np.arange(len(cities)), layer.xs, layer.ys
+        return layer.view(self.camera)[:3]
     
-    def draw_usa_cities(self, screen: pygame.Surface, destroyed: List[bool], 
+    def draw_usa_cities(self, screen: Canvas, destroyed: List[bool], 
                        defenses: Set[int], targets: Set[int], 
                        selected_defenses: Set[int]):
-        for idx, city in enumerate(USA_CITIES):
-            is_defended = idx in defenses
-            is_selected = idx in selected_defenses
-            is_targeted = idx in targets
-            is_destroyed = destroyed[idx]
-            
-            colour = self._get_city_colour(is_destroyed, is_defended, 
-                                       is_selected, is_targeted, is_us_city=True)
-            self.draw_city(screen, city, colour, is_destroyed, is_defended, is_selected, is_us_city=True)
+        layer = self.usa_layer
+        layer.draw(screen, layer.states(destroyed, defenses, targets, selected_defenses), self.camera)
     
-    def draw_ussr_cities(self, screen: pygame.Surface, destroyed: List[bool], 
+    def draw_ussr_cities(self, screen: Canvas, destroyed: List[bool], 
                           defenses: Set[int], selected_targets: Set[int]):
-        for idx, city in enumerate(USSR_CITIES):
-            is_defended = idx in defenses
-            is_selected = idx in selected_targets
-            is_destroyed = destroyed[idx]
-            
-            colour = self._get_city_colour(is_destroyed, is_defended, 
-                                       is_selected, False, is_us_city=False)
-            self.draw_city(screen, city, colour, is_destroyed, is_defended, is_selected, is_us_city=False)
+        layer = self.ussr_layer
+        layer.draw(screen, layer.states(destroyed, defenses, set(), selected_targets), self.camera)
+    
+    def surfaces(self) -> List[pygame.Surface]:
+        return self.usa_layer.surfaces() + self.ussr_layer.surfaces()
 
 
 class UI:
     
-    def __init__(self):
-        self.font = pygame.font.Font(None, 36)
-        self.small_font = pygame.font.Font(None, 24)
-        self.city_renderer = CityRenderer()
+    def __init__(self, scenario: Scenario = DEFAULT_SCENARIO):
+        self.font = get_font(36)
+        self.small_font = get_font(24)
+        self.city_renderer = CityRenderer(scenario)
         
         self.title_surface = self.font.render(GAME_TITLE, True, COLOURS["white"])
         self.title_rect = self.title_surface.get_rect(center=(WINDOW_WIDTH // 2, 17))
@@ -120,10 +325,14 @@ class UI:
             "Left Click = Select cities/buttons",
             "H Key = Toggle this help window",
             "G Key = Toggle grid overlay",
+            "C Key = Toggle defense coverage",
+            "F5 Key = Save checkpoint, F9 Key = Restore it",
+            "Mouse Wheel or +/- = Zoom map, Home Key = Reset view",
+            "Right Drag or Arrow Keys = Pan map",
             "",
             "GAME PHASES:",
-            "1. DEFENSIVE - Select 5 US cities to defend",
-            "2. OFFENSIVE - Select 5 USSR cities to target", 
+            f"1. DEFENSIVE - Select {scenario.defense_limit} US cities to defend",
+            f"2. OFFENSIVE - Select {scenario.target_limit} USSR cities to target",
             "3. LAUNCH - Watch missiles fly and intercepts",
             "4. RESULTS - View battle outcome",
             "",
@@ -155,63 +364,67 @@ class UI:
         self.reset_button = Button(
             WINDOW_WIDTH - 200, WINDOW_HEIGHT - 140, 180, 50, "RESET", COLOURS["green"], COLOURS["green"]
         )
+        self.buttons = [self.begin_button, self.exit_button, self.continue_button,
+                        self.launch_button, self.close_button, self.reset_button]
+        self.status_rect: Optional[pygame.Rect] = None
     
-    def draw_grid(self, screen: pygame.Surface) -> None:
+    def draw_grid(self, screen: Canvas) -> None:
         grid_size = 50
         for x in range(0, WINDOW_WIDTH, grid_size):
-            pygame.draw.line(screen, COLOURS["dark_gray"], (x, 0), (x, WINDOW_HEIGHT))
+            screen.line(COLOURS["dark_gray"], (x, 0), (x, WINDOW_HEIGHT))
         for y in range(0, WINDOW_HEIGHT, grid_size):
-            pygame.draw.line(screen, COLOURS["dark_gray"], (0, y), (WINDOW_WIDTH, y))
+            screen.line(COLOURS["dark_gray"], (0, y), (WINDOW_WIDTH, y))
         
-        font = pygame.font.Font(None, 16)
+        font = get_font(16)
         for x in range(0, WINDOW_WIDTH, grid_size * 2):
             for y in range(0, WINDOW_HEIGHT, grid_size * 2):
                 coord_text = f"({x},{y})"
-                text_surface = font.render(coord_text, True, COLOURS["gray"])
+                text_surface = TEXT_CACHE.render(font, coord_text, COLOURS["gray"])
                 screen.blit(text_surface, (x + 2, y + 2))
     
-    def draw_windowed_text(self, screen: pygame.Surface, text_lines: List[str], y_position: int = None) -> None:
-        if not text_lines:
-            return
-        
-        max_width = 0
-        line_height = 22
-        for line in text_lines:
-            surf = self.small_font.render(line, True, COLOURS["green"])
-            max_width = max(max_width, surf.get_width())
+    def windowed_text_rect(self, text_lines: List[str], y_position: int = None) -> pygame.Rect:
+        max_width = max(TEXT_CACHE.render(self.small_font, line, COLOURS["green"]).get_width()
+                        for line in text_lines)
         
         box_width = max_width + 40  
-        box_height = len(text_lines) * line_height + 40 
+        box_height = len(text_lines) * LINE_HEIGHT + 40 
         box_x = (WINDOW_WIDTH - box_width) // 2
         
         if y_position is None:
             box_y = WINDOW_HEIGHT - box_height - 50
         else:
             box_y = y_position
+        return pygame.Rect(box_x, box_y, box_width, box_height)
+    
+    def draw_windowed_text(self, screen: Canvas, text_lines: List[str], y_position: int = None) -> None:
+        if not text_lines:
+            return
         
-        pygame.draw.rect(screen, COLOURS["green"], (box_x - 4, box_y - 4, box_width + 8, box_height + 8))  
-        pygame.draw.rect(screen, COLOURS["black"], (box_x, box_y, box_width, box_height)) 
+        box = self.windowed_text_rect(text_lines, y_position)
+        if y_position is None:
+            self.status_rect = box.inflate(8, 8)
+        screen.rect(COLOURS["green"], box.inflate(8, 8))  
+        screen.rect(COLOURS["black"], box) 
         
-
-        y = box_y + 20
+        y = box.y + 20
         for line in text_lines:
-            surf = self.small_font.render(line, True, COLOURS["green"])
-            x = box_x + (box_width - surf.get_width()) // 2  
+            surf = TEXT_CACHE.render(self.small_font, line, COLOURS["green"])
+            x = box.x + (box.width - surf.get_width()) // 2  
             screen.blit(surf, (x, y))
-            y += line_height
+            y += LINE_HEIGHT
 
-    def draw_title(self, screen: pygame.Surface):
+    def draw_title(self, screen: Canvas):
         screen.blit(self.title_surface, self.title_rect)
     
-    def draw_instruction(self, screen: pygame.Surface, instruction: str, y_pos: int = WINDOW_HEIGHT - 150):
+    def draw_instruction(self, screen: Canvas, instruction: str, y_pos: int = WINDOW_HEIGHT - 150):
         self.draw_windowed_text(screen, [instruction], y_pos)
     
-    def draw_selection_counter(self, screen: pygame.Surface, current: int, 
+    def draw_selection_counter(self, screen: Canvas, current: int, 
                               maximum: int, label: str, y_pos: int = WINDOW_HEIGHT - 120):
         counter_text = f"{label}: {current}/{maximum}"
         self.draw_windowed_text(screen, [counter_text], y_pos)
     
-    def draw_results(self, screen: pygame.Surface, us_casualties: int, 
+    def draw_results(self, screen: Canvas, us_casualties: int, 
                     ussr_casualties: int, total_us: int, total_ussr: int,
                     us_percent: float, ussr_percent: float,
                     us_destroyed_cities: List[str], ussr_destroyed_cities: List[str]):
@@ -274,13 +487,25 @@ class UI:
         
         self.draw_windowed_text(screen, text_lines)
 
-    def draw_help_prompt(self, screen: pygame.Surface):
+    def draw_help_prompt(self, screen: Canvas):
         help_text = "Press H for Help"
-        help_surface = pygame.font.Font(None, 20).render(help_text, True, COLOURS["green"])
+        help_surface = TEXT_CACHE.render(get_font(20), help_text, COLOURS["green"])
         screen.blit(help_surface, (10, WINDOW_HEIGHT - 25))
     
-    def draw_comprehensive_help(self, screen: pygame.Surface):
+    def draw_comprehensive_help(self, screen: Canvas):
         self.draw_windowed_text(screen, self.help_content, 30)
+    
+    def help_rect(self) -> pygame.Rect:
+        return self.windowed_text_rect(self.help_content, 30).inflate(8, 8)
+    
+    def set_hover(self, entity) -> List[pygame.Rect]:
+        hovered = entity[1] if entity is not None and entity[0] == BUTTON else None
+        changed = []
+        for button in self.buttons:
+            if button.hovered != (button is hovered):
+                button.hovered = button is hovered
+                changed.append(button.rect)
+        return changed
 
 
 def get_clicked_city(mouse_pos: tuple, cities: List[dict]) -> int:
@@ -0,0 +1,185 @@
+"""
+Operations wall: many independent engagements tiled into one window
+"""
+
+import argparse
+import random
+import time
+from typing import List, Optional, Tuple
+
+import pygame
+
+from config import COLOURS, FPS, GAME_TITLE, WINDOW_HEIGHT, WINDOW_WIDTH, GameState
+from game_state import GameStateManager
+from metrics import DEFAULT_METRICS_PORT, FRAME_SECONDS, UPDATE_SECONDS, MetricsServer
+from missiles import MissileSystem, advance_launch
+from particles import ParticleSystem
+from render_backend import BACKENDS, Canvas, ViewportCanvas, create_display_canvas
+from scenario import (DEFAULT_SCENARIO, POPULATION_DISTRIBUTIONS, SPATIAL_DISTRIBUTIONS,
+                      Scenario, generate_scenario)
+from ui import TEXT_CACHE, CityRenderer, get_background, get_font
+
+DEFAULT_GRID = (4, 3)
+WALL_PARTICLES = 20000
+MAX_START_DELAY = 3000
+RESULTS_HOLD = 4000
+TILE_GAP = 4
+
+
+class Engagement:
+
+    def __init__(self, scenario: Scenario, seed: int, get_ticks, particles: int = WALL_PARTICLES):
+        self.scenario = scenario
+        self.rng = random.Random(seed)
+        self.get_ticks = get_ticks
+        # Only simulation state lives here; fonts, text, sprites and the
+        # background come from the process-wide caches.
+        self.game_state = GameStateManager(scenario=scenario)
+        self.missile_system = MissileSystem(get_ticks=get_ticks, store=self.game_state.store,
+                                            scenario=scenario,
+                                            particles=ParticleSystem(particles, seed) if particles else None)
+        self.next_start = get_ticks() + self.rng.randrange(MAX_START_DELAY)
+        self.casualties: Optional[tuple] = None
+
+    def start(self) -> None:
+        game_state, rng = self.game_state, self.rng
+        usa_count, ussr_count = len(self.scenario.usa_cities), len(self.scenario.ussr_cities)
+        game_state.start_new_game()
+        game_state.player_defenses = set(rng.sample(range(usa_count), game_state.defense_limit))
+        game_state.player_targets = set(rng.sample(range(ussr_count), game_state.target_limit))
+        game_state.ai_defenses = set(rng.sample(range(ussr_count), game_state.defense_limit))
+        game_state.ai_targets = set(rng.sample(range(usa_count), game_state.target_limit))
+
+        self.missile_system.reset()
+        self.missile_system.create_missile_lines(game_state.player_targets, game_state.ai_targets,
+                                                 game_state.player_defenses, game_state.ai_defenses)
+        game_state.current_state = GameState.LAUNCHING
+        self.casualties = None
+        self.next_start = None
+
+    def update(self) -> None:
+        now = self.get_ticks()
+        state = self.game_state.current_state
+        if self.next_start is not None and now >= self.next_start:
+            self.start()
+        elif state == GameState.LAUNCHING:
+            if advance_launch(self.game_state, self.missile_system):
+                self.game_state.current_state = GameState.RESULTS
+                self.casualties = self.game_state.calculate_casualties()
+                self.next_start = now + RESULTS_HOLD
+        elif state == GameState.RESULTS:
+            self.missile_system.update_mushroom_clouds()
+            self.missile_system.update_particles()
+
+    def status(self) -> str:
+        state = self.game_state.current_state
+        if self.casualties is not None:
+            return f"US {self.casualties[4]:.0f}%  USSR {self.casualties[5]:.0f}%"
+        if state == GameState.LAUNCHING:
+            return "LAUNCH IN PROGRESS"
+        return "STANDING BY"
+
+    def draw(self, screen: Canvas, renderer: CityRenderer, background: pygame.Surface) -> None:
+        game_state = self.game_state
+        screen.blit(background, (0, 0))
+        renderer.draw_usa_cities(screen, game_state.usa_destroyed, game_state.player_defenses,
+                                 game_state.ai_targets, set())
+        renderer.draw_ussr_cities(screen, game_state.ussr_destroyed, game_state.ai_defenses, set())
+        self.missile_system.draw_missiles(screen)
+        self.missile_system.draw_mushroom_clouds(screen)
+        self.missile_system.draw_particles(screen)
+
+
+def tile_rects(size: Tuple[int, int], grid: Tuple[int, int], gap: int = TILE_GAP) -> List[pygame.Rect]:
+    cols, rows = grid
+    width, height = (size[0] - gap * (cols + 1)) // cols, (size[1] - gap * (rows + 1)) // rows
+    return [pygame.Rect(gap + col * (width + gap), gap + row * (height + gap), width, height)
+            for row in range(rows) for col in range(cols)]
+
+
+class OperationsWall:
+
+    def __init__(self, screen: Canvas, grid: Tuple[int, int] = DEFAULT_GRID,
+                 scenario: Scenario = DEFAULT_SCENARIO, seed: int = 0,
+                 particles: int = WALL_PARTICLES, get_ticks=pygame.time.get_ticks):
+        self.screen = screen
+        self.clock = pygame.time.Clock()
+        self.background = get_background((WINDOW_WIDTH, WINDOW_HEIGHT))
+        self.renderer = CityRenderer(scenario)
+        self.font = get_font(18)
+        self.tiles = [ViewportCanvas(screen, rect, (WINDOW_WIDTH, WINDOW_HEIGHT))
+                      for rect in tile_rects(screen.size, grid)]
+        self.engagements = [Engagement(scenario, seed + idx, get_ticks, particles)
+                            for idx in range(len(self.tiles))]
+        self.running = True
+
+    def update(self) -> None:
+        for engagement in self.engagements:
+            engagement.update()
+
+    def draw(self) -> None:
+        self.screen.fill(COLOURS["black"])
+        for idx, (tile, engagement) in enumerate(zip(self.tiles, self.engagements)):
+            tile.set_clip(None)
+            engagement.draw(tile, self.renderer, self.background)
+            label = TEXT_CACHE.render(self.font, f"#{idx + 1}  {engagement.status()}", COLOURS["green"])
+            self.screen.blit(label, (tile.viewport.x + 4, tile.viewport.y + 4))
+        self.screen.set_clip(None)
+
+    def run(self) -> None:
+        while self.running:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and
+                                                 event.key == pygame.K_ESCAPE):
+                    self.running = False
+            frame_start = time.perf_counter()
+            self.update()
+            UPDATE_SECONDS.observe(time.perf_counter() - frame_start)
+            self.draw()
+            self.screen.present()
+            FRAME_SECONDS.observe(time.perf_counter() - frame_start)
+            self.clock.tick(FPS)
+        pygame.quit()
+
+
+def _parse_pair(value: str) -> Tuple[int, int]:
+    first, second = value.lower().split("x")
+    return int(first), int(second)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tile many independent engagements into one window")
+    parser.add_argument("--grid", type=_parse_pair, default=DEFAULT_GRID, metavar="COLSxROWS")
+    parser.add_argument("--size", type=_parse_pair, default=(WINDOW_WIDTH, WINDOW_HEIGHT),
+                        metavar="WIDTHxHEIGHT", help="window size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--particles", type=int, default=WALL_PARTICLES,
+                        help="particle capacity per engagement; 0 disables particles")
+    parser.add_argument("--scenario-seed", type=int, metavar="SEED",
+                        help="play a generated theater instead of the built-in cities")
+    parser.add_argument("--cities", type=int, default=10, help="cities per side in a generated theater")
+    parser.add_argument("--spatial", choices=SPATIAL_DISTRIBUTIONS, default="clustered")
+    parser.add_argument("--population", choices=POPULATION_DISTRIBUTIONS, default="zipf")
+    parser.add_argument("--renderer", choices=BACKENDS, default="surface")
+    parser.add_argument("--software-renderer", action="store_true")
+    parser.add_argument("--metrics-port", type=int, nargs="?", const=DEFAULT_METRICS_PORT,
+                        metavar="PORT", help="serve Prometheus metrics on PORT")
+    parser.add_argument("--metrics-host", default="127.0.0.1")
+    args = parser.parse_args()
+
+    if args.metrics_port is not None:
+        MetricsServer(args.metrics_port, args.metrics_host).start()
+
+    scenario = DEFAULT_SCENARIO
+    if args.scenario_seed is not None:
+        scenario = generate_scenario(args.scenario_seed, args.cities, spatial=args.spatial,
+                                     population=args.population)
+
+    pygame.init()
+    screen = create_display_canvas(args.renderer, args.size, GAME_TITLE,
+                                   software=args.software_renderer)
+    OperationsWall(screen, args.grid, scenario, args.seed, args.particles).run()
+
+
+if __name__ == "__main__":
+    main()